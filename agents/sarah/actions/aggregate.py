@@ -0,0 +1,233 @@
+# -*- coding: utf-8 -*-
+
+"""This file contains the reductions used by the WDI actions.
+
+The reductions of a year (including top and rank) work on one column of an
+indicator matrix (one value per country, NaN for gaps) and an optional
+boolean mask of the countries to include. The ones of a series (growth,
+trend) work on the years with a value of one country.
+"""
+
+import numpy as np
+
+
+def select(column, mask=None, positive=False):
+    """Obtain the column with excluded values replaced by NaN.
+
+    Args:
+        column (numpy.ndarray): Values per country.
+        mask (numpy.ndarray): Countries to include (all if None).
+        positive (bool): Only include values greater than zero.
+
+    Returns:
+        numpy.ndarray: Copy of the column.
+    """
+    keep = ~np.isnan(column)
+
+    if mask is not None:
+        keep &= mask
+
+    if positive:
+        keep &= column > 0
+
+    return np.where(keep, column, np.nan)
+
+
+def count(column, mask=None, positive=False):
+    """Obtain number of values in the column.
+
+    Returns:
+        int: Number of non-NaN values.
+    """
+    return int(np.count_nonzero(~np.isnan(select(column, mask, positive))))
+
+
+def average(column, mask=None, positive=False):
+    """Obtain the mean of the values in the column.
+
+    Returns:
+        Tuple: mean and number of values, or None if there are no values.
+    """
+    values = select(column, mask, positive)
+    num = int(np.count_nonzero(~np.isnan(values)))
+
+    if not num:
+        return None
+
+    return float(np.nanmean(values)), num
+
+
+def maximum(column, mask=None, positive=False):
+    """Obtain the max of the values in the column.
+
+    Returns:
+        Tuple: max value and its index, or None if there are no values.
+    """
+    values = select(column, mask, positive)
+
+    if np.isnan(values).all():
+        return None
+
+    index = int(np.nanargmax(values))
+
+    return float(values[index]), index
+
+
+def minimum(column, mask=None, positive=False):
+    """Obtain the min of the values in the column.
+
+    Returns:
+        Tuple: min value and its index, or None if there are no values.
+    """
+    values = select(column, mask, positive)
+
+    if np.isnan(values).all():
+        return None
+
+    index = int(np.nanargmin(values))
+
+    return float(values[index]), index
+
+
+def top(column, num, mask=None, lowest=False):
+    """Obtain the countries with the highest (or lowest) values.
+
+    Only the selected values are partially sorted (argpartition). Ties keep
+    the order of the column, as in the rankings of the store (reversed for
+    the lowest).
+
+    Args:
+        column (numpy.ndarray): Values per country.
+        num (int): Number of countries.
+        mask (numpy.ndarray): Countries to include (all if None).
+        lowest (bool): Obtain the lowest values instead.
+
+    Returns:
+        numpy.ndarray: Indices of the countries, highest (or lowest) first.
+    """
+    values = select(column, mask)
+    found = np.flatnonzero(~np.isnan(values))
+    keys = values[found] if lowest else -values[found]
+
+    if num <= 0 or not len(found):
+        return found[:0]
+
+    if num < len(found):
+        # Every value up to the num-th (ties included)
+        kth = keys[np.argpartition(keys, num - 1)[num - 1]]
+        chosen = np.flatnonzero(keys <= kth)
+
+    else:
+        chosen = np.arange(len(found))
+
+    ties = -chosen if lowest else chosen
+    order = chosen[np.lexsort((ties, keys[chosen]))]
+
+    return found[order[:num]]
+
+
+def rank(column, index, mask=None):
+    """Obtain the position of a country from the highest value.
+
+    Returns:
+        Tuple: position (from 1) and number of countries with a value, or
+        None if the country has no value.
+    """
+    values = select(column, mask)
+    value = values[index]
+
+    if np.isnan(value):
+        return None
+
+    # Higher values, and equal ones before it
+    higher = np.count_nonzero(values > value)
+    higher += np.count_nonzero(values[:index] == value)
+
+    return int(higher) + 1, int(np.count_nonzero(~np.isnan(values)))
+
+
+def group(column, members, how='mean', weights=None):
+    """Obtain the aggregate of the members of a group.
+
+    Args:
+        column (numpy.ndarray): Values per country.
+        members (numpy.ndarray): Countries in the group.
+        how (str): 'mean', 'sum' or 'weighted' (mean weighted by weights,
+            only over the countries with both values).
+        weights (numpy.ndarray): Weight per country (e.g. population).
+
+    Returns:
+        Tuple: aggregate and number of countries in it, or None if no member
+        has a value.
+    """
+    values = select(column, members)
+
+    if how == 'weighted':
+        if weights is None:
+            return None
+
+        weights = np.where(np.isnan(weights), 0.0, weights)
+        values = np.where(weights > 0, values, np.nan)
+
+    valid = ~np.isnan(values)
+    num = int(np.count_nonzero(valid))
+
+    if not num:
+        return None
+
+    if how == 'sum':
+        return float(values[valid].sum()), num
+
+    if how == 'weighted':
+        return float(np.dot(values[valid], weights[valid]) /
+                     weights[valid].sum()), num
+
+    return float(values[valid].mean()), num
+
+
+def growth(years, values):
+    """Obtain the change between the first and last values of a series.
+
+    Args:
+        years (numpy.ndarray): Years of the values, ascending.
+        values (numpy.ndarray): Values of the series (without gaps).
+
+    Returns:
+        Tuple: total change (%) and compound annual growth rate (%, None if
+        the values are not positive), or None if there are less than two
+        values or the first one is zero.
+    """
+    values = np.asarray(values, dtype=np.float64)
+
+    if len(values) < 2 or values[0] == 0:
+        return None
+
+    first, last = float(values[0]), float(values[-1])
+    change = (last / first - 1) * 100
+    cagr = None
+
+    if first > 0 and last > 0:
+        cagr = ((last / first) ** (1 / float(years[-1] - years[0])) - 1) * 100
+
+    return change, cagr
+
+
+def trend(years, values):
+    """Obtain the least squares slope of a series.
+
+    Args:
+        years (numpy.ndarray): Years of the values.
+        values (numpy.ndarray): Values of the series (without gaps).
+
+    Returns:
+        float: Change per year, or None if there are less than two values.
+    """
+    years = np.asarray(years, dtype=np.float64)
+    values = np.asarray(values, dtype=np.float64)
+
+    if len(values) < 2:
+        return None
+
+    years = years - years.mean()
+
+    return float(np.dot(years, values - values.mean()) / np.dot(years, years))
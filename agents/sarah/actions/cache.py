@@ -0,0 +1,145 @@
+# -*- coding: utf-8 -*-
+
+"""This file contains the cache of the replies of the actions.
+
+Many users ask the same things ('gini spain', 'average pib 2015'), so the
+replies are kept by (action, country, year, code, num) for a while. Countries
+are folded as the lookup of the countries does ('Spain', 'spain' and 'SPAIN'
+share a reply), and indicator codes are found in any case. The cache must be
+cleared whenever the data behind the actions changes.
+"""
+
+import collections
+import threading
+import time
+
+from actions.countries import fold
+
+
+def normalize(value):
+    """Normalize a message field for the key of the cache (None if empty)."""
+    if value is None:
+        return None
+
+    value = ' '.join(str(value).split())
+
+    return value or None
+
+
+def key(action_name, parser):
+    """Obtain the cache key of an action for a message.
+
+    Args:
+        action_name (str): Name of the action in the mapper.
+        parser (MessageParser): Parsed Zoe message.
+
+    Returns:
+        Tuple: action, country, year, code and number of countries.
+    """
+    return (
+        action_name,
+        fold(parser.get('country')) or None,
+        normalize(parser.get('year')),
+        (normalize(parser.get('code')) or '').casefold() or None,
+        normalize(parser.get('num'))
+    )
+
+
+class ResultCache(object):
+    """Bounded LRU cache whose entries expire after some seconds.
+
+    Attributes:
+        maxsize (int): Maximum number of entries.
+        ttl (float): Seconds an entry is valid.
+        hits (int): Lookups that found a valid entry.
+        misses (int): Lookups that did not.
+        evictions (int): Entries removed to make room for new ones.
+        generation (int): Number of times the cache was cleared, to discard
+            values computed before.
+    """
+
+    def __init__(self, maxsize=1024, ttl=600):
+        self.maxsize = maxsize
+        self.ttl = ttl
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.generation = 0
+
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        """Obtain the value of a key, or None if missing or expired."""
+        now = time.monotonic()
+
+        with self._lock:
+            entry = self._entries.get(key)
+
+            if entry is not None and entry[0] <= now:
+                # Expired
+                del self._entries[key]
+                entry = None
+
+            if entry is None:
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+
+            return entry[1]
+
+    def put(self, key, value, generation=None):
+        """Store the value of a key, evicting the least recently used.
+
+        Args:
+            key: Key of the value.
+            value: Value to keep.
+            generation (int): Generation when the value was computed. It is
+                not kept if the cache was cleared since then.
+        """
+        if self.maxsize <= 0:
+            return
+
+        expires = time.monotonic() + self.ttl
+
+        with self._lock:
+            if generation is not None and generation != self.generation:
+                # Computed from data that was replaced
+                return
+
+            self._entries[key] = (expires, value)
+            self._entries.move_to_end(key)
+
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        """Remove all the entries (counters are kept)."""
+        with self._lock:
+            self._entries.clear()
+            self.generation += 1
+
+    def stats(self):
+        """Obtain the counters of the cache.
+
+        Returns:
+            dict: size, maxsize, hits, misses, evictions and hit ratio.
+        """
+        with self._lock:
+            lookups = self.hits + self.misses
+
+            return {
+                'size': len(self._entries),
+                'maxsize': self.maxsize,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'ratio': self.hits / lookups if lookups else 0.0
+            }
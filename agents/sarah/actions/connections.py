@@ -0,0 +1,152 @@
+# -*- coding: utf-8 -*-
+
+"""This file contains the SQLite connections shared by the actions.
+
+Connections are opened once per databases.conf section and thread, read-only
+and tuned for reading, and kept open for the whole life of the agent. The
+sqlite3 statement cache keeps the statements of every action prepared, as
+they always use the same SQL text.
+
+When the options of a section change, its pool is retired instead of closed,
+as actions in flight may still be using its connections. Each thread closes
+its own connections to retired pools the next time it takes one from another
+pool.
+"""
+
+import sqlite3
+import threading
+
+# Defaults for the section options
+MMAP_SIZE = 256 * 1024 * 1024
+CACHE_SIZE = 64 * 1024 # KiB
+
+# Prepared statements kept per connection
+CACHED_STATEMENTS = 256
+
+# Pools by section name
+_POOLS = {}
+_POOLS_LOCK = threading.Lock()
+
+# Pools replaced by a new config, with connections still open
+_RETIRED = []
+
+
+class SqlitePool(object):
+    """Read-only connections to a SQLite database, one per thread.
+
+    Attributes:
+        path (str): Path to the database.
+        mmap_size (int): Bytes of the database to memory-map.
+        cache_size (int): KiB of page cache per connection.
+    """
+
+    def __init__(self, path, mmap_size=MMAP_SIZE, cache_size=CACHE_SIZE):
+        self.path = path
+        self.mmap_size = mmap_size
+        self.cache_size = cache_size
+
+        self._local = threading.local()
+        self._opened = []
+        self._lock = threading.Lock()
+
+    def get(self):
+        """Obtain the connection of the current thread."""
+        if _RETIRED:
+            _release(self)
+
+        conn = getattr(self._local, 'conn', None)
+
+        if conn is None:
+            conn = self._open()
+            self._local.conn = conn
+
+            with self._lock:
+                self._opened.append(conn)
+
+        return conn
+
+    def _open(self):
+        """Open a new read-only connection."""
+        conn = sqlite3.connect(
+            'file:%s?mode=ro' % self.path, uri=True,
+            cached_statements=CACHED_STATEMENTS, check_same_thread=False)
+
+        conn.execute('PRAGMA query_only = ON')
+        conn.execute('PRAGMA mmap_size = %d' % self.mmap_size)
+        conn.execute('PRAGMA cache_size = -%d' % self.cache_size)
+
+        return conn
+
+    def release(self):
+        """Close the connection of the current thread, if any.
+
+        Returns:
+            bool: Whether the pool has no open connections left.
+        """
+        conn = getattr(self._local, 'conn', None)
+
+        with self._lock:
+            if conn is not None:
+                self._local.conn = None
+                self._opened.remove(conn)
+
+            empty = not self._opened
+
+        if conn is not None:
+            conn.close()
+
+        return empty
+
+
+def _release(current):
+    """Close the connections of the current thread to the retired pools.
+
+    Args:
+        current (SqlitePool): Pool being used (kept even if retired, for the
+            actions in flight).
+    """
+    with _POOLS_LOCK:
+        retired = [old for old in _RETIRED if old is not current]
+
+    for old in retired:
+        if old.release():
+            with _POOLS_LOCK:
+                if old in _RETIRED:
+                    _RETIRED.remove(old)
+
+
+def pool(config):
+    """Obtain the pool of a databases.conf section.
+
+    The pool is reused while the options of the section don't change.
+
+    Args:
+        config (ConfigParser): Section of the database (or a dict with its
+            options, keyed by path).
+
+    Returns:
+        SqlitePool: Pool of the section.
+    """
+    name = getattr(config, 'name', None) or config.get('path')
+    options = (
+        config.get('path'),
+        int(config.get('mmap_size', MMAP_SIZE)),
+        int(config.get('cache_size', CACHE_SIZE))
+    )
+
+    with _POOLS_LOCK:
+        current = _POOLS.get(name)
+
+        if current and (
+                current.path, current.mmap_size, current.cache_size
+        ) == options:
+            return current
+
+        if current:
+            # Config changed, close it once no thread uses it
+            _RETIRED.append(current)
+
+        current = SqlitePool(*options)
+        _POOLS[name] = current
+
+    return current
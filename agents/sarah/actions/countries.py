@@ -0,0 +1,238 @@
+# -*- coding: utf-8 -*-
+
+"""This file contains the resolution of the countries in the messages.
+
+Users write countries in many ways ('spain', 'España', 'ESP', 'united
+states', 'korea'), while the data only has the WDI names ('Spain', 'United
+States', 'Korea, Rep.'). CountryIndex maps all those forms to the position
+of the country in the data before any value is read, and suggests similar
+names for the unknown ones.
+
+Names and IDs take precedence over the aliases, and both over the forms
+derived from the names ('Korea' from 'Korea, Rep.'). A derived form shared by
+several countries ('Congo') is ambiguous: it suggests all of them instead of
+picking one.
+"""
+
+import collections
+import difflib
+import re
+import unicodedata
+
+# Minimum similarity (0 to 1) of a suggestion, and how many are given
+FUZZY_THRESHOLD = 0.7
+FUZZY_LIMIT = 3
+
+# Other names of the countries (by ID), mostly in Spanish
+ALIASES = {
+    'ARG': ('Argentina',),
+    'AUS': ('Australia',),
+    'AUT': ('Austria',),
+    'BEL': ('Bélgica',),
+    'BOL': ('Bolivia',),
+    'BRA': ('Brasil',),
+    'CAN': ('Canadá',),
+    'CHE': ('Suiza', 'Switzerland'),
+    'CHL': ('Chile',),
+    'CHN': ('China',),
+    'COL': ('Colombia',),
+    'CRI': ('Costa Rica',),
+    'CUB': ('Cuba',),
+    'CZE': ('República Checa', 'Chequia', 'Czechia'),
+    'DEU': ('Alemania',),
+    'DNK': ('Dinamarca',),
+    'DOM': ('República Dominicana',),
+    'DZA': ('Argelia',),
+    'ECU': ('Ecuador',),
+    'EGY': ('Egipto', 'Egypt'),
+    'ESP': ('España',),
+    'FIN': ('Finlandia',),
+    'FRA': ('Francia',),
+    'GBR': ('Reino Unido', 'Gran Bretaña', 'Inglaterra', 'UK',
+            'Great Britain', 'England'),
+    'GRC': ('Grecia',),
+    'GTM': ('Guatemala',),
+    'HND': ('Honduras',),
+    'HUN': ('Hungría',),
+    'IND': ('India',),
+    'IDN': ('Indonesia',),
+    'IRL': ('Irlanda',),
+    'IRN': ('Irán', 'Iran'),
+    'ISL': ('Islandia',),
+    'ITA': ('Italia',),
+    'JPN': ('Japón',),
+    'KOR': ('Corea del Sur', 'Corea', 'South Korea', 'Korea'),
+    'MAR': ('Marruecos',),
+    'MEX': ('México',),
+    'NIC': ('Nicaragua',),
+    'NLD': ('Países Bajos', 'Holanda', 'Holland'),
+    'NOR': ('Noruega',),
+    'NZL': ('Nueva Zelanda',),
+    'PAN': ('Panamá',),
+    'PER': ('Perú',),
+    'POL': ('Polonia',),
+    'PRT': ('Portugal',),
+    'PRY': ('Paraguay',),
+    'ROU': ('Rumanía', 'Rumania'),
+    'RUS': ('Rusia', 'Russia'),
+    'SLV': ('El Salvador',),
+    'SWE': ('Suecia',),
+    'TUR': ('Turquía',),
+    'URY': ('Uruguay',),
+    'USA': ('Estados Unidos', 'EEUU', 'EE UU', 'US', 'America'),
+    'VEN': ('Venezuela',),
+    'ZAF': ('Sudáfrica', 'South Africa')
+}
+
+
+def fold(text):
+    """Obtain the form of a name used for comparisons.
+
+    Accents are removed, the case is folded and anything other than letters
+    and digits is reduced to single spaces ('Côte d'Ivoire' -> 'cote d
+    ivoire').
+    """
+    text = unicodedata.normalize('NFKD', text or '')
+    text = ''.join(c for c in text if not unicodedata.combining(c))
+
+    return ' '.join(re.split(r'\W+', text.casefold())).strip()
+
+
+def _trigrams(text):
+    """Obtain the trigrams of a folded name (padded with spaces)."""
+    text = '  %s ' % text
+
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+class CountryIndex(object):
+    """Lookup of the countries of the data by any of their forms.
+
+    Attributes:
+        countries (list[str]): Country names, as they appear in the data.
+        codes (list[str]): Country IDs, in the same order as countries.
+    """
+
+    def __init__(self, countries, codes, aliases=ALIASES):
+        self.countries = list(countries)
+        self.codes = list(codes)
+
+        # Folded form -> position of the country
+        self._forms = {}
+        self._trigrams = collections.defaultdict(set)
+
+        # Folded form -> positions of the countries sharing it
+        self._ambiguous = {}
+
+        by_code = {code: index for index, code in enumerate(self.codes)}
+        derived = collections.defaultdict(list)
+
+        for index, (name, code) in enumerate(zip(self.countries, self.codes)):
+            self._add(fold(name), index)
+            self._add(fold(code), index)
+
+            if ',' in name:
+                # 'Korea, Rep.' -> 'Korea'
+                derived[fold(name.split(',')[0])].append(index)
+
+        for code, names in aliases.items():
+            index = by_code.get(code)
+
+            if index is None:
+                continue
+
+            for alias in names:
+                self._add(fold(alias), index)
+
+        for form, indexes in derived.items():
+            if form in self._forms:
+                # Also a name or an alias
+                continue
+
+            if len(set(indexes)) == 1:
+                self._add(form, indexes[0])
+
+            else:
+                self._ambiguous[form] = sorted(set(indexes))
+
+                for gram in _trigrams(form):
+                    self._trigrams[gram].add(form)
+
+    def _add(self, form, index):
+        """Index a form of a country (the first country keeps it)."""
+        if not form or form in self._forms:
+            return
+
+        self._forms[form] = index
+
+        for gram in _trigrams(form):
+            self._trigrams[gram].add(form)
+
+    def __len__(self):
+        return len(self.countries)
+
+    def find(self, text):
+        """Obtain the position of a country, or None if not found."""
+        return self._forms.get(fold(text))
+
+    def similar(self, text, limit=FUZZY_LIMIT):
+        """Obtain the names of the countries most similar to a text.
+
+        Args:
+            text (str): Text written by the user.
+            limit (int): Maximum number of names.
+
+        Returns:
+            list[str]: Country names, most similar first (the countries
+            sharing the text, if it is ambiguous).
+        """
+        text = fold(text)
+
+        if text in self._ambiguous:
+            # Every country sharing the form
+            return [
+                self.countries[index] for index in self._ambiguous[text]
+            ][:limit]
+
+        candidates = set()
+
+        # Only the forms sharing some trigram are compared
+        for gram in _trigrams(text):
+            candidates.update(self._trigrams.get(gram, ()))
+
+        # Similarity of each country: best of its forms
+        scores = {}
+
+        for form in candidates:
+            score = difflib.SequenceMatcher(None, text, form).ratio()
+
+            for index in self._ambiguous.get(form) or [self._forms[form]]:
+                if score >= FUZZY_THRESHOLD and score > scores.get(index, 0):
+                    scores[index] = score
+
+        best = sorted(scores, key=lambda index: (-scores[index], index))
+
+        return [self.countries[index] for index in best[:limit]]
+
+    def resolve(self, text):
+        """Obtain the name of a country in the data.
+
+        Args:
+            text (str): Name, ID or alias written by the user.
+
+        Returns:
+            Tuple: Country name (None if not found), and similar names when
+            not found.
+        """
+        index = self.find(text)
+
+        if index is not None:
+            return self.countries[index], []
+
+        return None, self.similar(text)
+
+
+def did_you_mean(country, suggestions):
+    """Obtain the reply for an unknown country."""
+    return 'I do not know %s. Did you mean %s?' % (
+        country, ' or '.join(suggestions))
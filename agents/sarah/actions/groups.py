@@ -0,0 +1,273 @@
+# -*- coding: utf-8 -*-
+
+"""This file contains the regions and income groups of the WDI countries.
+
+The groups are defined in $ZOE_HOME/etc/sarah/groups.json (name, aliases
+and, for the groups the WDI metadata does not cover, their members, or "all"
+for every country). The members of the regions and income groups are taken
+from the Region and Income Group columns of WDI_Country.csv, the metadata
+file of the WDI download, when it is next to WDI_Data.csv.
+
+Membership is kept as one bit per group (in file order) for every country,
+plus AGGREGATE_BIT for the rows of the data that are aggregates themselves
+(GROUPS), so skipping them is a bitmask instead of a lookup per row.
+"""
+
+import codecs
+import csv
+import hashlib
+import io
+import json
+import os
+
+import numpy as np
+
+from actions.countries import CountryIndex, fold
+
+GROUPS_FILE = os.path.join(
+    os.getenv('ZOE_HOME'), 'etc', 'sarah', 'groups.json')
+
+METADATA_FILE = 'WDI_Country.csv'
+
+# Columns of METADATA_FILE with the name of a group
+METADATA_COLUMNS = ('Region', 'Income Group')
+
+# Weights of the population-weighted aggregates
+POPULATION = 'SP.POP.TOTL'
+
+# Rows of the WDI data that are aggregates, not countries
+GROUPS = [
+    'ARB', 'CEB', 'CSS', 'EAP', 'EAR', 'EAS', 'ECA', 'ECS', 'EMU', 'EUU',
+    'FCS', 'HIC', 'HPC', 'IBD', 'IBT', 'IDA', 'IDB', 'IDX', 'INX', 'LAC',
+    'LCN', 'LDC', 'LIC', 'LMC', 'LMY', 'LTE', 'MEA', 'MIC', 'MNA', 'NAC',
+    'OED', 'OSS', 'PRE', 'PSS', 'PST', 'SAS', 'SSA', 'SSF', 'SST', 'TEA',
+    'TEC', 'TLA', 'TMN', 'TSA', 'TSS', 'UMC', 'WLD'
+]
+
+# Bit of the rows in GROUPS (the others are the bits of codes())
+AGGREGATE_BIT = np.uint64(1 << 63)
+
+# Loaded definitions (path: (size and mtime, hash, definitions))
+_DEFINITIONS = {}
+
+# Lookup of the groups (hash of the definitions, CountryIndex)
+_RESOLVER = [None, None]
+
+
+def definitions(path=GROUPS_FILE):
+    """Obtain the definitions of the groups.
+
+    Returns:
+        dict: Groups by code, in file order (empty if the file is missing).
+    """
+    try:
+        stat = os.stat(path)
+        version = stat.st_size, stat.st_mtime_ns
+        cached = _DEFINITIONS.get(path)
+
+        # Read again only when the file changes
+        if cached is None or cached[0] != version:
+            with open(path, 'rb') as f:
+                data = f.read()
+
+            cached = version, hashlib.sha1(data).hexdigest(), json.loads(
+                data.decode('utf-8'))
+            _DEFINITIONS[path] = cached
+
+    except OSError:
+        return {}
+
+    return cached[2]
+
+
+def _digest():
+    """Obtain the hash of the loaded definitions (None if missing)."""
+    definitions()
+
+    return _DEFINITIONS.get(GROUPS_FILE, (None, None))[1]
+
+
+def codes():
+    """Obtain the codes of the groups, in bit order."""
+    return list(definitions())[:63]
+
+
+def metadata_path(datafile):
+    """Obtain the path of the metadata file of a WDI CSV file."""
+    return os.path.join(os.path.dirname(datafile), METADATA_FILE)
+
+
+def version(datafile):
+    """Obtain what the membership of a WDI CSV file depends on.
+
+    Returns:
+        dict: Hash of the definitions, and size and mtime of the metadata
+        (None if missing).
+    """
+    try:
+        stat = os.stat(metadata_path(datafile))
+        metadata = [stat.st_size, stat.st_mtime_ns]
+
+    except OSError:
+        metadata = None
+
+    return {'definitions': _digest(), 'metadata': metadata}
+
+
+def _metadata(datafile):
+    """Obtain the groups of every country from the metadata file.
+
+    Returns:
+        dict: Set of group codes by country ID.
+    """
+    path = metadata_path(datafile)
+    by_name = {}
+
+    for code, group in definitions().items():
+        for name in [group.get('name')] + group.get('aliases', []):
+            by_name[fold(name)] = code
+
+    result = {}
+
+    try:
+        with open(path, 'rb') as f:
+            data = f.read()
+
+    except OSError:
+        # No metadata
+        return result
+
+    # Some releases start with a byte order mark
+    if data.startswith(codecs.BOM_UTF8):
+        data = data[len(codecs.BOM_UTF8):]
+
+    reader = csv.reader(io.StringIO(data.decode('mac_roman'), newline=''))
+    header = next(reader, [])
+
+    try:
+        columns = [
+            header.index(column)
+            for column in ('Country Code',) + METADATA_COLUMNS
+        ]
+
+    except ValueError:
+        print('Unknown columns in %s' % path)
+        return result
+
+    for line in reader:
+        if len(line) <= max(columns):
+            continue
+
+        found = set()
+
+        for index in columns[1:]:
+            # 'High income: OECD' is in 'High income'
+            code = by_name.get(fold(line[index])) or by_name.get(
+                fold(line[index].split(':')[0]))
+
+            if code:
+                found.add(code)
+
+        result[line[columns[0]]] = found
+
+    return result
+
+
+def membership(country_codes, datafile=None):
+    """Obtain the groups of every country as bits.
+
+    Rows in GROUPS only have AGGREGATE_BIT: they are never members.
+
+    Args:
+        country_codes (list[str]): Country IDs.
+        datafile (str): Path to WDI_Data.csv, to read its metadata.
+
+    Returns:
+        numpy.ndarray: uint64 per country with the bit of every group in
+        codes() it belongs to.
+    """
+    groups = definitions()
+    group_codes = codes()
+    metadata = _metadata(datafile) if datafile else {}
+    aggregates = set(GROUPS)
+    bits = np.zeros(len(country_codes), dtype=np.uint64)
+
+    for index, country in enumerate(country_codes):
+        if country in aggregates:
+            bits[index] = AGGREGATE_BIT
+            continue
+
+        for bit, code in enumerate(group_codes):
+            members = groups[code].get('members') or []
+
+            if members == 'all' or country in members or (
+                    code in metadata.get(country, ())):
+                bits[index] |= np.uint64(1 << bit)
+
+    return bits
+
+
+def countries(bits):
+    """Obtain the mask of the rows that are countries, not aggregates.
+
+    Args:
+        bits (numpy.ndarray): Membership of every row (see membership).
+
+    Returns:
+        numpy.ndarray: Boolean array with one value per row.
+    """
+    return (bits & AGGREGATE_BIT) == 0
+
+
+def members(bits, group_codes, group):
+    """Obtain the mask of the members of a group.
+
+    Args:
+        bits (numpy.ndarray): Membership of every country (see membership).
+        group_codes (list[str]): Codes of the groups, in bit order.
+        group (str): Code of the group.
+
+    Returns:
+        numpy.ndarray: Boolean array with one value per country, or None if
+        the group is unknown.
+    """
+    if group not in group_codes:
+        return None
+
+    flag = np.uint64(1 << group_codes.index(group))
+
+    return (bits & flag) != 0
+
+
+def resolver():
+    """Obtain the lookup of the groups by name, code or alias."""
+    digest = _digest()
+
+    if _RESOLVER[0] != digest or _RESOLVER[1] is None:
+        groups = definitions()
+        group_codes = codes()
+
+        _RESOLVER[:] = digest, CountryIndex(
+            [groups[code]['name'] for code in group_codes], group_codes,
+            {code: groups[code].get('aliases', []) for code in group_codes})
+
+    return _RESOLVER[1]
+
+
+def resolve(text):
+    """Obtain the group named in a text.
+
+    Args:
+        text (str): Name, code or alias written by the user.
+
+    Returns:
+        Tuple: code and name of the group (None if not found), and similar
+        names when not found.
+    """
+    lookup = resolver()
+    index = lookup.find(text)
+
+    if index is None:
+        return None, None, lookup.similar(text)
+
+    return lookup.codes[index], lookup.countries[index], []
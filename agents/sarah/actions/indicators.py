@@ -0,0 +1,354 @@
+# -*- coding: utf-8 -*-
+
+"""Declarative registry of the WDI indicators available as actions.
+
+Every entry generates one action per kind in KINDS, named after the entry
+('gini', 'gini-year', 'gini-avg', ...), and the matching commands.json
+patterns. Any other WDI indicator can be queried by its code through the
+GENERIC actions ('wdi NY.GDP.MKTP.CD spain').
+
+Entry keys:
+    code (str): WDI indicator code.
+    name (str): Name used in the replies.
+    unit (str): Text appended to the values in the replies.
+    scale (float): Values are divided by it before formatting.
+    aggregate (str): How the values of the countries of a region or income
+        group are combined, one of AGGREGATES (default 'mean').
+    templates (dict): Replies that replace the DEFAULT_TEMPLATES. They are
+        str.format() strings receiving name, unit, country, year and value
+        (start, end and the results of the series for the SERIES_KINDS,
+        num, values, rank and total for the RANK_KINDS, how and countries
+        for the group kind, where country is the name of the group).
+
+Run this file to print the commands.json patterns of the registry:
+
+    python3 indicators.py > $ZOE_HOME/etc/sarah/commands.json
+"""
+
+import json
+import re
+
+# Kinds of query (the first one has no suffix in the action name)
+KINDS = (
+    'latest', 'year', 'avg', 'max', 'min', 'count', 'range', 'growth', 'trend',
+    'top', 'bottom', 'rank', 'group')
+
+# Kinds of query over the values of a country in a span of years ('2000-2015')
+SERIES_KINDS = ('range', 'growth', 'trend')
+
+# Kinds of query over the ranking of the countries in a year
+RANK_KINDS = ('top', 'bottom', 'rank')
+
+# Countries in the top and bottom replies: default and maximum
+TOP_NUM = 10
+TOP_LIMIT = 50
+
+# Aggregates of the groups (see store.GROUP_AGGREGATES) and their names
+AGGREGATES = {
+    'mean': 'Average',
+    'sum': 'Total',
+    'weighted': 'Population-weighted average'
+}
+
+# Name of the actions that take the indicator code from the message
+GENERIC = 'wdi'
+
+DEFAULT_TEMPLATES = {
+    'latest': '{name} in {country} is {value:.2f}{unit} ({year})',
+    'no-latest': 'No {name} value for {country}',
+    'year': '{name} for {country} in {year} is {value:.2f}{unit}',
+    'no-year': 'No {name} value for {country} in {year}',
+    'avg': 'Average {name} in {year} is {value:.2f}{unit}',
+    'no-avg': 'No {name} values in {year}',
+    'max': 'Maximum {name} in {year} is {value:.2f}{unit} ({country})',
+    'no-max': 'No maximum {name} value in {year}',
+    'min': 'Minimum {name} in {year} is {value:.2f}{unit} ({country})',
+    'no-min': 'No minimum {name} value in {year}',
+    'count': 'The number of countries with {name} in {year} is {value:d}',
+    'range': '{name} in {country} from {start} to {end}: {values}',
+    'range-value': '{year}: {value:.2f}{unit}',
+    'no-range': 'No {name} values for {country} in {year}',
+    'growth': '{name} in {country} changed {change:+.2f} % from {start} to '
+              '{end}{cagr}',
+    'growth-cagr': ' ({cagr:+.2f} % per year)',
+    'no-growth': 'Not enough {name} values for {country} in {year}',
+    'trend': '{name} in {country} changes {slope:+.2f}{unit} per year from '
+             '{start} to {end}',
+    'no-trend': 'Not enough {name} values for {country} in {year}',
+    'top': 'Top {num} {name} in {year}: {values}',
+    'top-value': '{rank}. {country} ({value:.2f}{unit})',
+    'no-top': 'No {name} values in {year}',
+    'bottom': 'Bottom {num} {name} in {year}: {values}',
+    'bottom-value': '{rank}. {country} ({value:.2f}{unit})',
+    'no-bottom': 'No {name} values in {year}',
+    'rank': '{country} is number {rank} of {total} in {name} in {year} '
+            '({value:.2f}{unit})',
+    'no-rank': 'No {name} value for {country} in {year}',
+    'group': '{how} {name} in {country} in {year} is {value:.2f}{unit}'
+             '{countries}',
+    'group-countries': ' ({num} countries)',
+    'group-row': ' (group data)',
+    'no-group': 'No {name} values for {country} in {year}'
+}
+
+# Commands of every kind (pattern, command). The pattern receives the
+# escaped name of the entry. Countries may have several words, but no digits
+# (so the year is not taken as part of the country).
+PATTERNS = {
+    'latest': (r'^%s ([^\d&=]+)$', 'action={action}&country=$0'),
+    'year': (
+        r'^%s ([^\d&=]+) (\d+)$', 'action={action}&country=$0&year=$1'),
+    'avg': (r'^average %s (\d+)$', 'action={action}&year=$0'),
+    'max': (r'^max %s (\d+)$', 'action={action}&year=$0'),
+    'min': (r'^min %s (\d+)$', 'action={action}&year=$0'),
+    'count': (r'^count %s (\d+)$', 'action={action}&year=$0'),
+    'range': (
+        r'^%s ([^\d&=]+) (\d+-\d+)$', 'action={action}&country=$0&year=$1'),
+    'growth': (
+        r'^growth %s ([^\d&=]+) (\d+-\d+)$',
+        'action={action}&country=$0&year=$1'),
+    'trend': (
+        r'^trend %s ([^\d&=]+) (\d+-\d+)$',
+        'action={action}&country=$0&year=$1'),
+    'top': (r'^top ?(\d*) %s (\d+)$', 'action={action}&num=$0&year=$1'),
+    'bottom': (r'^bottom ?(\d*) %s (\d+)$', 'action={action}&num=$0&year=$1'),
+    'rank': (
+        r'^rank %s ([^\d&=]+) (\d+)$', 'action={action}&country=$0&year=$1'),
+    'group': (
+        r'^average %s (?:in )?([^\d&=]+) (\d+)$',
+        'action={action}&country=$0&year=$1')
+}
+
+# Commands of the GENERIC actions (the code is the first argument)
+GENERIC_PATTERNS = {
+    'latest': (
+        r'^%s ([\w.]+) ([^\d&=]+)$', 'action={action}&code=$0&country=$1'),
+    'year': (
+        r'^%s ([\w.]+) ([^\d&=]+) (\d+)$',
+        'action={action}&code=$0&country=$1&year=$2'),
+    'avg': (r'^average %s ([\w.]+) (\d+)$', 'action={action}&code=$0&year=$1'),
+    'max': (r'^max %s ([\w.]+) (\d+)$', 'action={action}&code=$0&year=$1'),
+    'min': (r'^min %s ([\w.]+) (\d+)$', 'action={action}&code=$0&year=$1'),
+    'count': (
+        r'^count %s ([\w.]+) (\d+)$', 'action={action}&code=$0&year=$1'),
+    'range': (
+        r'^%s ([\w.]+) ([^\d&=]+) (\d+-\d+)$',
+        'action={action}&code=$0&country=$1&year=$2'),
+    'growth': (
+        r'^growth %s ([\w.]+) ([^\d&=]+) (\d+-\d+)$',
+        'action={action}&code=$0&country=$1&year=$2'),
+    'trend': (
+        r'^trend %s ([\w.]+) ([^\d&=]+) (\d+-\d+)$',
+        'action={action}&code=$0&country=$1&year=$2'),
+    'top': (
+        r'^top ?(\d*) %s ([\w.]+) (\d+)$',
+        'action={action}&num=$0&code=$1&year=$2'),
+    'bottom': (
+        r'^bottom ?(\d*) %s ([\w.]+) (\d+)$',
+        'action={action}&num=$0&code=$1&year=$2'),
+    'rank': (
+        r'^rank %s ([\w.]+) ([^\d&=]+) (\d+)$',
+        'action={action}&code=$0&country=$1&year=$2'),
+    'group': (
+        r'^average %s ([\w.]+) (?:in )?([^\d&=]+) (\d+)$',
+        'action={action}&code=$0&country=$1&year=$2')
+}
+
+# Commands of the queries across indicators (see query.py). Indicators are
+# given by their name in the registry or their code; the year is optional
+# (latest values if missing).
+QUERY_PATTERNS = {
+    r'^correlation (?:between )?([\w.]+) (?:and |vs )?([\w.]+)'
+    r'(?: (?:in )?(\d+))?$': 'action=correlation&x=$0&y=$1&year=$2',
+    r'^scatter ([\w.]+) (?:and |vs )?([\w.]+)(?: (?:in )?(\d+))?$':
+        'action=scatter&x=$0&y=$1&year=$2',
+    r'^countries with ([^&=]+?)(?: in (\d+))?$':
+        'action=filter&where=$0&year=$1'
+}
+
+# Commands about the agent itself (see metrics.py)
+AGENT_PATTERNS = {
+    r'^stats$': 'action=stats'
+}
+
+INDICATORS = {
+    'gini': {
+        'code': 'SI.POV.GINI',
+        'name': 'Gini index',
+        'scale': 100,
+        'aggregate': 'weighted',
+        'templates': {
+            'latest': 'The Gini index in {country} is {value:.4f} ({year})',
+            'no-latest': 'No Gini index value for {country}',
+            'year': 'The Gini index for {country} in {year} is {value:.4f}',
+            'no-year': 'No Gini index value for {country} in {year}',
+            'avg': 'Average Gini in {year} is {value:.4f}',
+            'no-avg': 'No Gini index value in {year}',
+            'max': 'Maximum Gini in {year} is {value:.4f} ({country})',
+            'no-max': 'No maximum Gini index value in {year}',
+            'min': 'Minimum Gini in {year} is {value:.4f} ({country})',
+            'no-min': 'No minimum Gini index value in {year}',
+            'count': 'The number of countries with Gini index in {year} '
+                     'is {value:d}',
+            'range-value': '{year}: {value:.4f}',
+            'trend': 'The Gini index in {country} changes {slope:+.4f} per '
+                     'year from {start} to {end}',
+            'top-value': '{rank}. {country} ({value:.4f})',
+            'bottom-value': '{rank}. {country} ({value:.4f})',
+            'rank': '{country} is number {rank} of {total} in Gini index in '
+                    '{year} ({value:.4f})',
+            'group': '{how} Gini index in {country} in {year} is '
+                     '{value:.4f}{countries}'
+        }
+    },
+
+    'pib': {
+        'code': 'NY.GDP.MKTP.CD',
+        'name': 'GDP',
+        'unit': ' Million $',
+        'scale': 1000000,
+        'templates': {
+            'latest': 'GDP in {country} is {value:.2f} Million $ ({year})',
+            'no-latest': 'No GDP values in {country}',
+            'year': 'GDP in {country} on {year} is {value:.2f} Million $',
+            'no-year': 'No GDP in {country} on {year}',
+            'avg': 'Average GDP in {year} is {value:.2f} Million $',
+            'no-avg': 'No countries with GDP value in {year}',
+            'max': 'Maximum GDP in {year} is {value:.4f} ({country})',
+            'no-max': 'No maximum GDP in {year}',
+            'min': 'Minimum GDP in {year} is {value:.4f} ({country})',
+            'no-min': 'No minimum GDP in {year}',
+            'count': 'The number of countries with GDP values in {year} '
+                     'is {value:d}'
+        }
+    },
+
+    'pibpc': {
+        'code': 'NY.GDP.PCAP.CD',
+        'name': 'GDP per Cápita',
+        'unit': ' $',
+        'aggregate': 'weighted',
+        'templates': {
+            'latest': 'GDP per Cápita in {country} is $ {value:.2f} ({year})',
+            'no-latest': 'No GDP per Cápita in {country}',
+            'year': 'GDP per Cápita of {country} in {year} is $ {value:.2f}',
+            'no-year': 'No GDP per Cápita for {country} in {year}',
+            'avg': 'Average GDP per Cápita in {year} is $ {value:.2f}',
+            'no-avg': 'No average GDP per Cápita in {year}',
+            'max': 'Maximum GDP per Cápita in {year} is {value:.4f} '
+                   '({country})',
+            'no-max': 'No maximum GDP per Cápita index value in {year}',
+            'min': 'Minimum GDP per Cápita in {year} is {value:.4f} '
+                   '({country})',
+            'no-min': 'No minimum GDP per Cápita index value in {year}',
+            'count': 'The number of countries with GDP per Cápita in {year} '
+                     'is {value:d}'
+        }
+    },
+
+    'unemp': {
+        'code': 'SL.UEM.TOTL.NE.ZS',
+        'name': 'unemployment rate',
+        'unit': ' %',
+        'aggregate': 'weighted',
+        'templates': {
+            'latest': 'The unemployment rate in {country} is {value:.2f} % '
+                      '({year})',
+            'no-latest': 'No unemployment rate in {country}',
+            'year': 'The unemployment rate in {country} in {year} is '
+                    '{value:.2f} %',
+            'no-year': 'No unemployment rate in {country} in {year}',
+            'avg': 'The average unemployment rate in {year} is {value:.2f} %',
+            'no-avg': 'No average unemployment rate in {year}',
+            'max': 'Maximum unemployement in {year} is {value:.2f} '
+                   '({country})',
+            'no-max': 'No maximum unemployement value in {year}',
+            'min': 'Minimum unemployement in {year} is {value:.2f} '
+                   '({country})',
+            'no-min': 'No minimum unemployement value in {year}',
+            'count': 'The number of countries with unemployment values in '
+                     '{year} is {value:d}'
+        }
+    }
+}
+
+
+def action_name(name, kind):
+    """Obtain the name of the action of an entry for a kind of query."""
+    if kind == KINDS[0]:
+        return name
+
+    return '%s-%s' % (name, kind)
+
+
+def template(indicator, kind):
+    """Obtain the reply template of an entry for a kind of query."""
+    return indicator.get('templates', {}).get(kind) or DEFAULT_TEMPLATES[kind]
+
+
+def span(text):
+    """Obtain the first and last year of a span of years.
+
+    Args:
+        text (str): Span as in the commands ('2000-2015'), or a single year.
+
+    Returns:
+        Tuple: first and last year (in ascending order).
+
+    Raises:
+        ValueError: If the text is not a span of years.
+    """
+    start, _, end = str(text).partition('-')
+    start = int(start)
+    end = int(end) if end else start
+
+    return min(start, end), max(start, end)
+
+
+def top_num(text):
+    """Obtain the number of countries of a top or bottom query.
+
+    Args:
+        text (str): Number in the message (TOP_NUM if empty).
+
+    Returns:
+        int: Number of countries, up to TOP_LIMIT.
+
+    Raises:
+        ValueError: If the text is not a positive number.
+    """
+    num = int(text) if text else TOP_NUM
+
+    if num <= 0:
+        raise ValueError('Not a positive number: %d' % num)
+
+    return min(num, TOP_LIMIT)
+
+
+def commands():
+    """Obtain the commands.json patterns of all the actions.
+
+    Returns:
+        dict: Patterns and their commands, in registry order.
+    """
+    result = {}
+
+    for name in INDICATORS:
+        for kind in KINDS:
+            pattern, cmd = PATTERNS[kind]
+            result[pattern % re.escape(name)] = cmd.format(
+                action=action_name(name, kind))
+
+    for kind in KINDS:
+        pattern, cmd = GENERIC_PATTERNS[kind]
+        result[pattern % re.escape(GENERIC)] = cmd.format(
+            action=action_name(GENERIC, kind))
+
+    result.update(QUERY_PATTERNS)
+    result.update(AGENT_PATTERNS)
+
+    return result
+
+
+if __name__ == '__main__':
+    print(json.dumps(commands(), indent=4, ensure_ascii=False))
@@ -6,128 +6,50 @@ with a given name.
 
 All functions must receive the parser and additional parameters such as
 database connector to use.
-"""
-
-from actions import wdi
-
-action_map = {
-    'gini' : {
-        'conf': 'wdi_csv',
-        'func': wdi.gini
-    },
-
-    'gini-avg' : {
-        'conf': 'wdi_csv',
-        'func': wdi.gini_avg
-    },
-
-    'gini-year': {
-        'conf': 'wdi_csv',
-        'func': wdi.gini_year
-    },
-
-    'gini-count': {
-        'conf': 'wdi_csv',
-        'func': wdi.gini_count
-    },
-
-    'gini-max': {
-        'conf': 'wdi_csv',
-        'func': wdi.gini_max
-    },
-
-    'gini-min': {
-        'conf': 'wdi_csv',
-        'func': wdi.gini_min
-    },
-
-    'pib' : {
-        'conf': 'wdi_csv',
-        'func': wdi.pib
-    },
-
-    'pib-avg' : {
-        'conf': 'wdi_csv',
-        'func': wdi.pib_avg
-    },
-
-    'pib-year': {
-        'conf': 'wdi_csv',
-        'func': wdi.pib_year
-    },
-
-    'pib-max': {
-        'conf': 'wdi_csv',
-        'func': wdi.pib_max
-    },
 
-    'pib-min': {
-        'conf': 'wdi_csv',
-        'func': wdi.pib_min
-    },
+Actions may also set a 'timeout' (seconds) to replace the default one of
+the agent. Actions without 'conf' do not use a database.
 
-    'pib-count': {
-        'conf': 'wdi_csv',
-        'func': wdi.pib_count
-    },
-
-    'pibpc': {
-        'conf': 'wdi_csv',
-        'func': wdi.pibpc
-    },
-
-    'pibpc-avg': {
-        'conf': 'wdi_csv',
-        'func': wdi.pibpc_avg
-    },
-
-    'pibpc-year': {
-        'conf': 'wdi_csv',
-        'func': wdi.pibpc_year
-    },
-
-    'pibpc-max': {
-        'conf': 'wdi_csv',
-        'func': wdi.pibpc_max
-    },
-
-    'pibpc-min': {
-        'conf': 'wdi_csv',
-        'func': wdi.pibpc_min
-    },
-
-    'pibpc-count': {
-        'conf': 'wdi_csv',
-        'func': wdi.pibpc_count
-    },
+The functions in conf_loaders are called once per config section (on startup
+and when the config changes) and return additional entries for the config
+passed to the actions, such as already loaded data.
+"""
 
-    'unemp' : {
-        'conf': 'wdi_csv',
-        'func': wdi.unemp
-    },
+from actions import metrics
+from actions import query
+from actions import wdi
 
-    'unemp-avg' : {
-        'conf': 'wdi_csv',
-        'func': wdi.unemp_avg
-    },
+# Section of databases.conf used by the WDI actions. Use 'world_sql' to serve
+# them from the SQLite database (see actions/wdi_sql.py).
+WDI_CONF = 'wdi_csv'
 
-    'unemp-year' : {
-        'conf': 'wdi_csv',
-        'func': wdi.unemp_year
-    },
+conf_loaders = {
+    'wdi_csv': wdi.prepare,
+    'world_sql': wdi.prepare
+}
 
-    'unemp-max': {
-        'conf': 'wdi_csv',
-        'func': wdi.unemp_max
-    },
+# WDI actions, generated from the indicators registry
+action_map = {
+    name: {
+        'conf': WDI_CONF,
+        'func': func
+    }
+    for name, (key, func) in wdi.ACTIONS.items()
+}
 
-    'unemp-min': {
-        'conf': 'wdi_csv',
-        'func': wdi.unemp_min
-    },
+# Queries across several WDI indicators
+action_map.update({
+    name: {
+        'conf': WDI_CONF,
+        'func': func
+    }
+    for name, func in query.ACTIONS.items()
+})
 
-    'unemp-count': {
-        'conf': 'wdi_csv',
-        'func': wdi.unemp_count
+# Actions about the agent itself
+action_map.update({
+    name: {
+        'func': func
     }
-}
+    for name, func in metrics.ACTIONS.items()
+})
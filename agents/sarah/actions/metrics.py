@@ -0,0 +1,373 @@
+# -*- coding: utf-8 -*-
+
+"""This file contains the metrics of the agent.
+
+Counters, gauges and latency histograms are kept in memory for the life of
+the process, by name and labels, and dumped in the Prometheus text format
+(see dump()). The agent writes the dump to METRICS_FILE on SIGUSR1, and the
+stats action replies with a summary:
+
+    sarah stats
+
+Every action is counted by its result (ok, error, cached, timeout or
+rejected). Actions that time out are counted again when they finish. The
+data helpers of the engines (GETTERS in wdi.py and wdi_sql.py) are wrapped
+with instrument(), which measures their calls and the data rows they scan.
+Rows are reported with scanned() by the code that examines them, so the
+stores count the values they go through and SQLite the rows its queries
+return (it scans its own tables).
+"""
+
+import bisect
+import functools
+import os
+import threading
+import time
+
+PREFIX = 'sarah_'
+
+# Upper bounds (seconds) of the buckets of the latency histograms
+LATENCY_BUCKETS = (
+    0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5,
+    5, 10, 30
+)
+
+# Type and description of every metric
+METRICS = {
+    'actions_total': ('counter', 'Actions answered, by result'),
+    'action_seconds': ('histogram', 'Time executing an action'),
+    'action_rows_scanned_total': (
+        'counter', 'Data rows examined by the actions'),
+    'getter_seconds': ('histogram', 'Time in the data helpers'),
+    'getter_rows_scanned_total': (
+        'counter', 'Data rows examined by the data helpers'),
+    'cache_hits_total': ('counter', 'Replies found in the cache'),
+    'cache_misses_total': ('counter', 'Replies not found in the cache'),
+    'cache_evictions_total': (
+        'counter', 'Replies removed from the cache to make room'),
+    'cache_entries': ('gauge', 'Replies in the cache'),
+    'cache_hit_ratio': ('gauge', 'Share of the lookups found in the cache'),
+    'loads_total': ('counter', 'Loads of a datafile'),
+    'load_seconds': ('gauge', 'Time of the latest load of a datafile')
+}
+
+# Actions listed in the summary
+SUMMARY_ACTIONS = 10
+
+# Values by (name, labels). Histograms are [count per bucket..., sum, count]
+_VALUES = {}
+_LOCK = threading.Lock()
+
+# Functions called before dumping, returning (name, labels, value) tuples
+_COLLECTORS = []
+
+# Rows scanned by the current thread
+_LOCAL = threading.local()
+
+
+def _key(name, labels):
+    """Obtain the key of a metric with some labels."""
+    return name, tuple(sorted(labels.items()))
+
+
+def inc(name, amount=1, **labels):
+    """Add to a counter."""
+    key = _key(name, labels)
+
+    with _LOCK:
+        _VALUES[key] = _VALUES.get(key, 0) + amount
+
+
+def gauge(name, value, **labels):
+    """Set the value of a gauge."""
+    with _LOCK:
+        _VALUES[_key(name, labels)] = value
+
+
+def observe(name, value, **labels):
+    """Add a value (seconds) to a histogram."""
+    key = _key(name, labels)
+    index = bisect.bisect_left(LATENCY_BUCKETS, value)
+
+    with _LOCK:
+        histogram = _VALUES.get(key)
+
+        if histogram is None:
+            histogram = _VALUES[key] = [0] * (len(LATENCY_BUCKETS) + 3)
+
+        # Values above the last bound only count in +Inf
+        histogram[index] += 1
+        histogram[-2] += value
+        histogram[-1] += 1
+
+
+def collect(collector):
+    """Call a function before every dump to update some metrics.
+
+    Args:
+        collector (function): Returns (name, labels, value) tuples to set.
+    """
+    if collector not in _COLLECTORS:
+        _COLLECTORS.append(collector)
+
+
+def scanned(rows):
+    """Report data rows examined by the current thread."""
+    _LOCAL.rows = getattr(_LOCAL, 'rows', 0) + rows
+
+
+def _rows():
+    """Obtain the rows examined by the current thread so far."""
+    return getattr(_LOCAL, 'rows', 0)
+
+
+def record(action, seconds=None, status='ok', rows=0):
+    """Count an action.
+
+    Args:
+        action (str): Name of the action in the mapper.
+        seconds (float): Time executing it, if it was executed.
+        status (str): ok, error, cached, timeout or rejected.
+        rows (int): Data rows it examined.
+    """
+    inc('actions_total', action=action, status=status)
+
+    if seconds is not None:
+        observe('action_seconds', seconds, action=action)
+
+    if rows:
+        inc('action_rows_scanned_total', rows, action=action)
+
+
+def call(action, func, *args):
+    """Execute an action, counting it with its time and rows scanned.
+
+    Returns:
+        The result of the action (exceptions are raised after counting).
+    """
+    rows = _rows()
+    start = time.perf_counter()
+    status = 'error'
+
+    try:
+        result = func(*args)
+        status = 'ok'
+
+        return result
+
+    finally:
+        record(action, time.perf_counter() - start, status, _rows() - rows)
+
+
+def instrument(getters):
+    """Wrap the data helpers of an engine to measure their calls.
+
+    Args:
+        getters (dict): Functions by name, receiving the config first.
+
+    Returns:
+        dict: Wrapped functions by name.
+    """
+    return {name: _timed(name, func) for name, func in getters.items()}
+
+
+def _timed(name, func):
+    """Wrap a data helper to measure its time and rows scanned."""
+
+    @functools.wraps(func)
+    def wrapper(config, *args, **kwargs):
+        labels = {'engine': config.get('engine') or 'memory', 'getter': name}
+        rows = _rows()
+        start = time.perf_counter()
+
+        try:
+            return func(config, *args, **kwargs)
+
+        finally:
+            observe('getter_seconds', time.perf_counter() - start, **labels)
+            inc('getter_rows_scanned_total', _rows() - rows, **labels)
+
+    return wrapper
+
+
+def loaded(path, seconds, engine='memory'):
+    """Count a load of a datafile and its time."""
+    inc('loads_total', path=path, engine=engine)
+    gauge('load_seconds', seconds, path=path, engine=engine)
+
+
+def _escape(value):
+    """Escape a label value of the text format."""
+    return str(value).replace('\\', r'\\').replace('"', r'\"').replace(
+        '\n', r'\n')
+
+
+def _labels(labels):
+    """Format the labels of a sample."""
+    if not labels:
+        return ''
+
+    return '{%s}' % ','.join(
+        '%s="%s"' % (name, _escape(value)) for name, value in labels)
+
+
+def _snapshot():
+    """Obtain a copy of the values, after calling the collectors."""
+    for collector in list(_COLLECTORS):
+        for name, labels, value in collector():
+            gauge(name, value, **labels)
+
+    with _LOCK:
+        return {
+            key: list(value) if isinstance(value, list) else value
+            for key, value in _VALUES.items()
+        }
+
+
+def dump():
+    """Obtain all the metrics in the Prometheus text format.
+
+    Returns:
+        str: Text of the metrics.
+    """
+    values = _snapshot()
+    lines = []
+
+    for name, (kind, description) in METRICS.items():
+        samples = sorted(
+            (labels, value) for (metric, labels), value in values.items()
+            if metric == name)
+
+        if not samples:
+            continue
+
+        full = PREFIX + name
+        lines.append('# HELP %s %s' % (full, description))
+        lines.append('# TYPE %s %s' % (full, kind))
+
+        for labels, value in samples:
+            if kind != 'histogram':
+                lines.append('%s%s %s' % (full, _labels(labels), value))
+                continue
+
+            total = 0
+
+            for bound, count in zip(
+                    LATENCY_BUCKETS + ('+Inf',), value[:-2]):
+                total += count
+                lines.append('%s_bucket%s %d' % (
+                    full, _labels(labels + (('le', str(bound)),)), total))
+
+            lines.append('%s_sum%s %s' % (full, _labels(labels), value[-2]))
+            lines.append('%s_count%s %d' % (full, _labels(labels), value[-1]))
+
+    return '\n'.join(lines) + '\n'
+
+
+def write(path):
+    """Write the dump to a file (replacing it at once)."""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temp = '%s.%d' % (path, os.getpid())
+
+    with open(temp, 'w') as f:
+        f.write(dump())
+
+    os.replace(temp, path)
+
+
+def _percentile(histogram, percentile):
+    """Obtain the bucket bound below which a percentile of a histogram is.
+
+    Returns:
+        float: Seconds (None if above the last bucket).
+    """
+    target = histogram[-1] * percentile / 100
+    total = 0
+
+    for bound, count in zip(LATENCY_BUCKETS, histogram[:-2]):
+        total += count
+
+        if total >= target:
+            return bound
+
+    return None
+
+
+def _ms(seconds):
+    """Format a bucket bound."""
+    if seconds is None:
+        return '> %g s' % LATENCY_BUCKETS[-1]
+
+    return '< %g ms' % (seconds * 1000)
+
+
+def summary():
+    """Obtain a summary of the metrics for the users.
+
+    Returns:
+        str: Actions, most called ones, cache and loads.
+    """
+    values = _snapshot()
+
+    statuses = {}
+    calls = {}
+
+    for (name, labels), value in values.items():
+        labels = dict(labels)
+
+        if name == 'actions_total':
+            statuses[labels['status']] = (
+                statuses.get(labels['status'], 0) + value)
+            calls[labels['action']] = calls.get(labels['action'], 0) + value
+
+    if not calls:
+        lines = ['No actions yet']
+
+    else:
+        lines = ['%d actions (%s)' % (sum(calls.values()), ', '.join(
+            '%d %s' % (value, status)
+            for status, value in sorted(statuses.items())))]
+
+    for action in sorted(calls, key=calls.get, reverse=True)[
+            :SUMMARY_ACTIONS]:
+        histogram = values.get(_key('action_seconds', {'action': action}))
+        line = '%s: %d' % (action, calls[action])
+
+        rows = values.get(
+            _key('action_rows_scanned_total', {'action': action}))
+
+        if histogram:
+            line += ', p50 %s, p99 %s' % (
+                _ms(_percentile(histogram, 50)),
+                _ms(_percentile(histogram, 99)))
+
+        if histogram and rows:
+            line += ', %d rows per call' % (rows / histogram[-1])
+
+        lines.append(line)
+
+    hits = values.get(_key('cache_hits_total', {}))
+    misses = values.get(_key('cache_misses_total', {}))
+
+    if hits or misses:
+        lines.append('Cache: %d%% hits (%d of %d)' % (
+            100 * hits / (hits + misses), hits, hits + misses))
+
+    for (name, labels), value in sorted(values.items()):
+        if name == 'load_seconds':
+            labels = dict(labels)
+            lines.append('Loaded %s in %.2f s (%s)' % (
+                os.path.basename(labels['path']), value, labels['engine']))
+
+    return '\n'.join(lines)
+
+
+def action(config, parser):
+    """Reply with the summary of the metrics (stats command)."""
+    return summary()
+
+
+# Actions about the agent itself (name: function)
+ACTIONS = {
+    'stats': action
+}
@@ -0,0 +1,278 @@
+# -*- coding: utf-8 -*-
+
+"""This file contains the queries across several WDI indicators.
+
+The matrices of the indicators (country x year, see wdi.matrices) share the
+country axis, so they are joined by taking the same year column of each one
+(or the latest value of every country when no year is given) and combining
+them element-wise:
+
+    correlation gini pibpc 2010
+    scatter pibpc unemp in 2015
+    countries with unemp > 20 and pibpc > 10000
+
+Indicators are given by their name in the registry (values scaled as in the
+other replies) or by their WDI code, in any case. Aggregates (GROUPS) are
+excluded. If the datafile is not preloaded, only the indicators of the query
+are read from it.
+"""
+
+import re
+
+import numpy as np
+
+from actions import indicators
+from actions import wdi
+
+# Comparisons of the filters
+OPERATORS = {
+    '<': np.less,
+    '>': np.greater
+}
+
+CONDITION = re.compile(r'^([\w.]+) *([<>]) *(-?\d+(?:\.\d+)?)$')
+
+# Countries listed in the replies of the filters
+FILTER_LIMIT = 50
+
+
+def _indicator(config, name):
+    """Obtain the code and registry entry of an indicator.
+
+    Args:
+        config (ConfigParser): Information about datafile to use.
+        name (str): Name in the registry or WDI code.
+
+    Returns:
+        Tuple: code and entry (empty for codes not in the registry).
+    """
+    entry = indicators.INDICATORS.get(name.lower())
+
+    if entry:
+        return entry['code'], entry
+
+    # Code in the data, written in any case
+    return wdi.indicator_code(config, name) or name, {}
+
+
+def _latest(matrix):
+    """Obtain the latest value of every country (NaN if none)."""
+    valid = ~np.isnan(matrix)
+    col = matrix.shape[1] - 1 - valid[:, ::-1].argmax(axis=1)
+    values = matrix[np.arange(len(matrix)), col]
+
+    return np.where(valid.any(axis=1), values, np.nan)
+
+
+def _columns(config, names, year):
+    """Obtain the values of several indicators in a year, joined by country.
+
+    Args:
+        config (ConfigParser): Information about datafile to use.
+        names (list[str]): Indicators (names in the registry or codes).
+        year (str): Year (from parser), or empty for the latest values.
+
+    Returns:
+        Tuple: country names, scaled columns (one per indicator, GROUPS
+        excluded) and names of the indicators for the replies, or an error
+        string.
+    """
+    # Get year
+    try:
+        year = int(year) if year else None
+
+    except ValueError:
+        return 'When do you say?'
+
+    # Codes, matrices and mask of the same store
+    config = wdi.pin(config, [
+        indicators.INDICATORS.get(name.lower(), {}).get('code') or name
+        for name in names])
+    found = [_indicator(config, name) for name in names]
+    data = wdi.matrices(config, [code for code, _ in found])
+
+    if data is None:
+        return 'Cant find the database %s' % config.get('path')
+
+    countries, _, first_year, matrices = data
+    mask = wdi.country_mask(config)
+    columns = []
+    labels = []
+
+    for (code, entry), matrix in zip(found, matrices):
+        if matrix is None:
+            return 'I do not know the indicator %s' % code
+
+        if year is None:
+            column = _latest(matrix)
+
+        elif 0 <= year - first_year < matrix.shape[1]:
+            column = matrix[:, year - first_year]
+
+        else:
+            column = np.full(len(countries), np.nan)
+
+        columns.append(
+            np.where(mask, column, np.nan) / entry.get('scale', 1))
+        labels.append(entry.get('name') or wdi.indicator_name(config, code))
+
+    return countries, columns, labels
+
+
+def _when(year):
+    """Obtain the text of the year of a query."""
+    return 'in %s' % year if year else 'with the latest values'
+
+
+def _pairs(config, parser):
+    """Obtain the values of the countries with both indicators of a
+    correlation or scatter query.
+
+    Returns:
+        Tuple: x values, y values and their names, or an error string.
+    """
+    x = parser.get('x')
+    y = parser.get('y')
+
+    if not x or not y:
+        return 'Which indicators?'
+
+    found = _columns(config, [x, y], parser.get('year'))
+
+    if isinstance(found, str):
+        return found
+
+    _, (x_values, y_values), labels = found
+    both = ~np.isnan(x_values) & ~np.isnan(y_values)
+
+    return x_values[both], y_values[both], labels
+
+
+def correlation(config, parser):
+    """Obtain the correlation between two indicators in a year."""
+    found = _pairs(config, parser)
+
+    if isinstance(found, str):
+        return found
+
+    x_values, y_values, (x_name, y_name) = found
+    when = _when(parser.get('year'))
+
+    print('Correlating %d countries' % len(x_values))
+
+    if len(x_values) < 3 or not x_values.std() or not y_values.std():
+        return 'Not enough countries with %s and %s %s' % (
+            x_name, y_name, when)
+
+    r = float(np.corrcoef(x_values, y_values)[0, 1])
+
+    return 'Correlation between %s and %s %s is %.4f (%d countries)' % (
+        x_name, y_name, when, r, len(x_values))
+
+
+def scatter(config, parser):
+    """Summarize the values of two indicators in a year."""
+    found = _pairs(config, parser)
+
+    if isinstance(found, str):
+        return found
+
+    x_values, y_values, (x_name, y_name) = found
+    when = _when(parser.get('year'))
+
+    print('Summarizing %d countries' % len(x_values))
+
+    if len(x_values) < 3 or not x_values.std() or not y_values.std():
+        return 'Not enough countries with %s and %s %s' % (
+            x_name, y_name, when)
+
+    r = float(np.corrcoef(x_values, y_values)[0, 1])
+    slope, intercept = np.polyfit(x_values, y_values, 1)
+
+    parts = [
+        '%s from %.2f to %.2f (mean %.2f)' % (
+            name, values.min(), values.max(), values.mean())
+        for name, values in ((x_name, x_values), (y_name, y_values))
+    ]
+
+    return (
+        '%s vs %s %s, %d countries: %s; %s; r = %.4f, '
+        '%s = %.4f * %s + %.4f' % (
+            x_name, y_name, when, len(x_values), parts[0], parts[1], r,
+            y_name, slope, x_name, intercept))
+
+
+def parse_where(text):
+    """Parse the conditions of a filter.
+
+    Args:
+        text (str): Conditions joined by 'and' ('unemp > 20 and pibpc <
+            1000').
+
+    Returns:
+        list[tuple]: indicator, operator and number of every condition.
+
+    Raises:
+        ValueError: If a condition is not valid.
+    """
+    conditions = []
+
+    for part in re.split(r'\s+and\s+', text.strip()):
+        match = CONDITION.match(part.strip())
+
+        if not match:
+            raise ValueError('Not a condition: %s' % part)
+
+        name, operator, number = match.groups()
+        conditions.append((name, operator, float(number)))
+
+    return conditions
+
+
+def countries_with(config, parser):
+    """Obtain the countries meeting some conditions in a year."""
+    where = ' '.join((parser.get('where') or '').split())
+
+    try:
+        conditions = parse_where(where)
+
+    except ValueError:
+        return 'Which conditions? (e.g. unemp > 20 and pibpc > 10000)'
+
+    found = _columns(
+        config, [name for name, _, _ in conditions], parser.get('year'))
+
+    if isinstance(found, str):
+        return found
+
+    countries, columns, _ = found
+    when = _when(parser.get('year'))
+
+    # Every condition on its column (NaN never meets one)
+    with np.errstate(invalid='ignore'):
+        keep = np.logical_and.reduce([
+            OPERATORS[operator](column, number)
+            for (_, operator, number), column in zip(conditions, columns)
+        ])
+
+    matches = sorted(countries[index] for index in np.flatnonzero(keep))
+
+    print('Found %d countries' % len(matches))
+
+    if not matches:
+        return 'No countries with %s %s' % (where, when)
+
+    listed = ', '.join(matches[:FILTER_LIMIT])
+
+    if len(matches) > FILTER_LIMIT:
+        listed += ' and %d more' % (len(matches) - FILTER_LIMIT)
+
+    return '%d countries with %s %s: %s' % (len(matches), where, when, listed)
+
+
+# Actions of the queries (name: function)
+ACTIONS = {
+    'correlation': correlation,
+    'scatter': scatter,
+    'filter': countries_with
+}
@@ -0,0 +1,963 @@
+# -*- coding: utf-8 -*-
+
+"""This file contains the in-memory representation of the WDI CSV file.
+
+The CSV file is parsed only once and kept as a float matrix with one row per
+(indicator, country) pair and one column per year. Missing values are NaN.
+
+The parsed data is also saved as a binary snapshot next to the CSV file, so
+later starts only have to memory-map it. A snapshot is:
+
+    MAGIC | header length (uint64) | JSON header | arrays
+
+The JSON header holds the string tables, the description of every array and
+the size, mtime and hash of the CSV file it was built from, along with the
+version of the group definitions and metadata (see groups.py).
+
+The snapshot can be built beforehand (e.g. after a new release) with several
+processes (from agents/sarah):
+
+    python3 -m actions.store /path/to/WDI_Data.csv --workers 8
+"""
+
+import argparse
+import array
+import csv
+import hashlib
+import json
+import os
+import struct
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from actions import groups
+from actions.countries import CountryIndex
+from actions.groups import GROUPS
+
+#Indices
+INDEX_COUNTRY = 0
+INDEX_ID = 1
+INDEX_NAME = 2
+INDEX_GINI = 3
+INDEX_YEAR = 4 # Starts at 1960
+
+FIRST_YEAR = 1960
+
+NAN = float('nan')
+
+# Columns of the summary table (pcount and pmean only use positive values)
+SUMMARY_FIELDS = (
+    'count', 'sum', 'mean', 'min', 'argmin', 'max', 'argmax', 'pcount',
+    'pmean'
+)
+
+# Columns of the group table (wcount and wmean only use the countries with
+# population)
+GROUP_FIELDS = ('count', 'sum', 'mean', 'wcount', 'wmean')
+
+# Fields of the group table of every kind of aggregate (value, count)
+GROUP_AGGREGATES = {
+    'mean': ('mean', 'count'),
+    'sum': ('sum', 'count'),
+    'weighted': ('wmean', 'wcount')
+}
+
+# Indicators summarized at once (bounds the temporary memory)
+SUMMARY_CHUNK = 64
+
+# Snapshots
+SNAPSHOT_SUFFIX = '.snap'
+SNAPSHOT_MAGIC = b'WDISNAP1'
+SNAPSHOT_VERSION = 4
+ALIGN = 8
+
+
+def _align(size):
+    """Round a size up to the array alignment."""
+    return (size + ALIGN - 1) // ALIGN * ALIGN
+
+
+def _file_hash(path):
+    """Obtain the SHA-1 of a file."""
+    digest = hashlib.sha1()
+
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+
+    return digest.hexdigest()
+
+
+def _source_info(path, file_hash=None):
+    """Obtain the information used to validate a snapshot."""
+    stat = os.stat(path)
+
+    return {
+        'size': stat.st_size,
+        'mtime': stat.st_mtime_ns,
+        'sha1': file_hash or _file_hash(path)
+    }
+
+
+def _read_header(path):
+    """Read the header of a snapshot.
+
+    Returns:
+        Tuple: header dict and offset of the arrays, or (None, None) if the
+        file is missing or is not a valid snapshot.
+    """
+    try:
+        with open(path, 'rb') as f:
+            if f.read(len(SNAPSHOT_MAGIC)) != SNAPSHOT_MAGIC:
+                return None, None
+
+            length, = struct.unpack('<Q', f.read(8))
+            header = json.loads(f.read(length).decode('utf-8'))
+
+    except (OSError, ValueError, struct.error):
+        return None, None
+
+    if header.get('version') != SNAPSHOT_VERSION:
+        return None, None
+
+    return header, len(SNAPSHOT_MAGIC) + 8 + length
+
+
+def _split(path, parts):
+    """Split the lines of a CSV file (without header) in byte ranges.
+
+    Args:
+        path (str): Path to the file.
+        parts (int): Number of ranges.
+
+    Returns:
+        list[tuple]: (start, stop) offsets, each starting at a line.
+    """
+    with open(path, 'rb') as f:
+        f.readline()
+        start = f.tell()
+        size = os.fstat(f.fileno()).st_size
+
+        bounds = [start]
+
+        for part in range(1, parts):
+            f.seek(max(start + (size - start) * part // parts, bounds[-1]))
+
+            if f.tell() > start:
+                # Move to the start of the next line
+                f.seek(f.tell() - 1)
+                f.readline()
+
+            bounds.append(f.tell())
+
+        bounds.append(size)
+
+    return [(a, b) for a, b in zip(bounds, bounds[1:]) if b > a]
+
+
+def _read_lines(f, stop):
+    """Iterate the decoded lines of an open file until an offset."""
+    pos = f.tell()
+
+    for line in f:
+        if pos >= stop:
+            break
+
+        pos += len(line)
+        yield line.decode('mac_roman')
+
+
+def _parse_range(path, start, stop, num_years, keys=None):
+    """Parse the lines in a byte range of a WDI CSV file.
+
+    Indicators and countries are numbered in the order they appear in the
+    range, so the result has to be merged with the other ranges.
+
+    Args:
+        path (str): Path to the WDI_Data.csv file.
+        start (int): Offset of the first line.
+        stop (int): Offset after the last line.
+        num_years (int): Number of year columns.
+        keys (set[str]): Only keep these indicators, in any case (all if
+            None).
+
+    Returns:
+        Tuple: indicator codes, indicator names, country IDs, country names,
+        (indicator, country) index pairs of every row (int64 bytes) and the
+        values of every row (float64 bytes).
+    """
+    indicators = {}
+    indicator_names = []
+    countries = {}
+    names = []
+    rows = array.array('q')
+    buf = array.array('d')
+
+    last_col = INDEX_YEAR + num_years
+
+    if keys is not None:
+        keys = {key.casefold() for key in keys}
+
+    with open(path, 'rb') as f:
+        f.seek(start)
+
+        # Line by line, without holding the text of the range
+        for line in csv.reader(_read_lines(f, stop)):
+            if len(line) <= INDEX_YEAR:
+                continue
+
+            key = line[INDEX_GINI]
+            country_id = line[INDEX_ID]
+
+            if keys is not None and key.casefold() not in keys:
+                continue
+
+            if key not in indicators:
+                indicators[key] = len(indicators)
+                indicator_names.append(line[INDEX_NAME])
+
+            if country_id not in countries:
+                countries[country_id] = len(countries)
+                names.append(line[INDEX_COUNTRY])
+
+            values = line[INDEX_YEAR:last_col]
+            values += [''] * (num_years - len(values))
+
+            rows.extend((indicators[key], countries[country_id]))
+            buf.extend(_to_float(cell) for cell in values)
+
+    return (
+        list(indicators), indicator_names, list(countries), names,
+        rows.tobytes(), buf.tobytes())
+
+
+def _to_float(cell):
+    """Convert a CSV cell to float, using NaN for empty or invalid cells."""
+    try:
+        return float(cell)
+
+    except ValueError:
+        # Empty or not a number
+        return NAN
+
+
+class BaseStore(object):
+    """Lookups shared by the stores (WdiStore and stream.OffsetStore).
+
+    They need the attributes indicators, indicator_names, countries, codes,
+    first_year, num_years, group_codes and membership, plus the indexes
+    _indicator_index (by code), _indicator_codes (by folded code) and
+    _country_index (by name), and _masks and _resolver for the caches.
+    """
+
+    @property
+    def resolver(self):
+        """Lookup of the countries by any of their forms (see countries.py)."""
+        if self._resolver is None:
+            self._resolver = CountryIndex(self.countries, self.codes)
+
+        return self._resolver
+
+    def column(self, year):
+        """Obtain the column of a year, or None if out of range."""
+        col = year - self.first_year
+
+        if col < 0 or col >= self.num_years:
+            return None
+
+        return col
+
+    def mask(self, skip_list):
+        """Obtain the mask of countries whose ID is not in a skip list.
+
+        Args:
+            skip_list (list[str]): IDs to skip.
+
+        Returns:
+            numpy.ndarray: Boolean array with one value per country.
+        """
+        skip = tuple(skip_list or ())
+        mask = self._masks.get(skip)
+
+        if mask is None and skip_list is GROUPS:
+            mask = groups.countries(self.membership)
+            self._masks[skip] = mask
+
+        elif mask is None:
+            mask = ~np.isin(np.array(self.codes, dtype=object), skip)
+            self._masks[skip] = mask
+
+        return mask
+
+    def members(self, group):
+        """Obtain the mask of the countries in a group (None if unknown)."""
+        return groups.members(self.membership, self.group_codes, group)
+
+    def country_index(self, country):
+        """Obtain the position of a country (None if not found)."""
+        return self._country_index.get(country)
+
+    def indicator_name(self, key):
+        """Obtain the name of an indicator (its code if not found)."""
+        index = self._indicator_index.get(key)
+
+        if index is None:
+            return key
+
+        return self.indicator_names[index]
+
+    def indicator_code(self, text):
+        """Obtain the code of an indicator written in any case (None if not
+        found)."""
+        if text in self._indicator_index:
+            return text
+
+        return self._indicator_codes.get(text.casefold())
+
+
+class WdiStore(BaseStore):
+    """Indicator x country x year matrix of WDI values.
+
+    Attributes:
+        ARRAYS (tuple[str]): Attributes saved as arrays in snapshots.
+        indicators (list[str]): Indicator codes (e.g. SI.POV.GINI).
+        indicator_names (list[str]): Indicator names, in the same order.
+        countries (list[str]): Country names, as they appear in the file.
+        codes (list[str]): Country IDs, in the same order as countries.
+        first_year (int): Year of the first column.
+        values (numpy.ndarray): float64 matrix of shape
+            (len(indicators) * len(countries), number of years).
+        summary (numpy.ndarray): float64 array of shape
+            (len(indicators), number of years, len(SUMMARY_FIELDS)) with
+            the aggregates of every indicator and year, GROUPS excluded.
+        ranking (numpy.ndarray): Integer array of shape (len(indicators),
+            number of years, len(countries)) with the countries of every
+            indicator and year from the highest value to the lowest, GROUPS
+            and countries without value excluded (padded with -1).
+        latest (numpy.ndarray): Latest value of every row (NaN if none).
+        latest_year (numpy.ndarray): Year of the latest value of every row
+            (-1 if none).
+        group_codes (list[str]): Codes of the groups, in bit order.
+        membership (numpy.ndarray): uint64 bits of the groups of every
+            country (see groups.membership).
+        group_summary (numpy.ndarray): float64 array of shape
+            (len(indicators), number of years, len(group_codes),
+            len(GROUP_FIELDS)) with the aggregates of every group.
+    """
+
+    ARRAYS = (
+        'values', 'summary', 'ranking', 'latest', 'latest_year', 'membership',
+        'group_summary')
+
+    def __init__(self, indicators, countries, codes, first_year, values,
+                 summary=None, ranking=None, latest=None, latest_year=None,
+                 indicator_names=None, group_codes=None, membership=None,
+                 group_summary=None):
+        self.indicators = indicators
+        self.indicator_names = indicator_names or list(indicators)
+        self.countries = countries
+        self.codes = codes
+        self.first_year = first_year
+        self.values = values
+
+        # Groups of the countries (no metadata unless given)
+        if group_codes is None or membership is None:
+            group_codes = groups.codes()
+            membership = groups.membership(codes)
+
+        self.group_codes = group_codes
+        self.membership = membership
+
+        # Lookup indexes
+        self._indicator_index = {
+            key: index for index, key in enumerate(indicators)
+        }
+        self._indicator_codes = {key.casefold(): key for key in indicators}
+        self._country_index = {
+            country: index for index, country in enumerate(countries)
+        }
+        self._masks = {}
+        self._resolver = None
+
+        # Precomputed aggregates
+        if summary is None:
+            summary = self._summarize()
+
+        self.summary = summary
+
+        if ranking is None:
+            ranking = self._rank()
+
+        self.ranking = ranking
+
+        if latest is None or latest_year is None:
+            latest, latest_year = self._latest()
+
+        self.latest = latest
+        self.latest_year = latest_year
+
+        if group_summary is None:
+            group_summary = self._group_summarize()
+
+        self.group_summary = group_summary
+
+    @classmethod
+    def from_csv(cls, path, keys=None, workers=1):
+        """Parse a WDI CSV file.
+
+        With several workers, the file is split at line boundaries into one
+        byte range per worker, parsed in parallel processes and merged.
+
+        Args:
+            path (str): Path to the WDI_Data.csv file.
+            keys (set[str]): Only keep these indicators (all if None).
+            workers (int): Number of processes to use.
+
+        Returns:
+            WdiStore: Store with the values of the file.
+        """
+        with open(path, 'r', encoding='mac_roman', newline='') as f:
+            # Year columns
+            header = next(csv.reader([f.readline()]), [])
+
+        num_years = len([c for c in header[INDEX_YEAR:] if c.isdigit()])
+        first_year = int(header[INDEX_YEAR]) if num_years else FIRST_YEAR
+
+        ranges = _split(path, max(1, workers or 1))
+        args = [(path, start, stop, num_years, keys) for start, stop in ranges]
+
+        if len(args) > 1:
+            print('Parsing %s with %d workers' % (path, len(args)))
+
+            with ProcessPoolExecutor(len(args)) as executor:
+                chunks = list(executor.map(_parse_range, *zip(*args)))
+
+        else:
+            chunks = [_parse_range(*arg) for arg in args]
+
+        # Merge the tables of the chunks, in file order
+        indicators = {}
+        indicator_names = []
+        countries = {}
+        names = []
+        positions = []
+        parsed = []
+
+        for chunk in chunks:
+            (chunk_keys, chunk_key_names, chunk_ids, chunk_names, rows,
+             buf) = chunk
+
+            for key, name in zip(chunk_keys, chunk_key_names):
+                if key not in indicators:
+                    indicators[key] = len(indicators)
+                    indicator_names.append(name)
+
+            for country_id, name in zip(chunk_ids, chunk_names):
+                if country_id not in countries:
+                    countries[country_id] = len(countries)
+                    names.append(name)
+
+            # Chunk indexes to global indexes
+            key_map = np.array(
+                [indicators[key] for key in chunk_keys], dtype=np.int64)
+            country_map = np.array(
+                [countries[c] for c in chunk_ids], dtype=np.int64)
+
+            rows = np.frombuffer(rows, dtype=np.int64).reshape(-1, 2)
+
+            if len(rows):
+                positions.append(
+                    (key_map[rows[:, 0]], country_map[rows[:, 1]]))
+                parsed.append(
+                    np.frombuffer(buf, dtype=np.float64).reshape(
+                        -1, num_years))
+
+        # Place every parsed row in its (indicator, country) slot
+        values = np.full(
+            (len(indicators) * len(countries), num_years), np.nan)
+
+        for (key_pos, country_pos), chunk_values in zip(positions, parsed):
+            values[key_pos * len(countries) + country_pos] = chunk_values
+
+        codes = list(countries)
+
+        return cls(
+            list(indicators), names, codes, first_year, values,
+            indicator_names=indicator_names, group_codes=groups.codes(),
+            membership=groups.membership(codes, path))
+
+    @classmethod
+    def cached(cls, path, snapshot=None, workers=1):
+        """Load a WDI CSV file through its binary snapshot.
+
+        The snapshot is used as long as the size and mtime of the CSV file
+        match, or its hash does if the others changed, and it was built with
+        the same groups. Otherwise the CSV file is parsed and the snapshot
+        rebuilt.
+
+        Args:
+            path (str): Path to the WDI_Data.csv file.
+            snapshot (str): Path to the snapshot. Defaults to the CSV path
+                with the SNAPSHOT_SUFFIX appended.
+            workers (int): Number of processes to parse the CSV file.
+
+        Returns:
+            WdiStore: Loaded store.
+        """
+        snapshot = snapshot or path + SNAPSHOT_SUFFIX
+        header, _ = _read_header(snapshot)
+        stat = os.stat(path)
+
+        if header and header.get('groups') != GROUPS:
+            # Summary computed with other groups
+            header = None
+
+        if header and header['source'].get('groups') != groups.version(path):
+            # Other group definitions or metadata
+            header = None
+
+        if header:
+            source = header['source']
+            same_size = source['size'] == stat.st_size
+
+            if same_size and source['mtime'] == stat.st_mtime_ns:
+                return cls.from_snapshot(snapshot)
+
+            file_hash = _file_hash(path)
+
+            if same_size and source['sha1'] == file_hash:
+                # Only touched, update the stored mtime
+                store = cls.from_snapshot(snapshot)
+                store.save(snapshot, dict(
+                    _source_info(path, file_hash),
+                    groups=groups.version(path)))
+                return store
+
+        # Build from scratch
+        store = cls.from_csv(path, workers=workers)
+        store.save(snapshot, dict(
+            _source_info(path), groups=groups.version(path)))
+
+        return store
+
+    @classmethod
+    def from_snapshot(cls, path):
+        """Memory-map a snapshot written by save().
+
+        Args:
+            path (str): Path to the snapshot.
+
+        Returns:
+            WdiStore: Store backed by the snapshot, or None if it is not
+            a valid snapshot.
+        """
+        header, start = _read_header(path)
+
+        if not header:
+            return None
+
+        arrays = {}
+
+        for name, meta in header['arrays'].items():
+            shape = tuple(meta['shape'])
+
+            if not np.prod(shape):
+                # Empty arrays can't be mapped
+                arrays[name] = np.empty(shape, dtype=meta['dtype'])
+                continue
+
+            arrays[name] = np.memmap(
+                path, dtype=meta['dtype'], mode='r',
+                offset=start + meta['offset'], shape=shape)
+
+        return cls(
+            header['indicators'], header['countries'], header['codes'],
+            header['first_year'], indicator_names=header['indicator_names'],
+            group_codes=header['group_codes'], **arrays)
+
+    def save(self, path, source):
+        """Write the store as a binary snapshot.
+
+        The snapshot is written to a temporary file first and then moved, so
+        readers never see a half-written one. Errors are reported but not
+        raised, as the store is still usable without a snapshot.
+
+        Args:
+            path (str): Path to the snapshot.
+            source (dict): Size, mtime and hash of the CSV file, and version
+                of the groups.
+        """
+        arrays = [
+            (name, np.ascontiguousarray(getattr(self, name)))
+            for name in self.ARRAYS
+        ]
+
+        meta = {}
+        offset = 0
+
+        for name, data in arrays:
+            meta[name] = {
+                'dtype': data.dtype.str,
+                'shape': list(data.shape),
+                'offset': offset
+            }
+            offset += _align(data.nbytes)
+
+        header = json.dumps({
+            'version': SNAPSHOT_VERSION,
+            'source': source,
+            'indicators': self.indicators,
+            'indicator_names': self.indicator_names,
+            'countries': self.countries,
+            'codes': self.codes,
+            'first_year': self.first_year,
+            'groups': GROUPS,
+            'group_codes': self.group_codes,
+            'arrays': meta
+        }).encode('utf-8')
+
+        # Keep the arrays aligned (JSON ignores trailing whitespace)
+        header += b' ' * (_align(len(header)) - len(header))
+
+        tmp = '%s.%d.tmp' % (path, os.getpid())
+
+        try:
+            with open(tmp, 'wb') as f:
+                f.write(SNAPSHOT_MAGIC)
+                f.write(struct.pack('<Q', len(header)))
+                f.write(header)
+
+                for name, data in arrays:
+                    f.write(data.tobytes())
+                    f.write(b'\0' * (_align(data.nbytes) - data.nbytes))
+
+            os.replace(tmp, path)
+
+        except OSError as e:
+            print('Could not write snapshot %s: %s' % (path, e))
+
+            if os.path.exists(tmp):
+                os.remove(tmp)
+
+    def _summarize(self):
+        """Compute the summary table of every indicator and year."""
+        num_countries = len(self.countries)
+        fields = {name: i for i, name in enumerate(SUMMARY_FIELDS)}
+        summary = np.full(
+            (len(self.indicators), self.num_years, len(SUMMARY_FIELDS)),
+            np.nan)
+
+        mask = self.mask(GROUPS)[None, :, None]
+
+        for start in range(0, len(self.indicators), SUMMARY_CHUNK):
+            stop = min(start + SUMMARY_CHUNK, len(self.indicators))
+
+            # (indicators, countries, years) without groups
+            chunk = self.values[
+                start * num_countries:stop * num_countries
+            ].reshape(stop - start, num_countries, self.num_years)
+            chunk = np.where(mask, chunk, np.nan)
+
+            valid = ~np.isnan(chunk)
+            count = valid.sum(axis=1)
+            total = np.where(valid, chunk, 0.0).sum(axis=1)
+
+            positive = chunk > 0
+            pcount = positive.sum(axis=1)
+            ptotal = np.where(positive, chunk, 0.0).sum(axis=1)
+
+            argmin = np.where(valid, chunk, np.inf).argmin(axis=1)
+            argmax = np.where(valid, chunk, -np.inf).argmax(axis=1)
+
+            out = summary[start:stop]
+            out[..., fields['count']] = count
+            out[..., fields['sum']] = total
+            out[..., fields['pcount']] = pcount
+
+            found = count > 0
+            pfound = pcount > 0
+
+            with np.errstate(invalid='ignore', divide='ignore'):
+                out[..., fields['mean']] = np.where(
+                    found, total / count, np.nan)
+                out[..., fields['pmean']] = np.where(
+                    pfound, ptotal / pcount, np.nan)
+
+            out[..., fields['argmin']] = np.where(found, argmin, np.nan)
+            out[..., fields['argmax']] = np.where(found, argmax, np.nan)
+            out[..., fields['min']] = np.where(found, np.take_along_axis(
+                chunk, argmin[:, None, :], axis=1)[:, 0], np.nan)
+            out[..., fields['max']] = np.where(found, np.take_along_axis(
+                chunk, argmax[:, None, :], axis=1)[:, 0], np.nan)
+
+        return summary
+
+    def _rank(self):
+        """Compute the ranking of the countries in every indicator and year."""
+        num_countries = len(self.countries)
+        dtype = np.int16 if num_countries < 2 ** 15 else np.int32
+        ranking = np.empty(
+            (len(self.indicators), self.num_years, num_countries), dtype=dtype)
+
+        mask = self.mask(GROUPS)[None, :, None]
+        positions = np.arange(num_countries)
+
+        for start in range(0, len(self.indicators), SUMMARY_CHUNK):
+            stop = min(start + SUMMARY_CHUNK, len(self.indicators))
+
+            # (indicators, countries, years) without groups
+            chunk = self.values[
+                start * num_countries:stop * num_countries
+            ].reshape(stop - start, num_countries, self.num_years)
+            valid = mask & ~np.isnan(chunk)
+
+            # Highest first; ties keep the order of the file
+            order = np.argsort(
+                np.where(valid, -chunk, np.inf), axis=1, kind='stable')
+            order = order.transpose(0, 2, 1)
+            count = valid.sum(axis=1)[..., None]
+
+            ranking[start:stop] = np.where(positions < count, order, -1)
+
+        return ranking
+
+    def _group_summarize(self):
+        """Compute the aggregates of every group, indicator and year."""
+        num_countries = len(self.countries)
+        fields = {name: i for i, name in enumerate(GROUP_FIELDS)}
+        group_summary = np.full(
+            (len(self.indicators), self.num_years, len(self.group_codes),
+             len(GROUP_FIELDS)), np.nan)
+
+        # (countries, groups) membership, as weights of the sums
+        members = np.zeros((num_countries, len(self.group_codes)))
+
+        for index, code in enumerate(self.group_codes):
+            members[:, index] = self.members(code)
+
+        # (countries, years) population, 0 if unknown
+        population = self.matrix(groups.POPULATION)
+
+        if population is None:
+            population = np.zeros((num_countries, self.num_years))
+
+        population = np.where(np.isnan(population), 0.0, population)
+        weighted = population > 0
+
+        for start in range(0, len(self.indicators), SUMMARY_CHUNK):
+            stop = min(start + SUMMARY_CHUNK, len(self.indicators))
+
+            # (indicators, years, countries)
+            chunk = self.values[
+                start * num_countries:stop * num_countries
+            ].reshape(stop - start, num_countries, self.num_years)
+            chunk = chunk.transpose(0, 2, 1)
+
+            valid = ~np.isnan(chunk)
+            values = np.where(valid, chunk, 0.0)
+            wvalid = valid & weighted.T
+
+            # Sums over the members of every group: (indicators, years,
+            # groups)
+            count = valid.astype(np.float64) @ members
+            total = values @ members
+            wcount = wvalid.astype(np.float64) @ members
+            wtotal = (values * population.T) @ members
+            weight = (wvalid * population.T) @ members
+
+            out = group_summary[start:stop]
+            out[..., fields['count']] = count
+            out[..., fields['wcount']] = wcount
+
+            with np.errstate(invalid='ignore', divide='ignore'):
+                out[..., fields['sum']] = np.where(count > 0, total, np.nan)
+                out[..., fields['mean']] = np.where(
+                    count > 0, total / count, np.nan)
+                out[..., fields['wmean']] = np.where(
+                    weight > 0, wtotal / weight, np.nan)
+
+        return group_summary
+
+    def group_of(self, key, year, group):
+        """Obtain the precomputed aggregates of a group.
+
+        Args:
+            key (str): Indicator code.
+            year (int): Year to obtain.
+            group (str): Code of the group.
+
+        Returns:
+            dict: Value of every GROUP_FIELDS, or None if not found.
+        """
+        index = self._indicator_index.get(key)
+        col = self.column(year)
+
+        if index is None or col is None or group not in self.group_codes:
+            return None
+
+        return dict(zip(GROUP_FIELDS, self.group_summary[
+            index, col, self.group_codes.index(group)].tolist()))
+
+    def ranking_of(self, key, year):
+        """Obtain the precomputed ranking of an indicator in a year.
+
+        Args:
+            key (str): Indicator code.
+            year (int): Year to obtain.
+
+        Returns:
+            numpy.ndarray: Countries with a value (GROUPS excluded), from the
+            highest to the lowest, or None if not found.
+        """
+        index = self._indicator_index.get(key)
+        col = self.column(year)
+
+        if index is None or col is None:
+            return None
+
+        ranking = self.ranking[index, col]
+
+        return ranking[:np.count_nonzero(ranking >= 0)]
+
+    def _latest(self):
+        """Compute the latest value (and its year) of every row."""
+        valid = ~np.isnan(self.values)
+        found = valid.any(axis=1)
+
+        # Last valid column of every row
+        col = self.num_years - 1 - valid[:, ::-1].argmax(axis=1)
+        rows = np.arange(len(self.values))
+
+        latest = np.where(found, self.values[rows, col], np.nan)
+        latest_year = np.where(
+            found, col + self.first_year, -1).astype(np.int16)
+
+        return latest, latest_year
+
+    def latest_of(self, key, country):
+        """Obtain the latest value of a country for an indicator.
+
+        Args:
+            key (str): Indicator code.
+            country (str): Country name.
+
+        Returns:
+            Tuple: value and year, or None if there are no values.
+        """
+        row = self.row_index(key, country)
+
+        if row is None or self.latest_year[row] < 0:
+            return None
+
+        return float(self.latest[row]), int(self.latest_year[row])
+
+    def summary_of(self, key, year):
+        """Obtain the precomputed aggregates of an indicator in a year.
+
+        Args:
+            key (str): Indicator code.
+            year (int): Year to obtain.
+
+        Returns:
+            dict: Value of every SUMMARY_FIELDS, or None if not found.
+        """
+        index = self._indicator_index.get(key)
+        col = self.column(year)
+
+        if index is None or col is None:
+            return None
+
+        return dict(zip(SUMMARY_FIELDS, self.summary[index, col].tolist()))
+
+    @property
+    def num_years(self):
+        """Number of year columns."""
+        return self.values.shape[1]
+
+    def indicator_rows(self, key):
+        """Obtain the range of rows of an indicator.
+
+        Args:
+            key (str): Indicator code.
+
+        Returns:
+            Tuple: start and stop rows, or None if not found.
+        """
+        index = self._indicator_index.get(key)
+
+        if index is None:
+            return None
+
+        start = index * len(self.countries)
+
+        return start, start + len(self.countries)
+
+    def row_index(self, key, country):
+        """Obtain the row of a country for an indicator.
+
+        Args:
+            key (str): Indicator code.
+            country (str): Country name.
+
+        Returns:
+            int: Row offset in the values matrix, or None if not found.
+        """
+        rows = self.indicator_rows(key)
+        index = self._country_index.get(country)
+
+        if rows is None or index is None:
+            return None
+
+        return rows[0] + index
+
+    def matrix(self, key):
+        """Obtain the country x year matrix of an indicator.
+
+        Args:
+            key (str): Indicator code.
+
+        Returns:
+            numpy.ndarray: View of the values, or None if not found.
+        """
+        rows = self.indicator_rows(key)
+
+        if rows is None:
+            return None
+
+        return self.values[rows[0]:rows[1]]
+
+    def row(self, key, country):
+        """Obtain the values of a country for an indicator.
+
+        Args:
+            key (str): Indicator code.
+            country (str): Country name.
+
+        Returns:
+            numpy.ndarray: Values per year, or None if not found.
+        """
+        row = self.row_index(key, country)
+
+        if row is None:
+            return None
+
+        return self.values[row]
+
+
+def main():
+    """Build the snapshot of a WDI CSV file."""
+    parser = argparse.ArgumentParser()
+
+    parser.add_argument('datafile', help='path to WDI_Data.csv')
+    parser.add_argument('--snapshot', help='path to the snapshot')
+    parser.add_argument(
+        '--workers', type=int, default=os.cpu_count(),
+        help='number of processes to parse the file')
+
+    args = parser.parse_args()
+
+    WdiStore.cached(args.datafile, args.snapshot, args.workers)
+
+if __name__ == '__main__':
+    main()
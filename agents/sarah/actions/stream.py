@@ -0,0 +1,261 @@
+# -*- coding: utf-8 -*-
+
+"""This file contains the low-memory representation of the WDI CSV file.
+
+Instead of keeping the values in memory, a first pass records the byte offset
+and length of every line of each indicator. Queries then read and parse only
+the lines of the indicator they need (one per country).
+
+Lines are read with pread from the file opened when indexing, not from a
+memory map: if the file is overwritten in place, a map would kill the
+process with SIGBUS when its pages are truncated. Reads check that the size
+and mtime of the file are still the indexed ones, and raise FileChangedError
+otherwise instead of parsing other lines (the watcher of wdi.py reloads the
+store once the new file is complete). A release moved over the file is not a
+change: the open file keeps the old one.
+
+It has the same interface as WdiStore (the lookups are shared in
+store.BaseStore), without the precomputed tables (summary_of, ranking_of and
+group_of always return None).
+"""
+
+import array
+import csv
+import os
+
+import numpy as np
+
+from actions import groups
+from actions.store import (
+    FIRST_YEAR, INDEX_COUNTRY, INDEX_GINI, INDEX_ID, INDEX_NAME, INDEX_YEAR,
+    BaseStore, _to_float)
+
+
+class FileChangedError(OSError):
+    """The file was modified since it was indexed."""
+
+
+def _parse(lines):
+    """Parse CSV lines (bytes) of the WDI file."""
+    return csv.reader(
+        line.rstrip(b'\r').decode('mac_roman') for line in lines)
+
+
+class OffsetStore(BaseStore):
+    """Byte offsets of the lines of every indicator in a WDI CSV file.
+
+    Attributes:
+        indicators (list[str]): Indicator codes (e.g. SI.POV.GINI).
+        indicator_names (list[str]): Indicator names, in the same order.
+        countries (list[str]): Country names, as they appear in the file.
+        codes (list[str]): Country IDs, in the same order as countries.
+        first_year (int): Year of the first column.
+        num_years (int): Number of year columns.
+        group_codes (list[str]): Codes of the groups, in bit order.
+        membership (numpy.ndarray): uint64 bits of the groups of every
+            country (see groups.membership).
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, 'rb')
+        self._version = self._stat()
+
+        self.indicators = []
+        self.indicator_names = []
+        self.countries = []
+        self.codes = []
+
+        # Lines of every indicator: offsets, lengths and country of each one
+        self._offsets = {}
+        self._lengths = {}
+        self._line_countries = {}
+
+        self._indicator_index = {}
+        self._indicator_codes = {}
+        self._country_index = {}
+        self._masks = {}
+        self._resolver = None
+
+        self._index()
+
+        self.group_codes = groups.codes()
+        self.membership = groups.membership(self.codes, path)
+
+    @classmethod
+    def from_csv(cls, path):
+        """Index a WDI CSV file.
+
+        Args:
+            path (str): Path to the WDI_Data.csv file.
+
+        Returns:
+            OffsetStore: Index of the file.
+        """
+        return cls(path)
+
+    def _stat(self):
+        """Obtain the size and mtime of the open file."""
+        info = os.fstat(self._file.fileno())
+
+        return info.st_size, info.st_mtime_ns
+
+    def _lines(self):
+        """Iterate the (offset, line) of the file."""
+        self._file.seek(0)
+        pos = 0
+
+        for line in self._file:
+            yield pos, line.rstrip(b'\n')
+            pos += len(line)
+
+    def _index(self):
+        """Record the offset of every line."""
+        lines = self._lines()
+        countries = {}
+
+        # Year columns
+        _, header = next(lines, (0, b''))
+        header = next(_parse([header]), [])
+        self.num_years = len([c for c in header[INDEX_YEAR:] if c.isdigit()])
+        self.first_year = (
+            int(header[INDEX_YEAR]) if self.num_years else FIRST_YEAR)
+
+        for offset, line in lines:
+            fields = next(_parse([line]), [])
+
+            if len(fields) <= INDEX_YEAR:
+                continue
+
+            key = fields[INDEX_GINI]
+            country_id = fields[INDEX_ID]
+
+            if key not in self._offsets:
+                self._indicator_index[key] = len(self.indicators)
+                self._indicator_codes[key.casefold()] = key
+                self.indicators.append(key)
+                self.indicator_names.append(fields[INDEX_NAME])
+                self._offsets[key] = array.array('q')
+                self._lengths[key] = array.array('l')
+                self._line_countries[key] = array.array('l')
+
+            if country_id not in countries:
+                countries[country_id] = len(self.codes)
+                self._country_index[fields[INDEX_COUNTRY]] = len(self.codes)
+                self.codes.append(country_id)
+                self.countries.append(fields[INDEX_COUNTRY])
+
+            self._offsets[key].append(offset)
+            self._lengths[key].append(len(line))
+            self._line_countries[key].append(countries[country_id])
+
+        if self._stat() != self._version:
+            raise FileChangedError('%s changed while indexing' % self.path)
+
+    def close(self):
+        """Release the file."""
+        self._file.close()
+
+    def _read(self, offsets, lengths):
+        """Parse the year values of the lines at some offsets.
+
+        Raises:
+            FileChangedError: The file is not the indexed one anymore.
+        """
+        fd = self._file.fileno()
+        last_col = INDEX_YEAR + self.num_years
+        lines = [
+            os.pread(fd, length, offset)
+            for offset, length in zip(offsets, lengths)
+        ]
+        rows = []
+
+        # Checked after reading, so lines written meanwhile are not used
+        if self._stat() != self._version:
+            raise FileChangedError('%s changed since it was indexed' % (
+                self.path))
+
+        for fields in _parse(lines):
+            values = fields[INDEX_YEAR:last_col]
+            values += [''] * (self.num_years - len(values))
+            rows.append([_to_float(cell) for cell in values])
+
+        return np.array(rows, dtype=np.float64).reshape(-1, self.num_years)
+
+    def matrix(self, key):
+        """Read the country x year matrix of an indicator.
+
+        Args:
+            key (str): Indicator code.
+
+        Returns:
+            numpy.ndarray: Values (NaN for countries without line), or None
+            if not found.
+        """
+        offsets = self._offsets.get(key)
+
+        if offsets is None:
+            return None
+
+        matrix = np.full((len(self.codes), self.num_years), np.nan)
+        matrix[np.array(self._line_countries[key])] = self._read(
+            offsets, self._lengths[key])
+
+        return matrix
+
+    def row(self, key, country):
+        """Read the values of a country for an indicator.
+
+        Args:
+            key (str): Indicator code.
+            country (str): Country name.
+
+        Returns:
+            numpy.ndarray: Values per year, or None if not found.
+        """
+        offsets = self._offsets.get(key)
+        index = self._country_index.get(country)
+
+        if offsets is None or index is None:
+            return None
+
+        lines = self._line_countries[key]
+
+        for offset, length, line_country in zip(
+                offsets, self._lengths[key], lines):
+            if line_country == index:
+                return self._read([offset], [length])[0]
+
+        return None
+
+    def latest_of(self, key, country):
+        """Obtain the latest value of a country for an indicator.
+
+        Returns:
+            Tuple: value and year, or None if there are no values.
+        """
+        row = self.row(key, country)
+
+        if row is None:
+            return None
+
+        found = np.flatnonzero(~np.isnan(row))
+
+        if not len(found):
+            return None
+
+        col = int(found[-1])
+
+        return float(row[col]), col + self.first_year
+
+    def summary_of(self, key, year):
+        """No precomputed aggregates in this store."""
+        return None
+
+    def ranking_of(self, key, year):
+        """No precomputed rankings in this store."""
+        return None
+
+    def group_of(self, key, year, group):
+        """No precomputed group aggregates in this store."""
+        return None
@@ -0,0 +1,158 @@
+# -*- coding: utf-8 -*-
+
+"""This file contains the hot reload of the WDI datafile.
+
+The loaded store of a datafile is kept in a StoreRef shared by the configs
+of all the actions. A Watcher thread polls the datafile and, once a new
+release has been completely written (its size and mtime stay the same for
+SETTLE_TIME seconds), builds the new store in the background and swaps it
+into the reference. Every action takes the store from the reference once
+(see wdi.pin), so the ones in flight finish with the old store, which is
+released when they are done. Both stores are in memory while the new one is
+built.
+
+New releases should be copied next to the datafile and then moved over it:
+the stream engine keeps reading the old file until its store is released.
+If the datafile is overwritten in place instead, the stream engine raises
+FileChangedError on its next read (the actions fail until the reload), and
+the memory engine is not affected, as it only reads the file when building.
+"""
+
+import os
+import threading
+import time
+
+# Seconds between checks of the datafile
+POLL_INTERVAL = 5
+
+# Seconds the datafile must stay unchanged before reloading it
+SETTLE_TIME = 10
+
+# Functions called with the path of every reloaded datafile
+_LISTENERS = []
+
+
+def stat(path):
+    """Obtain what identifies a version of a file (None if missing)."""
+    try:
+        info = os.stat(path)
+
+    except OSError:
+        return None
+
+    return info.st_size, info.st_mtime_ns, info.st_ino
+
+
+def subscribe(listener):
+    """Call a function with the path of every reloaded datafile."""
+    if listener not in _LISTENERS:
+        _LISTENERS.append(listener)
+
+
+class StoreRef(object):
+    """Current store of a datafile, replaced at once on reload.
+
+    Attributes:
+        path (str): Path to the datafile.
+        stat (tuple): Version of the datafile the store was built from.
+        reloads (int): Number of times the store was replaced.
+        watcher (Watcher): Thread reloading the store, if any.
+    """
+
+    def __init__(self, path, store, stat=None):
+        self.path = path
+        self.stat = stat
+        self.reloads = 0
+        self.watcher = None
+
+        self._store = store
+
+    def get(self):
+        """Obtain the current store."""
+        return self._store
+
+    def swap(self, store, stat=None):
+        """Replace the store (actions holding the old one keep using it).
+
+        Returns:
+            The previous store.
+        """
+        old, self._store = self._store, store
+        self.stat = stat
+        self.reloads += 1
+
+        return old
+
+
+class Watcher(threading.Thread):
+    """Thread polling a datafile and reloading its store when it changes.
+
+    Attributes:
+        ref (StoreRef): Reference to update.
+        build (function): Receives the path and returns the new store.
+        interval (float): Seconds between checks.
+        settle (float): Seconds the file must stay unchanged.
+    """
+
+    def __init__(self, ref, build, interval=POLL_INTERVAL,
+                 settle=SETTLE_TIME):
+        super().__init__(name='watcher', daemon=True)
+
+        self.ref = ref
+        self.build = build
+        self.interval = interval
+        self.settle = settle
+
+        # Last version seen and since when
+        self._seen = ref.stat
+        self._since = time.monotonic()
+        self._stop = threading.Event()
+
+    def run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.check()
+
+            except Exception as e:
+                # Keep watching with the current store
+                print('Could not reload %s: %s' % (self.ref.path, e))
+                self.ref.stat = self._seen
+
+    def stop(self):
+        """Stop polling (an ongoing reload is completed)."""
+        self._stop.set()
+
+    def check(self):
+        """Reload the store if the datafile changed and is stable.
+
+        Returns:
+            bool: Whether the store was replaced.
+        """
+        current = stat(self.ref.path)
+
+        if current != self._seen:
+            # Still being written, or just replaced
+            self._seen = current
+            self._since = time.monotonic()
+            return False
+
+        if current is None or current == self.ref.stat:
+            return False
+
+        if time.monotonic() - self._since < self.settle:
+            return False
+
+        print('Reloading %s' % self.ref.path)
+        store = self.build(self.ref.path)
+
+        if stat(self.ref.path) != current:
+            # Changed while building, wait for it to settle again
+            return False
+
+        self.ref.swap(store, current)
+        print('Reloaded %s' % self.ref.path)
+
+        for listener in list(_LISTENERS):
+            listener(self.ref.path)
+
+        return True
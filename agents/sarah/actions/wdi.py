@@ -2,26 +2,333 @@
 
 """This file contains the implementation for working with the WDI CSV file."""
 
-import csv
+import math
 import os
+import threading
+import time
+import traceback
 
-#Indices
-INDEX_COUNTRY = 0
-INDEX_ID = 1
-INDEX_GINI = 3
-INDEX_YEAR = 4 # Starts at 1960
+import numpy as np
 
-FIRST_YEAR = 1960
+from actions import aggregate
+from actions import cache
+from actions import countries
+from actions import groups
+from actions import indicators
+from actions import metrics
+from actions import watcher
+from actions import wdi_sql
+from actions.store import GROUP_AGGREGATES, GROUPS, WdiStore
+from actions.stream import OffsetStore
 
-# Groups to skip in some cases
-GROUPS = [
-    'LDC', 'LIC', 'LMC', 'LMY', 'LTE', 'MEA', 'MIC', 'MNA', 'OED', 'OSS',
-    'PRE', 'PST', 'SSA', 'SSF', 'SST', 'TEA', 'TEC', 'TLA', 'TMN', 'TSA',
-    'TSS', 'UMC', 'WLD'
-]
+# Kinds of query about one country
+COUNTRY_KINDS = ('latest', 'year', 'rank') + indicators.SERIES_KINDS
 
+# Kinds of query whose reply is built from several values
+COMPOUND_KINDS = indicators.SERIES_KINDS + indicators.RANK_KINDS + ('group',)
 
-def _get_avg(config, key, year, skip_list=GROUPS):
+# Loaded stores (by datafile: watcher.StoreRef)
+_STORES = {}
+
+# Locks of the first load of every datafile (by datafile)
+_LOAD_LOCKS = {}
+_LOAD_LOCK = threading.Lock()
+
+# Datafiles to reload when they change (by datafile: options of the watcher)
+_WATCHED = {}
+
+
+def _build(config, datafile):
+    """Load a datafile with the engine of the config."""
+    engine = config.get('engine') or 'memory'
+    start = time.perf_counter()
+
+    if engine == 'stream':
+        # Low memory: only the offsets of the lines
+        store = OffsetStore.from_csv(datafile)
+
+    else:
+        store = WdiStore.cached(
+            datafile, config.get('snapshot'), int(config.get('workers', 1)))
+
+    metrics.loaded(datafile, time.perf_counter() - start, engine)
+
+    return store
+
+
+def _watch(ref):
+    """Start or stop reloading a loaded datafile, as set in prepare()."""
+    options = _WATCHED.get(ref.path)
+
+    if options is None and ref.watcher is not None:
+        ref.watcher.stop()
+        ref.watcher = None
+
+    if options is None or ref.watcher is not None:
+        return
+
+    # With the engine of the latest config
+    _, interval, settle = options
+    ref.watcher = watcher.Watcher(
+        ref, lambda path: _WATCHED[path][0](path), interval, settle)
+    ref.watcher.start()
+
+
+def _reference(config):
+    """Obtain the reference to the store of the datafile, loading it the
+    first time.
+
+    Returns:
+        watcher.StoreRef: Reference to the store, or None if the datafile
+        does not exist.
+    """
+    datafile = config.get('path')
+    ref = _STORES.get(datafile)
+
+    if ref is not None:
+        return ref
+
+    with _LOAD_LOCK:
+        lock = _LOAD_LOCKS.setdefault(datafile, threading.Lock())
+
+    # Concurrent first callers wait for a single load
+    with lock:
+        ref = _STORES.get(datafile)
+
+        if ref is None:
+            if not os.path.isfile(datafile):
+                return None
+
+            print('Loading %s' % datafile)
+
+            # Version before loading, so changes while loading are reloaded
+            version = watcher.stat(datafile)
+            ref = watcher.StoreRef(
+                datafile, _build(config, datafile), version)
+            _STORES[datafile] = ref
+
+            _watch(ref)
+
+    return ref
+
+
+def load(config):
+    """Parse the datafile once and keep it in memory for the process.
+
+    With 'engine = stream' in the config, only the offsets of the lines are
+    kept in memory (see stream.py).
+
+    Args:
+        config (ConfigParser): Information about datafile to use. A 'store'
+            entry, if present, is used instead of the datafile (the current
+            one if it is a watcher.StoreRef).
+
+    Returns:
+        WdiStore: Loaded store (OffsetStore with the stream engine), or None
+        if the datafile does not exist.
+    """
+    store = config.get('store')
+
+    if isinstance(store, watcher.StoreRef):
+        return store.get()
+
+    if store is not None:
+        return store
+
+    ref = _reference(config)
+
+    return None if ref is None else ref.get()
+
+
+def _read_keys(config, keys, kind):
+    """Read only some indicators of the datafile, without keeping them.
+
+    Args:
+        config (ConfigParser): Information about datafile to use.
+        keys (set[str]): Indicator codes, in any case.
+        kind (str): Label of the load in the metrics.
+
+    Returns:
+        dict: Config with the store of the indicators (the same config if
+        there are no keys or the datafile does not exist).
+    """
+    datafile = config.get('path')
+
+    if not keys or not os.path.isfile(datafile):
+        return config
+
+    start = time.perf_counter()
+    store = WdiStore.from_csv(datafile, keys)
+    metrics.loaded(datafile, time.perf_counter() - start, kind)
+
+    return dict(config, store=store)
+
+
+def pin(config, keys=None):
+    """Fix the store of an action, so that all its getters use the same one
+    even if the datafile is reloaded meanwhile (see watcher.py).
+
+    Args:
+        config (ConfigParser): Information about datafile to use.
+        keys (list[str]): Indicators the action needs. If given and the
+            datafile is not loaded (preload = no), only they are read, as in
+            batch(), and the datafile stays not loaded.
+
+    Returns:
+        dict: Config with the current store (the same config for the sql
+        engine or if the datafile does not exist).
+    """
+    if config.get('engine') == 'sql':
+        return config
+
+    if keys is not None and not is_loaded(config):
+        return _read_keys(config, set(keys), 'partial')
+
+    store = load(config)
+
+    if store is None:
+        return config
+
+    return dict(config, store=store)
+
+
+def prepare(config):
+    """Load the datafile unless preloading is disabled in the config, or
+    obtain the connection pool of a SQL database.
+
+    Unless 'watch = no' is set in the config, the datafile is reloaded in
+    the background when a new release replaces it (see watcher.py), checking
+    it every 'watch_interval' seconds and once it has not changed for
+    'watch_settle' seconds.
+
+    Args:
+        config (ConfigParser): Section of the datafile to use.
+
+    Returns:
+        dict: Entries to add to the config of the actions.
+    """
+    if config.get('engine') == 'sql':
+        return wdi_sql.prepare(config)
+
+    datafile = config.get('path')
+
+    if config.getboolean('watch', True):
+        _WATCHED[datafile] = (
+            lambda path: _build(config, path),
+            config.getfloat('watch_interval', watcher.POLL_INTERVAL),
+            config.getfloat('watch_settle', watcher.SETTLE_TIME))
+
+    else:
+        _WATCHED.pop(datafile, None)
+
+    if datafile in _STORES:
+        _watch(_STORES[datafile])
+
+    if not config.getboolean('preload', True):
+        return {}
+
+    return {'store': _reference(config)}
+
+
+def retain(datafiles):
+    """Forget the stores of the datafiles that are not configured anymore,
+    stopping their watchers (actions in flight keep the store they pinned).
+
+    Args:
+        datafiles (set[str]): Paths of the datafiles still configured.
+    """
+    for datafile in set(_STORES) | set(_WATCHED):
+        if datafile in datafiles:
+            continue
+
+        print('Releasing %s' % datafile)
+        _WATCHED.pop(datafile, None)
+        ref = _STORES.pop(datafile, None)
+
+        if ref is not None and ref.watcher is not None:
+            ref.watcher.stop()
+            ref.watcher = None
+
+
+def is_loaded(config):
+    """Check if the datafile of the configuration is already in memory.
+
+    SQL databases are always considered loaded, as they are indexed.
+    """
+    if config.get('engine') == 'sql':
+        return True
+
+    return config.get('store') is not None or config.get('path') in _STORES
+
+
+def batch(config, queries):
+    """Answer several queries at once.
+
+    If the datafile is not loaded in memory, it is read in a single pass that
+    only keeps the indicators needed by the queries.
+
+    Args:
+        config (ConfigParser): Information about datafile to use.
+        queries (list[tuple]): (action, country, year) tuples, where action
+            is one of the names in ACTIONS. Generic actions also need the
+            indicator code as a fourth item, and top and bottom actions may
+            have the number of countries as a fifth one.
+
+    Returns:
+        list[str]: Reply for each query, in the same order (None for the
+        queries that failed, whose error is printed).
+    """
+    queries = [tuple(query) + (None,) * (5 - len(query)) for query in queries]
+
+    if not is_loaded(config):
+        keys = set(
+            ACTIONS[action][0] or code
+            for action, _, _, code, _ in queries if action in ACTIONS)
+        keys.discard(None)
+
+        if keys:
+            # Weights of the group aggregates
+            keys.add(groups.POPULATION)
+
+        if keys and os.path.isfile(config.get('path')):
+            print('Reading %d indicators for %d queries' % (
+                len(keys), len(queries)))
+
+            config = _read_keys(config, keys, 'batch')
+
+    replies = []
+
+    for action, country, year, code, num in queries:
+        if action not in ACTIONS:
+            replies.append('Unknown action %s' % action)
+            continue
+
+        try:
+            replies.append(metrics.call(action, ACTIONS[action][1], config, {
+                'country': country, 'year': year, 'code': code, 'num': num}))
+
+        except Exception:
+            # Answer the rest of the queries
+            print('Error executing %s' % action)
+            traceback.print_exc()
+            replies.append(None)
+
+    return replies
+
+
+def _summary(store, key, year, skip_list):
+    """Obtain the precomputed aggregates, if they apply to the skip list.
+
+    Returns:
+        dict: Aggregates of the indicator in the year, or None.
+    """
+    if skip_list is not GROUPS:
+        return None
+
+    return store.summary_of(key, year)
+
+
+def _get_avg(config, key, year, skip_list=GROUPS, positive=True):
     """Obtain average of values for a key in a year.
 
     Args:
@@ -29,15 +336,16 @@ def _get_avg(config, key, year, skip_list=GROUPS):
         key (str): Key to search.
         year (int): Year to obtain (from parser).
         skip_list (list[str]): IDs to skip.
+        positive (bool): Only average values greater than zero.
 
     Returns:
         Tuple: Boolean, Value (usually float), Error string
     """
     # Check datafile
-    datafile = config.get('path')
+    store = load(config)
 
-    if not os.path.isfile(datafile):
-        return False, None, 'Cant find the database %s' % datafile
+    if store is None:
+        return False, None, 'Cant find the database %s' % config.get('path')
 
 
     # Get year
@@ -50,47 +358,34 @@ def _get_avg(config, key, year, skip_list=GROUPS):
     print('Obtaining average of %s for year %d' % (key, year))
 
     # Obtain value
-    value = 0.0
-    countries = 0
-
-    with open(datafile, 'r', encoding='mac_roman', newline='') as f:
-        reader = csv.reader(f)
-
-        # Read line by line
-        for line in reader:
-
-            # Check key
-            if not key in line:
-                continue
+    found = None
 
-            # Check if it has to be skipped
-            if line[INDEX_ID] in skip_list:
-                continue
+    summary = _summary(store, key, year, skip_list)
+    matrix = store.matrix(key)
+    col = store.column(year)
 
-            # Get specific column
-            col = INDEX_YEAR + (year - FIRST_YEAR)
+    if summary:
+        mean, num = (
+            (summary['pmean'], summary['pcount']) if positive
+            else (summary['mean'], summary['count']))
 
-            try:
-                col_val = float(line[col])
+        if num:
+            found = mean, int(num)
 
-                if col_val > 0:
-                    # Must be positive
-                    value += col_val
-                    countries += 1
-
-            except:
-                # Not a number
-                pass
+    elif matrix is not None and col is not None:
+        metrics.scanned(len(matrix))
+        found = aggregate.average(
+            matrix[:, col], store.mask(skip_list), positive)
 
 
     # Didn't find key
-    if not value:
+    if not found:
         print('Did not find value')
         return False, None, None
 
     # Obtain average
-    result = value / float(countries)
-    print('Found value: %f for %d countries (%f)' % (value, countries, result))
+    result, countries = found
+    print('Found value for %d countries (%f)' % (countries, result))
 
     return True, result, None
 
@@ -108,10 +403,10 @@ def _get_count(config, key, year, skip_list=GROUPS):
         Tuple: Boolean, Value (usually float), Error string
     """
     # Check datafile
-    datafile = config.get('path')
+    store = load(config)
 
-    if not os.path.isfile(datafile):
-        return False, None, 'Cant find the database %s' % datafile
+    if store is None:
+        return False, None, 'Cant find the database %s' % config.get('path')
 
 
     # Get year
@@ -126,30 +421,16 @@ def _get_count(config, key, year, skip_list=GROUPS):
     # Obtain value
     value = 0
 
-    with open(datafile, 'r', encoding='mac_roman', newline='') as f:
-        reader = csv.reader(f)
-
-        # Read line by line
-        for line in reader:
-
-            # Check key
-            if not key in line:
-                continue
-
-            # Check if it has to be skipped
-            if line[INDEX_ID] in skip_list:
-                continue
-
-            # Get specific column
-            col = INDEX_YEAR + (year - FIRST_YEAR)
+    summary = _summary(store, key, year, skip_list)
+    matrix = store.matrix(key)
+    col = store.column(year)
 
-            try:
-                float(line[col])
-                value += 1
+    if summary:
+        value = int(summary['count'])
 
-            except:
-                # Not a number
-                pass
+    elif matrix is not None and col is not None:
+        metrics.scanned(len(matrix))
+        value = aggregate.count(matrix[:, col], store.mask(skip_list))
 
 
     # Always return value
@@ -165,59 +446,35 @@ def _get_latest(config, key, country):
         country (str): Country to search (from parser).
 
     Returns:
-        Tuple: Boolean, Value (usually float), Error string
+        Tuple: Boolean, Value (usually float), year, Error string
     """
     # Check datafile
-    datafile = config.get('path')
+    store = load(config)
 
-    if not os.path.isfile(datafile):
-        return False, None, 'Cant find the database %s' % datafile
+    if store is None:
+        return (
+            False, None, None,
+            'Cant find the database %s' % config.get('path'))
 
 
     # Get country
     if not country:
-        return False, None, 'Which country?'
+        return False, None, None, 'Which country?'
 
     print('Obtaining latest %s for country %s' % (key, country))
 
     # Obtain value
-    value = None
-
-    with open(datafile, 'r', encoding='mac_roman', newline='') as f:
-        reader = csv.reader(f)
-
-        # Read line by line
-        for line in reader:
+    found = store.latest_of(key, country)
 
-            # Check key
-            if not key in line:
-                continue
+    if found:
+        value, year = found
 
-            # Check country
-            if line[INDEX_COUNTRY] != country:
-                continue
-
-            # Start from the end and stop when a numerical value is reached
-            for col in reversed(line):
-                if col:
-                    try:
-                        value = float(col)
-
-                        print('Value found for %s: %f' % (country, value))
-                        return True, value, None
-
-                    except:
-                        # Not a number
-                        pass
-
-    # # Found key
-    # if value:
-    #     print('Value found for %s: %f' % (country, value))
-    #     return True, value, None
+        print('Value found for %s in %d: %f' % (country, year, value))
+        return True, value, year, None
 
     # Didn't find key
     print('Did not find value')
-    return False, None, None
+    return False, None, None, None
 
 
 def _get_max(config, key, year, skip_list=GROUPS):
@@ -233,10 +490,12 @@ def _get_max(config, key, year, skip_list=GROUPS):
         Tuple: Boolean, Value (usually float), country, Error string
     """
     # Check datafile
-    datafile = config.get('path')
+    store = load(config)
 
-    if not os.path.isfile(datafile):
-        return False, None, 'Cant find the database %s' % datafile
+    if store is None:
+        return (
+            False, None, None,
+            'Cant find the database %s' % config.get('path'))
 
 
     # Get year
@@ -244,49 +503,34 @@ def _get_max(config, key, year, skip_list=GROUPS):
         year = int(year)
 
     except:
-        return False, None, 'When do you say?'
+        return False, None, None, 'When do you say?'
 
     print('Obtaining max of %s for year %d' % (key, year))
 
     # Obtain value
-    value = 0.0
-    country = None
-
-    with open(datafile, 'r', encoding='mac_roman', newline='') as f:
-        reader = csv.reader(f)
-
-        # Read line by line
-        for line in reader:
-
-            # Check key
-            if not key in line:
-                continue
-
-            # Check if it has to be skipped
-            if line[INDEX_ID] in skip_list:
-                continue
+    found = None
 
-            # Get specific column
-            col = INDEX_YEAR + (year - FIRST_YEAR)
+    summary = _summary(store, key, year, skip_list)
+    matrix = store.matrix(key)
+    col = store.column(year)
 
-            try:
-                col_val = float(line[col])
+    if summary:
+        if summary['count']:
+            found = summary['max'], int(summary['argmax'])
 
-                if col_val > value:
-                    # Got new max
-                    value = col_val
-                    country = line[INDEX_COUNTRY]
-
-            except:
-                # Not a number
-                pass
+    elif matrix is not None and col is not None:
+        metrics.scanned(len(matrix))
+        found = aggregate.maximum(matrix[:, col], store.mask(skip_list))
 
 
     # Didn't find key
-    if not value:
+    if not found:
         print('Did not find value')
         return False, None, None, None
 
+    value, index = found
+    country = store.countries[index]
+
     # Obtain max
     print('Found value: %f for %d (%s)' % (value, year, country))
 
@@ -306,10 +550,12 @@ def _get_min(config, key, year, skip_list=GROUPS):
         Tuple: Boolean, Value (usually float), Error string
     """
     # Check datafile
-    datafile = config.get('path')
+    store = load(config)
 
-    if not os.path.isfile(datafile):
-        return False, None, 'Cant find the database %s' % datafile
+    if store is None:
+        return (
+            False, None, None,
+            'Cant find the database %s' % config.get('path'))
 
 
     # Get year
@@ -317,49 +563,34 @@ def _get_min(config, key, year, skip_list=GROUPS):
         year = int(year)
 
     except:
-        return False, None, 'When do you say?'
+        return False, None, None, 'When do you say?'
 
     print('Obtaining max of %s for year %d' % (key, year))
 
     # Obtain value
-    value = None
-    country = None
-
-    with open(datafile, 'r', encoding='mac_roman', newline='') as f:
-        reader = csv.reader(f)
-
-        # Read line by line
-        for line in reader:
+    found = None
 
-            # Check key
-            if not key in line:
-                continue
+    summary = _summary(store, key, year, skip_list)
+    matrix = store.matrix(key)
+    col = store.column(year)
 
-            # Check if it has to be skipped
-            if line[INDEX_ID] in skip_list:
-                continue
+    if summary:
+        if summary['count']:
+            found = summary['min'], int(summary['argmin'])
 
-            # Get specific column
-            col = INDEX_YEAR + (year - FIRST_YEAR)
-
-            try:
-                col_val = float(line[col])
-
-                if value == None or col_val < value:
-                    # First element to check or new min
-                    value = col_val
-                    country = line[INDEX_COUNTRY]
-
-            except:
-                # Not a number
-                pass
+    elif matrix is not None and col is not None:
+        metrics.scanned(len(matrix))
+        found = aggregate.minimum(matrix[:, col], store.mask(skip_list))
 
 
     # Didn't find key
-    if not value:
+    if not found:
         print('Did not find value')
         return False, None, None, None
 
+    value, index = found
+    country = store.countries[index]
+
     # Obtain max
     print('Found value: %f for %d (%s)' % (value, year, country))
 
@@ -379,10 +610,10 @@ def _get_year(config, key, country, year):
         Tuple: Boolean, Value (usually float), Error string
     """
     # Check datafile
-    datafile = config.get('path')
+    store = load(config)
 
-    if not os.path.isfile(datafile):
-        return False, None, 'Cant find the database %s' % datafile
+    if store is None:
+        return False, None, 'Cant find the database %s' % config.get('path')
 
 
     # Get country
@@ -398,691 +629,651 @@ def _get_year(config, key, country, year):
 
     print('Obtaining %s for country %s in year %d' % (key, country, year))
 
-
     # Obtain value
-    value = None
-
-    with open(datafile, 'r', encoding='mac_roman', newline='') as f:
-        reader = csv.reader(f)
-
-        # Read line by line
-        for line in reader:
-
-            # Check key
-            if not key in line:
-                continue
-
-            # Check country
-            if line[INDEX_COUNTRY] != country:
-                continue
-
-            # Get specific column
-            col = INDEX_YEAR + (year - FIRST_YEAR)
+    row = store.row(key, country)
+    col = store.column(year)
 
-            try:
-                value = float(line[col])
+    if row is not None and col is not None and not math.isnan(row[col]):
+        value = float(row[col])
 
-                print('Value found for %s in %d: %f' % (country, year, value))
-                return True, value, None
-
-            except:
-                # Not a number
-                # pass
-                print('Did not find value')
-                return False, None, None
-
-
-    # Found key
-    # if value:
-    #     return True, value, None
+        print('Value found for %s in %d: %f' % (country, year, value))
+        return True, value, None
 
     # Didn't find key
     print('Did not find value')
     return False, None, None
 
 
-def gini(config, parser):
-    """Obtain latest GINI for a given country.
+def _ranking(store, key, year, skip_list):
+    """Obtain the precomputed ranking, if it applies to the skip list.
 
-    Args:
-        config (ConfigParser): Information about datafile to use.
-        country (str): Country to search (from parser).
+    Returns:
+        numpy.ndarray: Countries from the highest value to the lowest, or
+        None.
     """
-    key = 'SI.POV.GINI'
-    country = parser.get('country')
-
-    status, value, errmsg = _get_latest(config, key, country)
+    if skip_list is not GROUPS:
+        return None
 
-    if status:
-        # Found value
-        value = value / 100
-        return 'The Gini index in %s is %.4f' % (country, value)
-
-    # No value
-    if errmsg:
-        # Something happened before finding the key
-        return errmsg
-
-    else:
-        # Didn't find value for the specified country
-        return 'No Gini index value for %s' % country
+    return store.ranking_of(key, year)
 
 
-def gini_avg(config, parser):
-    """Obtain average GINI for a given year.
+def _get_top(config, key, year, num, skip_list=GROUPS, lowest=False):
+    """Obtain the countries with the highest values for a key in a year.
 
     Args:
         config (ConfigParser): Information about datafile to use.
+        key (str): Key to search.
         year (int): Year to obtain (from parser).
+        num (int): Number of countries (from parser).
+        skip_list (list[str]): IDs to skip.
+        lowest (bool): Obtain the countries with the lowest values instead.
+
+    Returns:
+        Tuple: Boolean, (country, value) list, Error string
     """
-    key = 'SI.POV.GINI'
-    year = parser.get('year')
+    # Check datafile
+    store = load(config)
 
-    status, value, errmsg = _get_avg(config, key, year)
+    if store is None:
+        return False, None, 'Cant find the database %s' % config.get('path')
 
-    if status:
-        # Found value
-        value = value / 100
-        return 'Average Gini in %s is %.4f' % (year, value)
+    # Get year
+    try:
+        year = int(year)
 
-    # No value
-    if errmsg:
-        # Something happened before finding the key
-        return errmsg
+    except:
+        return False, None, 'When do you say?'
 
-    else:
-        # Didn't find value for the specified country
-        return 'No Gini index value in %s' % year
+    # Get number of countries
+    try:
+        num = indicators.top_num(num)
 
+    except ValueError:
+        return False, None, 'How many?'
 
-def gini_count(config, parser):
-    """Obtain number of countries with GINI for a given year.
+    print('Obtaining %s %d of %s for year %d' % (
+        'bottom' if lowest else 'top', num, key, year))
 
-    Args:
-        config (ConfigParser): Information about datafile to use.
-        year (int): Year to obtain (from parser).
-    """
-    key = 'SI.POV.GINI'
-    year = parser.get('year')
+    # Obtain countries
+    found = []
 
-    status, value, errmsg = _get_count(config, key, year)
+    ranking = _ranking(store, key, year, skip_list)
+    matrix = store.matrix(key)
+    col = store.column(year)
 
-    if status:
-        # Found value
-        return 'The number of countries with Gini index in %s is %d' % (year, value)
+    if matrix is not None and col is not None:
+        if ranking is not None:
+            found = ranking[::-1][:num] if lowest else ranking[:num]
 
-    # No value
-    if errmsg:
-        # Something happened before finding the key
-        return errmsg
+        else:
+            metrics.scanned(len(matrix))
+            found = aggregate.top(
+                matrix[:, col], num, store.mask(skip_list), lowest)
 
-    else:
-        # Didn't find value for the specified country
-        return 'No countries with Gini index value in %s' % year
+    # Didn't find key
+    if not len(found):
+        print('Did not find value')
+        return False, None, None
 
+    print('Found %d countries' % len(found))
 
-def gini_max(config, parser):
-    """Obtain max GINI for a given year.
+    return True, [
+        (store.countries[index], float(matrix[index, col]))
+        for index in found.tolist()
+    ], None
+
+
+def _get_bottom(config, key, year, num, skip_list=GROUPS):
+    """Obtain the countries with the lowest values for a key in a year.
 
     Args:
         config (ConfigParser): Information about datafile to use.
+        key (str): Key to search.
         year (int): Year to obtain (from parser).
-    """
-    key = 'SI.POV.GINI'
-    year = parser.get('year')
-
-    status, value, country, errmsg = _get_max(config, key, year)
-
-    if status:
-        # Found value
-        value = value / 100
-        return 'Maximum Gini in %s is %.4f (%s)' % (year, value, country)
-
-    # No value
-    if errmsg:
-        # Something happened before finding the key
-        return errmsg
+        num (int): Number of countries (from parser).
+        skip_list (list[str]): IDs to skip.
 
-    else:
-        # Didn't find value for the specified country
-        return 'No maximum Gini index value in %s' % year
+    Returns:
+        Tuple: Boolean, (country, value) list, Error string
+    """
+    return _get_top(config, key, year, num, skip_list, lowest=True)
 
 
-def gini_min(config, parser):
-    """Obtain min GINI for a given year.
+def _get_rank(config, key, country, year, skip_list=GROUPS):
+    """Obtain the position of a country from the highest value in a year.
 
     Args:
         config (ConfigParser): Information about datafile to use.
+        key (str): Key to search.
+        country (str): Country to search (from parser).
         year (int): Year to obtain (from parser).
-    """
-    key = 'SI.POV.GINI'
-    year = parser.get('year')
-
-    status, value, country, errmsg = _get_min(config, key, year)
-
-    if status:
-        # Found value
-        value = value / 100
-        return 'Minimum Gini in %s is %.4f (%s)' % (year, value, country)
+        skip_list (list[str]): IDs to skip.
 
-    # No value
-    if errmsg:
-        # Something happened before finding the key
-        return errmsg
+    Returns:
+        Tuple: Boolean, (position, number of countries, value), Error string
+    """
+    # Check datafile
+    store = load(config)
 
-    else:
-        # Didn't find value for the specified country
-        return 'No minimum Gini index value in %s' % year
+    if store is None:
+        return False, None, 'Cant find the database %s' % config.get('path')
 
+    # Get country
+    if not country:
+        return False, None, 'Which country?'
 
-def gini_year(config, parser):
-    """Obtain GINI for a given country in a specific year.
+    # Get year
+    try:
+        year = int(year)
 
-    Args:
-        config (ConfigParser): Information about datafile to use.
-        country (str): Country to search (from parser).
-        year (int): Year to obtain (from parser).
-    """
-    key = 'SI.POV.GINI'
-    country = parser.get('country')
-    year = parser.get('year')
+    except:
+        return False, None, 'When do you say?'
 
-    status, value, errmsg = _get_year(config, key, country, year)
+    print('Obtaining rank of %s for country %s in year %d' % (
+        key, country, year))
 
-    if status:
-        # Found value
-        value = value / 100
-        return 'The Gini index for %s in %s is %.4f' % (country, year, value)
+    # Obtain position
+    found = None
 
-    # No value
-    if errmsg:
-        # Something happened before finding the key
-        return errmsg
+    ranking = _ranking(store, key, year, skip_list)
+    matrix = store.matrix(key)
+    col = store.column(year)
+    index = store.country_index(country)
 
-    else:
-        # Didn't find value for the specified country
-        return 'No Gini index value for %s in %s' % (country, year)
+    if matrix is not None and col is not None and index is not None:
+        if ranking is not None:
+            position = np.flatnonzero(ranking == index)
 
+            if len(position):
+                found = int(position[0]) + 1, len(ranking)
 
-def pib(config, parser):
-    """Obtain latest PIB for a given country.
+        else:
+            metrics.scanned(len(matrix))
+            found = aggregate.rank(
+                matrix[:, col], index, store.mask(skip_list))
 
-    Args:
-        config (ConfigParser): Information about datafile to use.
-        country (str): Country to search (from parser).
-    """
-    key = 'NY.GDP.MKTP.CD'
-    country = parser.get('country')
+    # Didn't find key
+    if not found:
+        print('Did not find value')
+        return False, None, None
 
-    status, value, errmsg = _get_latest(config, key, country)
+    position, total = found
+    value = float(matrix[index, col])
 
-    if status:
-        # Found value
-        value = value / 1000000
-        return 'GDP in %s is %.2f Million $' % (country, value)
+    print('Found %s in position %d of %d' % (country, position, total))
 
-    # No value
-    if errmsg:
-        # Something happened before finding the key
-        return errmsg
+    return True, (position, total, value), None
 
-    else:
-        # Didn't find value for the specified country
-        return 'No GDP values in %s' % country
 
+def _get_group(config, key, group, year, how='mean'):
+    """Obtain the aggregate of the countries of a group in a year.
 
-def pib_avg(config, parser):
-    """Obtain average PIB in a specific year.
+    If no country is known to be in the group (e.g. without the WDI metadata),
+    the row of the group itself is used, if the data has it.
 
     Args:
         config (ConfigParser): Information about datafile to use.
+        key (str): Key to search.
+        group (str): Code of the group (see groups.py).
         year (int): Year to obtain (from parser).
+        how (str): One of GROUP_AGGREGATES.
+
+    Returns:
+        Tuple: Boolean, (value, number of countries or 0 for the row of the
+        group), Error string
     """
-    key = 'NY.GDP.MKTP.CD'
-    year = parser.get('year')
+    # Check datafile
+    store = load(config)
+
+    if store is None:
+        return False, None, 'Cant find the database %s' % config.get('path')
+
+    # Get year
+    try:
+        year = int(year)
 
-    status, value, errmsg = _get_avg(config, key, year)
+    except:
+        return False, None, 'When do you say?'
 
-    if status:
-        # Found value
-        value = value / 1000000
-        return 'Average GDP in %s is %.2f Million $' % (year, value)
+    print('Obtaining %s of %s for group %s in year %d' % (
+        how, key, group, year))
 
-    # No value
-    if errmsg:
-        # Something happened before finding the key
-        return errmsg
+    # Obtain value
+    found = None
 
-    else:
-        # Didn't find value for the specified country
-        return 'No countries with GDP value in %s' % year
+    summary = store.group_of(key, year, group)
+    members = store.members(group)
+    matrix = store.matrix(key)
+    col = store.column(year)
 
+    if matrix is not None and col is not None:
+        if members is None or not members.any():
+            # Row of the group
+            if group in store.codes:
+                value = matrix[store.codes.index(group), col]
 
-def pib_count(config, parser):
-    """Obtain number of countries with PIB for a given year.
+                if not np.isnan(value):
+                    found = float(value), 0
 
-    Args:
-        config (ConfigParser): Information about datafile to use.
-        year (int): Year to obtain (from parser).
-    """
-    key = 'NY.GDP.MKTP.CD'
-    year = parser.get('year')
+        elif summary:
+            value, num = GROUP_AGGREGATES[how]
+
+            if summary[num]:
+                found = summary[value], int(summary[num])
 
-    status, value, errmsg = _get_count(config, key, year)
+        else:
+            population = store.matrix(groups.POPULATION)
+            metrics.scanned(len(matrix))
+            found = aggregate.group(
+                matrix[:, col], members, how,
+                None if population is None else population[:, col])
 
-    if status:
-        # Found value
-        return 'The number of countries with GDP values in %s is %d' % (year, value)
+    # Didn't find key
+    if not found:
+        print('Did not find value')
+        return False, None, None
 
-    # No value
-    if errmsg:
-        # Something happened before finding the key
-        return errmsg
+    print('Found value for %d countries (%f)' % (found[1], found[0]))
 
-    else:
-        # Didn't find value for the specified country
-        return 'No countries with GDP values in %s' % year
+    return True, found, None
 
 
-def pib_max(config, parser):
-    """Obtain max PIB for a given year.
+def _get_series(config, key, country, years):
+    """Obtain the values of a given country in a span of years.
 
     Args:
         config (ConfigParser): Information about datafile to use.
-        year (int): Year to obtain (from parser).
-    """
-    key = 'NY.GDP.MKTP.CD'
-    year = parser.get('year')
-
-    status, value, country, errmsg = _get_max(config, key, year)
+        key (str): Key to search.
+        country (str): Country to search (from parser).
+        years (str): Span of years to obtain (from parser, '2000-2015').
 
-    if status:
-        # Found value
-        value = value / 1000000
-        return 'Maximum GDP in %s is %.4f (%s)' % (year, value, country)
+    Returns:
+        Tuple: Boolean, years and values (only the years with a value),
+        Error string
+    """
+    # Check datafile
+    store = load(config)
 
-    # No value
-    if errmsg:
-        # Something happened before finding the key
-        return errmsg
+    if store is None:
+        return False, None, 'Cant find the database %s' % config.get('path')
 
-    else:
-        # Didn't find value for the specified country
-        return 'No maximum GDP in %s' % year
+    # Get country
+    if not country:
+        return False, None, 'Which country?'
 
+    # Get years
+    try:
+        start, end = indicators.span(years)
 
-def pib_min(config, parser):
-    """Obtain min PIB for a given year.
+    except ValueError:
+        return False, None, 'When do you say?'
 
-    Args:
-        config (ConfigParser): Information about datafile to use.
-        year (int): Year to obtain (from parser).
-    """
-    key = 'NY.GDP.MKTP.CD'
-    year = parser.get('year')
+    print('Obtaining %s for country %s from %d to %d' % (
+        key, country, start, end))
 
-    status, value, country, errmsg = _get_min(config, key, year)
+    # Slice of the row of the country
+    row = store.row(key, country)
+    first = max(start - store.first_year, 0)
+    last = min(end - store.first_year + 1, store.num_years)
 
-    if status:
-        # Found value
-        value = value / 1000000
-        return 'Minimum GDP in %s is %.4f (%s)' % (year, value, country)
+    if row is not None and first < last:
+        values = row[first:last]
+        found = ~np.isnan(values)
 
-    # No value
-    if errmsg:
-        # Something happened before finding the key
-        return errmsg
+        if found.any():
+            print('Found %d values for %s' % (found.sum(), country))
+            return True, (
+                (np.flatnonzero(found) + first + store.first_year).tolist(),
+                values[found].tolist()), None
 
-    else:
-        # Didn't find value for the specified country
-        return 'No minimum GDP in %s' % year
+    # Didn't find key
+    print('Did not find value')
+    return False, None, None
 
 
-def pib_year(config, parser):
-    """Obtain PIB for a given country in a specific year.
+def _fields(indicator, kind, found, scale):
+    """Obtain the fields of the reply of a series or ranking query.
 
     Args:
-        config (ConfigParser): Information about datafile to use.
-        country (str): Country to search (from parser).
-        year (int): Year to obtain (from parser).
+        indicator (dict): Registry entry (see indicators.INDICATORS).
+        kind (str): One of indicators.SERIES_KINDS or RANK_KINDS, or
+            'group'.
+        found: What the getter found: years and values of a series,
+            (country, value) list of a top or bottom, (position, total,
+            value) of a rank, or (value, number of countries) of a group.
+        scale (float): Values are divided by it before formatting.
+
+    Returns:
+        dict: Fields for the template, or None if there are not enough
+        values.
     """
-    key = 'NY.GDP.MKTP.CD'
-    country = parser.get('country')
-    year = parser.get('year')
+    unit = indicator.get('unit', '')
 
-    status, value, errmsg = _get_year(config, key, country, year)
+    if kind in ('top', 'bottom'):
+        item = indicators.template(indicator, kind + '-value')
 
-    if status:
-        # Found value
-        value = value / 1000000
-        return 'GDP in %s on %s is %.2f Million $' % (
-            country, year, value)
+        return {'num': len(found), 'values': ', '.join(
+            item.format(rank=rank, country=country, value=value / scale,
+                        unit=unit)
+            for rank, (country, value) in enumerate(found, 1))}
 
-    # No value
-    if errmsg:
-        # Something happened before finding the key
-        return errmsg
+    if kind == 'rank':
+        rank, total, value = found
 
-    else:
-        # Didn't find value for the specified country
-        return 'No GDP in %s on %s' % (country, year)
+        return {'rank': rank, 'total': total, 'value': value / scale}
 
+    if kind == 'group':
+        value, num = found
 
-def pibpc(config, parser):
-    """Obtain latest PIBpc for a given country.
+        return {
+            'how': indicators.AGGREGATES[indicator.get('aggregate', 'mean')],
+            'value': value / scale,
+            'countries': indicators.template(
+                indicator, 'group-countries' if num else 'group-row').format(
+                    num=num)
+        }
 
-    Args:
-        config (ConfigParser): Information about datafile to use.
-        country (str): Country to search (from parser).
-    """
-    key = 'NY.GDP.PCAP.CD'
-    country = parser.get('country')
+    years, values = found
+    fields = {'start': years[0], 'end': years[-1]}
+
+    if kind == 'range':
+        item = indicators.template(indicator, 'range-value')
+        fields['values'] = ', '.join(
+            item.format(year=year, value=value / scale, unit=unit)
+            for year, value in zip(years, values))
 
-    status, value, errmsg = _get_latest(config, key, country)
+    elif kind == 'growth':
+        found = aggregate.growth(years, values)
 
-    if status:
-        # Found value
-        return 'GDP per Cápita in %s is $ %.2f' % (country, value)
+        if found is None:
+            return None
 
-    # No value
-    if errmsg:
-        # Something happened before finding the key
-        return errmsg
+        change, cagr = found
+        fields['change'] = change
+        fields['cagr'] = '' if cagr is None else indicators.template(
+            indicator, 'growth-cagr').format(cagr=cagr)
 
     else:
-        # Didn't find value for the specified country
-        return 'No GDP per Cápita in %s' % country
+        slope = aggregate.trend(years, values)
+
+        if slope is None:
+            return None
 
+        fields['slope'] = slope / scale
 
-def pibpc_avg(config, parser):
-    """Obtain average PIBpc in a specific year.
+    return fields
+
+
+def _reply(config, indicator, key, kind, **fields):
+    """Format the reply of an action.
 
     Args:
         config (ConfigParser): Information about datafile to use.
-        year (int): Year to obtain (from parser).
+        indicator (dict): Registry entry (see indicators.INDICATORS).
+        key (str): Indicator code.
+        kind (str): Template to use (a kind, or 'no-' and a kind).
+        fields: Values for the template.
     """
-    key = 'NY.GDP.PCAP.CD'
-    year = parser.get('year')
+    name = indicator.get('name') or _getters(config)['name'](config, key)
 
-    status, value, errmsg = _get_avg(config, key, year)
+    return indicators.template(indicator, kind).format(
+        name=name, unit=indicator.get('unit', ''), **fields)
 
-    if status:
-        # Found value
-        return 'Average GDP per Cápita in %s is $ %.2f' % (year, value)
 
-    # No value
-    if errmsg:
-        # Something happened before finding the key
-        return errmsg
+def make_action(indicator, kind):
+    """Create the action for a kind of query of an indicator.
 
-    else:
-        # Didn't find value for the specified country
-        return 'No average GDP per Cápita in %s' % year
+    Args:
+        indicator (dict): Registry entry (see indicators.INDICATORS). If it
+            has no code, the code is taken from the parser.
+        kind (str): One of indicators.KINDS.
 
+    Returns:
+        function: Action receiving the config and the parser.
+    """
+    scale = indicator.get('scale', 1)
 
-def pibpc_count(config, parser):
-    """Obtain number of countries with PIBpc for a given year.
+    def action(config, parser):
+        key = indicator.get('code') or parser.get('code')
+        # Spaces collapsed (the cache key also folds the case and accents)
+        country = cache.normalize(parser.get('country'))
+        year = parser.get('year')
 
-    Args:
-        config (ConfigParser): Information about datafile to use.
-        year (int): Year to obtain (from parser).
-    """
-    key = 'NY.GDP.PCAP.CD'
-    year = parser.get('year')
+        if not key:
+            return 'Which indicator?'
 
-    status, value, errmsg = _get_count(config, key, year)
+        # One store for every value of the reply
+        config = pin(config)
+        getters = _getters(config)
+        getter = getters[kind]
 
-    if status:
-        # Found value
-        return 'The number of countries with GDP per Cápita in %s is %d' % (year, value)
+        if not indicator.get('code'):
+            # Code in the data, written in any case
+            key = getters['code'](config, key) or key
 
-    # No value
-    if errmsg:
-        # Something happened before finding the key
-        return errmsg
+        if kind == 'group':
+            # Code and name of the group, which is given as the country
+            if not country:
+                return 'Which group?'
 
-    else:
-        # Didn't find value for the specified country
-        return 'No countries with GDP per Cápita in %s' % year
+            group, name, suggestions = groups.resolve(country)
 
+            if suggestions:
+                return countries.did_you_mean(country, suggestions)
 
-def pibpc_max(config, parser):
-    """Obtain max PIBpc for a given year.
+            if group is None:
+                return 'I do not know the group %s' % country
 
-    Args:
-        config (ConfigParser): Information about datafile to use.
-        year (int): Year to obtain (from parser).
-    """
-    key = 'NY.GDP.PCAP.CD'
-    year = parser.get('year')
+            country = name
 
-    status, value, country, errmsg = _get_max(config, key, year)
+        elif kind in COUNTRY_KINDS and country:
+            # Name of the country in the data, before reading any value
+            resolver = getters['countries'](config)
 
-    if status:
-        # Found value
-        value = value
-        return 'Maximum GDP per Cápita in %s is %.4f (%s)' % (year, value, country)
+            if resolver is not None:
+                found, suggestions = resolver.resolve(country)
 
-    # No value
-    if errmsg:
-        # Something happened before finding the key
-        return errmsg
+                if suggestions:
+                    return countries.did_you_mean(country, suggestions)
 
-    else:
-        # Didn't find value for the specified country
-        return 'No maximum GDP per Cápita index value in %s' % year
+                # Unknown countries are not found by the getter either
+                country = found or country
 
+        if kind == 'latest':
+            status, value, year, errmsg = getter(config, key, country)
 
-def pibpc_min(config, parser):
-    """Obtain min PIBpc for a given year.
+        elif kind in ('year', 'rank') + indicators.SERIES_KINDS:
+            status, value, errmsg = getter(config, key, country, year)
 
-    Args:
-        config (ConfigParser): Information about datafile to use.
-        year (int): Year to obtain (from parser).
-    """
-    key = 'NY.GDP.PCAP.CD'
-    year = parser.get('year')
+        elif kind in ('top', 'bottom'):
+            status, value, errmsg = getter(
+                config, key, year, parser.get('num'))
 
-    status, value, country, errmsg = _get_min(config, key, year)
+        elif kind in ('max', 'min'):
+            status, value, country, errmsg = getter(config, key, year)
 
-    if status:
-        # Found value
-        value = value
-        return 'Minimum GDP per Cápita in %s is %.4f (%s)' % (year, value, country)
+        elif kind == 'group':
+            status, value, errmsg = getter(
+                config, key, group, year, indicator.get('aggregate', 'mean'))
 
-    # No value
-    if errmsg:
-        # Something happened before finding the key
-        return errmsg
+        else:
+            status, value, errmsg = getter(config, key, year)
 
-    else:
-        # Didn't find value for the specified country
-        return 'No minimum GDP per Cápita index value in %s' % year
+        if status and kind in COMPOUND_KINDS:
+            # Reduce the series or ranking (None if not enough values)
+            fields = _fields(indicator, kind, value, scale)
 
+            if fields is not None:
+                return _reply(
+                    config, indicator, key, kind,
+                    country=country, year=year, **fields)
 
-def pibpc_year(config, parser):
-    """Obtain PIBpc for a given country in a specific year.
+        elif status:
+            # Found value
+            if kind != 'count':
+                value = value / scale
 
-    Args:
-        config (ConfigParser): Information about datafile to use.
-        country (str): Country to search (from parser).
-        year (int): Year to obtain (from parser).
-    """
-    key = 'NY.GDP.PCAP.CD'
-    country = parser.get('country')
-    year = parser.get('year')
+            return _reply(
+                config, indicator, key, kind,
+                country=country, year=year, value=value)
 
-    status, value, errmsg = _get_year(config, key, country, year)
+        # No value
+        if errmsg:
+            # Something happened before finding the key
+            return errmsg
 
-    if status:
-        # Found value
-        return 'GDP per Cápita of %s in %s is $ %.2f' % (
-            country, year, value)
+        else:
+            # Didn't find value
+            return _reply(
+                config, indicator, key, 'no-' + kind,
+                country=country, year=year)
 
-    # No value
-    if errmsg:
-        # Something happened before finding the key
-        return errmsg
+    action.__name__ = indicators.action_name(
+        indicator.get('code') or indicators.GENERIC, kind)
+    action.__doc__ = 'Obtain %s of %s.' % (
+        kind, indicator.get('name') or 'an indicator')
 
-    else:
-        # Didn't find value for the specified country
-        return 'No GDP per Cápita for %s in %s' % (country, year)
+    return action
 
 
-def unemp(config, parser):
-    """Obtain latest Unenployment for a given country.
+def _get_name(config, key):
+    """Obtain the name of an indicator (its code if not found)."""
+    store = load(config)
 
-    Args:
-        config (ConfigParser): Information about datafile to use.
-        country (str): Country to search (from parser).
-    """
-    key = 'SL.UEM.TOTL.NE.ZS'
-    country = parser.get('country')
+    if store is None:
+        return key
 
-    status, value, errmsg = _get_latest(config, key, country)
+    return store.indicator_name(key)
 
-    if status:
-        # Found value
-        return 'The unemployment rate in %s is %.2f %%' % (country, value)
 
-    # No value
-    if errmsg:
-        # Something happened before finding the key
-        return errmsg
+def _get_code(config, key):
+    """Obtain the code of an indicator written in any case (None if not
+    found)."""
+    store = load(config)
 
-    else:
-        # Didn't find value for the specified country
-        return 'No unemployment rate in %s' % country
+    if store is None:
+        return None
 
+    return store.indicator_code(key)
 
-def unemp_avg(config, parser):
-    """Obtain average Unemployment in a specific year.
 
-    Args:
-        config (ConfigParser): Information about datafile to use.
-        year (int): Year to obtain (from parser).
-    """
-    key = 'SL.UEM.TOTL.NE.ZS'
-    year = parser.get('year')
+def _get_mask(config):
+    """Obtain the mask of the countries that are not aggregates (None if
+    there is no data)."""
+    store = load(config)
 
-    status, value, errmsg = _get_avg(config, key, year)
+    if store is None:
+        return None
 
-    if status:
-        # Found value
-        return 'The average unemployment rate in %s is %.2f %%' % (year, value)
+    return store.mask(GROUPS)
 
-    # No value
-    if errmsg:
-        # Something happened before finding the key
-        return errmsg
 
-    else:
-        # Didn't find value for the specified country
-        return 'No average unemployment rate in %s' % year
+def _get_countries(config):
+    """Obtain the lookup of the countries (None if there is no data)."""
+    store = load(config)
+
+    if store is None:
+        return None
 
+    return store.resolver
 
-def unemp_count(config, parser):
-    """Obtain number of countries with Unemployment for a given year.
+
+def _get_matrices(config, keys):
+    """Obtain the country x year matrices of several indicators.
 
     Args:
         config (ConfigParser): Information about datafile to use.
-        year (int): Year to obtain (from parser).
+        keys (list[str]): Indicator codes.
+
+    Returns:
+        Tuple: country names, country IDs, first year and the matrices (None
+        for unknown indicators), or None if there is no data.
     """
-    key = 'SL.UEM.TOTL.NE.ZS'
-    year = parser.get('year')
+    store = load(config)
 
-    status, value, errmsg = _get_count(config, key, year)
+    if store is None:
+        return None
 
-    if status:
-        # Found value
-        return 'The number of countries with unemployment values in %s is %d' % (year, value)
+    metrics.scanned(len(store.codes) * len(keys))
 
-    # No value
-    if errmsg:
-        # Something happened before finding the key
-        return errmsg
+    return (
+        store.countries, store.codes, store.first_year,
+        [store.matrix(key) for key in keys])
 
-    else:
-        # Didn't find value for the specified country
-        return 'No countries with unemployment values in %s' % year
 
+# Helpers used by the actions (measured, see metrics.py)
+GETTERS = metrics.instrument({
+    'latest': _get_latest,
+    'year': _get_year,
+    'avg': _get_avg,
+    'max': _get_max,
+    'min': _get_min,
+    'count': _get_count,
+    'range': _get_series,
+    'growth': _get_series,
+    'trend': _get_series,
+    'top': _get_top,
+    'bottom': _get_bottom,
+    'rank': _get_rank,
+    'group': _get_group,
+    'name': _get_name,
+    'code': _get_code,
+    'countries': _get_countries,
+    'mask': _get_mask,
+    'matrices': _get_matrices
+})
 
-def unemp_max(config, parser):
-    """Obtain max Unemployement for a given year.
 
-    Args:
-        config (ConfigParser): Information about datafile to use.
-        year (int): Year to obtain (from parser).
-    """
-    key = 'SL.UEM.TOTL.NE.ZS'
-    year = parser.get('year')
-
-    status, value, country, errmsg = _get_max(config, key, year)
+def _getters(config):
+    """Obtain the helpers for the engine of the config (memory or sql)."""
+    if config.get('engine') == 'sql':
+        return wdi_sql.GETTERS
 
-    if status:
-        # Found value
-        return 'Maximum unemployement in %s is %.2f (%s)' % (year, value, country)
+    return GETTERS
 
-    # No value
-    if errmsg:
-        # Something happened before finding the key
-        return errmsg
 
-    else:
-        # Didn't find value for the specified country
-        return 'No maximum unemployement value in %s' % year
+def indicator_name(config, key):
+    """Obtain the name of an indicator in the data of the config."""
+    return _getters(config)['name'](config, key)
 
 
-def unemp_min(config, parser):
-    """Obtain min Unemployement for a given year.
-
-    Args:
-        config (ConfigParser): Information about datafile to use.
-        year (int): Year to obtain (from parser).
-    """
-    key = 'SL.UEM.TOTL.NE.ZS'
-    year = parser.get('year')
+def indicator_code(config, text):
+    """Obtain the code of an indicator written in any case in the data of the
+    config (None if not found)."""
+    return _getters(config)['code'](config, text)
 
-    status, value, country, errmsg = _get_min(config, key, year)
 
-    if status:
-        # Found value
-        return 'Minimum unemployement in %s is %.2f (%s)' % (year, value, country)
+def country_mask(config):
+    """Obtain the mask of the rows of matrices() that are countries, not
+    aggregates (see _get_mask), from the engine of the config."""
+    return _getters(config)['mask'](config)
 
-    # No value
-    if errmsg:
-        # Something happened before finding the key
-        return errmsg
 
-    else:
-        # Didn't find value for the specified country
-        return 'No minimum unemployement value in %s' % year
+def matrices(config, keys):
+    """Obtain the country x year matrices of several indicators (see
+    _get_matrices), from the engine of the config."""
+    return _getters(config)['matrices'](config, keys)
 
 
-def unemp_year(config, parser):
-    """Obtain Unemployment for a given country in a specific year.
+def _make_actions():
+    """Create the actions of all the indicators in the registry.
 
-    Args:
-        config (ConfigParser): Information about datafile to use.
-        country (str): Country to search (from parser).
-        year (int): Year to obtain (from parser).
+    Returns:
+        dict: name: (indicator code or None, function)
     """
-    key = 'SL.UEM.TOTL.NE.ZS'
-    country = parser.get('country')
-    year = parser.get('year')
+    actions = {}
 
-    status, value, errmsg = _get_year(config, key, country, year)
+    for name, indicator in indicators.INDICATORS.items():
+        for kind in indicators.KINDS:
+            actions[indicators.action_name(name, kind)] = (
+                indicator['code'], make_action(indicator, kind))
 
-    if status:
-        # Found value
-        return 'The unemployment rate in %s in %s is %.2f %%' % (
-            country, year, value)
+    for kind in indicators.KINDS:
+        actions[indicators.action_name(indicators.GENERIC, kind)] = (
+            None, make_action({}, kind))
 
-    # No value
-    if errmsg:
-        # Something happened before finding the key
-        return errmsg
+    return actions
 
-    else:
-        # Didn't find value for the specified country
-        return 'No unemployment rate in %s in %s' % (country, year)
+
+# Actions (name: indicator code, function). Generic actions have no code.
+ACTIONS = _make_actions()
@@ -0,0 +1,848 @@
+# -*- coding: utf-8 -*-
+
+"""This file contains the implementation for working with the WDI data in a
+SQLite database.
+
+The helpers follow the same contract as the ones in wdi.py. The database is
+created from WDI_Data.csv with the ingest command (from agents/sarah):
+
+    python3 -m actions.wdi_sql /path/to/WDI_Data.csv /path/to/world.sqlite
+
+The members of the regions and income groups (see groups.py) are stored in
+the groups table when the database is created.
+
+Set 'engine = sql' in the databases.conf section of the database to serve
+the WDI actions from it. Connections are taken from the pool in the
+'connections' entry of the config (see connections.py).
+"""
+
+import argparse
+import csv
+import os
+import sqlite3
+
+import numpy as np
+
+from actions import connections
+from actions import groups
+from actions import indicators
+from actions import metrics
+from actions.countries import CountryIndex
+from actions.store import (
+    GROUPS, INDEX_COUNTRY, INDEX_GINI, INDEX_ID, INDEX_NAME, INDEX_YEAR)
+
+# Rows inserted per transaction when ingesting
+INGEST_BATCH = 50000
+
+# Lookups of the countries (by database path: modification time, lookup and
+# mask of the rows that are countries)
+_RESOLVERS = {}
+
+SCHEMA = '''
+CREATE TABLE wdi (
+    indicator TEXT NOT NULL,
+    country_code TEXT NOT NULL,
+    country_name TEXT NOT NULL,
+    year INTEGER NOT NULL,
+    value REAL NOT NULL,
+    PRIMARY KEY (indicator, country_code, year)
+) WITHOUT ROWID;
+
+CREATE TABLE indicators (
+    code TEXT PRIMARY KEY,
+    name TEXT NOT NULL
+);
+
+CREATE TABLE groups (
+    group_code TEXT NOT NULL,
+    country_code TEXT NOT NULL,
+    PRIMARY KEY (group_code, country_code)
+) WITHOUT ROWID;
+'''
+
+INDEXES = '''
+CREATE INDEX wdi_country ON wdi (indicator, country_name, year, value);
+CREATE INDEX wdi_year ON wdi (
+    indicator, year, value, country_code, country_name);
+'''
+
+
+def _rows(datafile, names):
+    """Obtain the (indicator, country_code, country_name, year, value) rows of
+    the CSV file with a value.
+
+    Args:
+        datafile (str): Path to the WDI_Data.csv file.
+        names (dict): Filled with the name of every indicator.
+    """
+    with open(datafile, 'r', encoding='mac_roman', newline='') as f:
+        reader = csv.reader(f)
+
+        header = next(reader)
+        years = [int(c) for c in header[INDEX_YEAR:] if c.isdigit()]
+
+        for line in reader:
+            if len(line) <= INDEX_YEAR:
+                continue
+
+            key = line[INDEX_GINI]
+            names.setdefault(key, line[INDEX_NAME])
+
+            for year, cell in zip(years, line[INDEX_YEAR:]):
+                try:
+                    value = float(cell)
+
+                except ValueError:
+                    # Empty or not a number
+                    continue
+
+                yield key, line[INDEX_ID], line[INDEX_COUNTRY], year, value
+
+
+def ingest(datafile, database):
+    """Load the WDI CSV file into a new SQLite database.
+
+    The values are inserted before creating the indexes, and the database is
+    left in WAL mode for concurrent readers.
+
+    Args:
+        datafile (str): Path to the WDI_Data.csv file.
+        database (str): Path to the database (replaced if it exists).
+    """
+    tmp = database + '.tmp'
+
+    if os.path.exists(tmp):
+        os.remove(tmp)
+
+    conn = sqlite3.connect(tmp)
+
+    try:
+        conn.execute('PRAGMA synchronous = OFF')
+        conn.execute('PRAGMA journal_mode = OFF')
+        conn.executescript(SCHEMA)
+
+        names = {}
+        rows = _rows(datafile, names)
+        count = 0
+
+        while True:
+            chunk = [row for _, row in zip(range(INGEST_BATCH), rows)]
+
+            if not chunk:
+                break
+
+            with conn:
+                conn.executemany(
+                    'INSERT INTO wdi VALUES (?, ?, ?, ?, ?)', chunk)
+
+            count += len(chunk)
+            print('Inserted %d values' % count)
+
+        with conn:
+            conn.executemany(
+                'INSERT INTO indicators VALUES (?, ?)', names.items())
+
+        # Members of the groups
+        codes = [code for code, in conn.execute(
+            'SELECT DISTINCT country_code FROM wdi ORDER BY country_code')]
+        bits = groups.membership(codes, datafile)
+        group_codes = groups.codes()
+
+        with conn:
+            conn.executemany('INSERT INTO groups VALUES (?, ?)', [
+                (group, codes[index])
+                for group in group_codes
+                for index in np.flatnonzero(
+                    groups.members(bits, group_codes, group)).tolist()
+            ])
+
+        print('Creating indexes')
+        conn.executescript(INDEXES)
+        conn.execute('ANALYZE')
+        conn.execute('PRAGMA journal_mode = WAL')
+
+    finally:
+        conn.close()
+
+    os.replace(tmp, database)
+
+
+def prepare(config):
+    """Obtain the connection pool of a databases.conf section.
+
+    Args:
+        config (ConfigParser): Section of the database.
+
+    Returns:
+        dict: Entries to add to the config of the actions.
+    """
+    return {'connections': connections.pool(config)}
+
+
+def _connect(config):
+    """Obtain a connection to the database of the config, or None if it does
+    not exist."""
+    database = config.get('path')
+
+    if not os.path.isfile(database):
+        return None
+
+    pool = config.get('connections')
+
+    if pool is None:
+        pool = connections.pool(config)
+
+    return pool.get()
+
+
+def _skip(skip_list):
+    """Obtain the SQL condition (and its params) to skip some IDs."""
+    if not skip_list:
+        return '', ()
+
+    marks = ', '.join('?' * len(skip_list))
+
+    return ' AND country_code NOT IN (%s)' % marks, tuple(skip_list)
+
+
+def _get_avg(config, key, year, skip_list=GROUPS, positive=True):
+    """Obtain average of values for a key in a year.
+
+    Args:
+        config (ConfigParser): Information about database to use.
+        key (str): Key to search.
+        year (int): Year to obtain (from parser).
+        skip_list (list[str]): IDs to skip.
+        positive (bool): Only average values greater than zero.
+
+    Returns:
+        Tuple: Boolean, Value (usually float), Error string
+    """
+    conn = _connect(config)
+
+    if conn is None:
+        return False, None, 'Cant find the database %s' % config.get('path')
+
+    # Get year
+    try:
+        year = int(year)
+
+    except:
+        return False, None, 'When do you say?'
+
+    print('Obtaining average of %s for year %d' % (key, year))
+
+    skip, params = _skip(skip_list)
+    sql = (
+        'SELECT AVG(value), COUNT(value) FROM wdi'
+        ' WHERE indicator = ? AND year = ?' + skip)
+
+    if positive:
+        sql += ' AND value > 0'
+
+    value, countries = conn.execute(sql, (key, year) + params).fetchone()
+
+    # Didn't find key
+    if not countries:
+        print('Did not find value')
+        return False, None, None
+
+    print('Found value for %d countries (%f)' % (countries, value))
+
+    return True, value, None
+
+
+def _get_count(config, key, year, skip_list=GROUPS):
+    """Obtain number of countries that have a value for a key in a year.
+
+    Args:
+        config (ConfigParser): Information about database to use.
+        key (str): Key to search.
+        year (int): Year to obtain (from parser).
+        skip_list (list[str]): IDs to skip.
+
+    Returns:
+        Tuple: Boolean, Value (usually float), Error string
+    """
+    conn = _connect(config)
+
+    if conn is None:
+        return False, None, 'Cant find the database %s' % config.get('path')
+
+    # Get year
+    try:
+        year = int(year)
+
+    except:
+        return False, None, 'When do you say?'
+
+    print('Obtaining count of %s for year %d' % (key, year))
+
+    skip, params = _skip(skip_list)
+    sql = (
+        'SELECT COUNT(*) FROM wdi WHERE indicator = ? AND year = ?' + skip)
+
+    value, = conn.execute(sql, (key, year) + params).fetchone()
+
+    # Always return value
+    return True, value, None
+
+
+def _get_latest(config, key, country):
+    """Obtain latest value for a given country.
+
+    Args:
+        config (ConfigParser): Information about database to use.
+        key (str): Key to search.
+        country (str): Country to search (from parser).
+
+    Returns:
+        Tuple: Boolean, Value (usually float), year, Error string
+    """
+    conn = _connect(config)
+
+    if conn is None:
+        return (
+            False, None, None,
+            'Cant find the database %s' % config.get('path'))
+
+    # Get country
+    if not country:
+        return False, None, None, 'Which country?'
+
+    print('Obtaining latest %s for country %s' % (key, country))
+
+    sql = (
+        'SELECT value, year FROM wdi'
+        ' WHERE indicator = ? AND country_name = ?'
+        ' ORDER BY year DESC LIMIT 1')
+
+    found = conn.execute(sql, (key, country)).fetchone()
+
+    if found:
+        value, year = found
+
+        print('Value found for %s in %d: %f' % (country, year, value))
+        return True, value, year, None
+
+    # Didn't find key
+    print('Did not find value')
+    return False, None, None, None
+
+
+def _get_extreme(config, key, year, skip_list, order):
+    """Obtain max (DESC order) or min (ASC order) of values in a year."""
+    conn = _connect(config)
+
+    if conn is None:
+        return (
+            False, None, None,
+            'Cant find the database %s' % config.get('path'))
+
+    # Get year
+    try:
+        year = int(year)
+
+    except:
+        return False, None, None, 'When do you say?'
+
+    print('Obtaining %s of %s for year %d' % (
+        'max' if order == 'DESC' else 'min', key, year))
+
+    skip, params = _skip(skip_list)
+    sql = (
+        'SELECT value, country_name FROM wdi'
+        ' WHERE indicator = ? AND year = ?' + skip +
+        ' ORDER BY value %s LIMIT 1' % order)
+
+    found = conn.execute(sql, (key, year) + params).fetchone()
+
+    # Didn't find key
+    if not found:
+        print('Did not find value')
+        return False, None, None, None
+
+    value, country = found
+    print('Found value: %f for %d (%s)' % (value, year, country))
+
+    return True, value, country, None
+
+
+def _get_max(config, key, year, skip_list=GROUPS):
+    """Obtain max of values for a key in a year.
+
+    Args:
+        config (ConfigParser): Information about database to use.
+        key (str): Key to search.
+        year (int): Year to obtain (from parser).
+        skip_list (list[str]): IDs to skip.
+
+    Returns:
+        Tuple: Boolean, Value (usually float), country, Error string
+    """
+    return _get_extreme(config, key, year, skip_list, 'DESC')
+
+
+def _get_min(config, key, year, skip_list=GROUPS):
+    """Obtain min of values for a key in a year.
+
+    Args:
+        config (ConfigParser): Information about database to use.
+        key (str): Key to search.
+        year (int): Year to obtain (from parser).
+        skip_list (list[str]): IDs to skip.
+
+    Returns:
+        Tuple: Boolean, Value (usually float), country, Error string
+    """
+    return _get_extreme(config, key, year, skip_list, 'ASC')
+
+
+def _get_year(config, key, country, year):
+    """Obtain value for a given country in a specific year.
+
+    Args:
+        config (ConfigParser): Information about database to use.
+        key (str): Key to search.
+        country (str): Country to search (from parser).
+        year (int): Year to obtain (from parser).
+
+    Returns:
+        Tuple: Boolean, Value (usually float), Error string
+    """
+    conn = _connect(config)
+
+    if conn is None:
+        return False, None, 'Cant find the database %s' % config.get('path')
+
+    # Get country
+    if not country:
+        return False, None, 'Which country?'
+
+    # Get year
+    try:
+        year = int(year)
+
+    except:
+        return False, None, 'When do you say?'
+
+    print('Obtaining %s for country %s in year %d' % (key, country, year))
+
+    sql = (
+        'SELECT value FROM wdi'
+        ' WHERE indicator = ? AND country_name = ? AND year = ?')
+
+    found = conn.execute(sql, (key, country, year)).fetchone()
+
+    if found:
+        value, = found
+
+        print('Value found for %s in %d: %f' % (country, year, value))
+        return True, value, None
+
+    # Didn't find key
+    print('Did not find value')
+    return False, None, None
+
+
+def _get_top(config, key, year, num, skip_list=GROUPS, lowest=False):
+    """Obtain the countries with the highest values for a key in a year.
+
+    Args:
+        config (ConfigParser): Information about database to use.
+        key (str): Key to search.
+        year (int): Year to obtain (from parser).
+        num (int): Number of countries (from parser).
+        skip_list (list[str]): IDs to skip.
+        lowest (bool): Obtain the countries with the lowest values instead.
+
+    Returns:
+        Tuple: Boolean, (country, value) list, Error string
+    """
+    conn = _connect(config)
+
+    if conn is None:
+        return False, None, 'Cant find the database %s' % config.get('path')
+
+    # Get year
+    try:
+        year = int(year)
+
+    except:
+        return False, None, 'When do you say?'
+
+    # Get number of countries
+    try:
+        num = indicators.top_num(num)
+
+    except ValueError:
+        return False, None, 'How many?'
+
+    print('Obtaining %s %d of %s for year %d' % (
+        'bottom' if lowest else 'top', num, key, year))
+
+    skip, params = _skip(skip_list)
+    sql = (
+        'SELECT country_name, value FROM wdi'
+        ' WHERE indicator = ? AND year = ?' + skip +
+        ' ORDER BY value %s LIMIT ?' % ('ASC' if lowest else 'DESC'))
+
+    found = conn.execute(sql, (key, year) + params + (num,)).fetchall()
+
+    # Didn't find key
+    if not found:
+        print('Did not find value')
+        return False, None, None
+
+    print('Found %d countries' % len(found))
+
+    return True, found, None
+
+
+def _get_bottom(config, key, year, num, skip_list=GROUPS):
+    """Obtain the countries with the lowest values for a key in a year.
+
+    Args:
+        config (ConfigParser): Information about database to use.
+        key (str): Key to search.
+        year (int): Year to obtain (from parser).
+        num (int): Number of countries (from parser).
+        skip_list (list[str]): IDs to skip.
+
+    Returns:
+        Tuple: Boolean, (country, value) list, Error string
+    """
+    return _get_top(config, key, year, num, skip_list, lowest=True)
+
+
+def _get_rank(config, key, country, year, skip_list=GROUPS):
+    """Obtain the position of a country from the highest value in a year.
+
+    Args:
+        config (ConfigParser): Information about database to use.
+        key (str): Key to search.
+        country (str): Country to search (from parser).
+        year (int): Year to obtain (from parser).
+        skip_list (list[str]): IDs to skip.
+
+    Returns:
+        Tuple: Boolean, (position, number of countries, value), Error string
+    """
+    conn = _connect(config)
+
+    if conn is None:
+        return False, None, 'Cant find the database %s' % config.get('path')
+
+    # Get country
+    if not country:
+        return False, None, 'Which country?'
+
+    # Get year
+    try:
+        year = int(year)
+
+    except:
+        return False, None, 'When do you say?'
+
+    print('Obtaining rank of %s for country %s in year %d' % (
+        key, country, year))
+
+    skip, params = _skip(skip_list)
+    sql = (
+        'SELECT value FROM wdi'
+        ' WHERE indicator = ? AND country_name = ? AND year = ?' + skip)
+
+    found = conn.execute(sql, (key, country, year) + params).fetchone()
+
+    # Didn't find key
+    if not found:
+        print('Did not find value')
+        return False, None, None
+
+    value, = found
+    sql = (
+        'SELECT SUM(value > ?), COUNT(*) FROM wdi'
+        ' WHERE indicator = ? AND year = ?' + skip)
+
+    higher, total = conn.execute(
+        sql, (value, key, year) + params).fetchone()
+
+    print('Found %s in position %d of %d' % (country, higher + 1, total))
+
+    return True, (higher + 1, total, value), None
+
+
+def _get_group(config, key, group, year, how='mean'):
+    """Obtain the aggregate of the countries of a group in a year.
+
+    If no country is known to be in the group (e.g. without the WDI metadata,
+    or in databases created before the groups table), the row of the group
+    itself is used, if the database has it.
+
+    Args:
+        config (ConfigParser): Information about database to use.
+        key (str): Key to search.
+        group (str): Code of the group (see groups.py).
+        year (int): Year to obtain (from parser).
+        how (str): 'mean', 'sum' or 'weighted' (by population).
+
+    Returns:
+        Tuple: Boolean, (value, number of countries or 0 for the row of the
+        group), Error string
+    """
+    conn = _connect(config)
+
+    if conn is None:
+        return False, None, 'Cant find the database %s' % config.get('path')
+
+    # Get year
+    try:
+        year = int(year)
+
+    except:
+        return False, None, 'When do you say?'
+
+    print('Obtaining %s of %s for group %s in year %d' % (
+        how, key, group, year))
+
+    members = 0
+
+    if conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table'"
+            " AND name = 'groups'").fetchone():
+        members, = conn.execute(
+            'SELECT COUNT(*) FROM groups WHERE group_code = ?',
+            (group,)).fetchone()
+
+    if not members:
+        # Row of the group
+        found = conn.execute(
+            'SELECT value, 0 FROM wdi'
+            ' WHERE indicator = ? AND country_code = ? AND year = ?',
+            (key, group, year)).fetchone()
+
+    elif how == 'weighted':
+        found = conn.execute(
+            'SELECT SUM(w.value * p.value) / SUM(p.value), COUNT(*)'
+            ' FROM wdi w'
+            ' JOIN groups g ON g.country_code = w.country_code'
+            ' JOIN wdi p ON p.indicator = ? AND p.year = w.year'
+            ' AND p.country_code = w.country_code'
+            ' WHERE w.indicator = ? AND w.year = ? AND g.group_code = ?'
+            ' AND p.value > 0',
+            (groups.POPULATION, key, year, group)).fetchone()
+
+    else:
+        found = conn.execute(
+            'SELECT %s(w.value), COUNT(*) FROM wdi w'
+            ' JOIN groups g ON g.country_code = w.country_code'
+            ' WHERE w.indicator = ? AND w.year = ? AND g.group_code = ?' % (
+                'SUM' if how == 'sum' else 'AVG'),
+            (key, year, group)).fetchone()
+
+    # Didn't find key
+    if not found or found[0] is None:
+        print('Did not find value')
+        return False, None, None
+
+    print('Found value for %d countries (%f)' % (found[1], found[0]))
+
+    return True, tuple(found), None
+
+
+def _get_series(config, key, country, years):
+    """Obtain the values of a given country in a span of years.
+
+    Args:
+        config (ConfigParser): Information about database to use.
+        key (str): Key to search.
+        country (str): Country to search (from parser).
+        years (str): Span of years to obtain (from parser, '2000-2015').
+
+    Returns:
+        Tuple: Boolean, years and values (only the years with a value),
+        Error string
+    """
+    conn = _connect(config)
+
+    if conn is None:
+        return False, None, 'Cant find the database %s' % config.get('path')
+
+    # Get country
+    if not country:
+        return False, None, 'Which country?'
+
+    # Get years
+    try:
+        start, end = indicators.span(years)
+
+    except ValueError:
+        return False, None, 'When do you say?'
+
+    print('Obtaining %s for country %s from %d to %d' % (
+        key, country, start, end))
+
+    sql = (
+        'SELECT year, value FROM wdi'
+        ' WHERE indicator = ? AND country_name = ? AND year BETWEEN ? AND ?'
+        ' ORDER BY year')
+
+    found = conn.execute(sql, (key, country, start, end)).fetchall()
+
+    if found:
+        print('Found %d values for %s' % (len(found), country))
+        return True, (
+            [year for year, _ in found], [value for _, value in found]), None
+
+    # Didn't find key
+    print('Did not find value')
+    return False, None, None
+
+
+def _get_name(config, key):
+    """Obtain the name of an indicator (its code if not found)."""
+    conn = _connect(config)
+
+    if conn is None:
+        return key
+
+    found = conn.execute(
+        'SELECT name FROM indicators WHERE code = ?', (key,)).fetchone()
+
+    return found[0] if found else key
+
+
+def _get_code(config, key):
+    """Obtain the code of an indicator written in any case (None if not
+    found)."""
+    conn = _connect(config)
+
+    if conn is None:
+        return None
+
+    found = conn.execute(
+        'SELECT code FROM indicators WHERE code = ? COLLATE NOCASE'
+        ' ORDER BY code = ? DESC LIMIT 1', (key, key)).fetchone()
+
+    return found[0] if found else None
+
+
+def _get_countries(config):
+    """Obtain the lookup of the countries (None if there is no database)."""
+    conn = _connect(config)
+
+    if conn is None:
+        return None
+
+    database = config.get('path')
+    mtime = os.stat(database).st_mtime_ns
+    cached = _RESOLVERS.get(database)
+
+    if cached and cached[0] == mtime:
+        return cached[1]
+
+    rows = conn.execute(
+        'SELECT DISTINCT country_code, country_name FROM wdi'
+        ' ORDER BY country_code').fetchall()
+
+    resolver = CountryIndex(
+        [name for _, name in rows], [code for code, _ in rows])
+
+    mask = groups.countries(groups.membership(resolver.codes))
+    _RESOLVERS[database] = (mtime, resolver, mask)
+
+    return resolver
+
+
+def _get_mask(config):
+    """Obtain the mask of the countries that are not aggregates, in the
+    order of _get_countries (None if there is no database)."""
+    if _get_countries(config) is None:
+        return None
+
+    return _RESOLVERS[config.get('path')][2]
+
+
+def _get_matrices(config, keys):
+    """Obtain the country x year matrices of several indicators.
+
+    Args:
+        config (ConfigParser): Information about database to use.
+        keys (list[str]): Indicator codes.
+
+    Returns:
+        Tuple: country names, country IDs, first year and the matrices (None
+        for unknown indicators), or None if there is no database.
+    """
+    resolver = _get_countries(config)
+
+    if resolver is None:
+        return None
+
+    conn = _connect(config)
+    found = [
+        conn.execute(
+            'SELECT country_code, year, value FROM wdi WHERE indicator = ?',
+            (key,)).fetchall()
+        for key in keys
+    ]
+    metrics.scanned(sum(len(rows) for rows in found))
+
+    # Years of all the indicators
+    years = [year for rows in found for _, year, _ in rows]
+    first = min(years, default=0)
+    num_years = max(years, default=0) - first + 1
+
+    positions = {code: index for index, code in enumerate(resolver.codes)}
+    result = []
+
+    for rows in found:
+        if not rows:
+            result.append(None)
+            continue
+
+        codes, years, values = zip(*rows)
+        matrix = np.full((len(positions), num_years), np.nan)
+        matrix[[positions[code] for code in codes],
+               np.array(years) - first] = values
+        result.append(matrix)
+
+    return resolver.countries, resolver.codes, first, result
+
+
+# Helpers used by the actions (see wdi.make_action), measured (see metrics.py)
+GETTERS = metrics.instrument({
+    'latest': _get_latest,
+    'year': _get_year,
+    'avg': _get_avg,
+    'max': _get_max,
+    'min': _get_min,
+    'count': _get_count,
+    'range': _get_series,
+    'growth': _get_series,
+    'trend': _get_series,
+    'top': _get_top,
+    'bottom': _get_bottom,
+    'rank': _get_rank,
+    'group': _get_group,
+    'name': _get_name,
+    'code': _get_code,
+    'countries': _get_countries,
+    'mask': _get_mask,
+    'matrices': _get_matrices
+})
+
+
+def main():
+    """Ingest a WDI CSV file into a SQLite database."""
+    parser = argparse.ArgumentParser()
+
+    parser.add_argument('datafile', help='path to WDI_Data.csv')
+    parser.add_argument('database', help='path to the SQLite database')
+
+    args = parser.parse_args()
+
+    ingest(args.datafile, args.database)
+
+if __name__ == '__main__':
+    main()
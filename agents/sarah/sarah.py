@@ -4,16 +4,105 @@
 
 import configparser
 import os
+import signal
+import threading
+import traceback
 import zoe
+from concurrent.futures import ThreadPoolExecutor
 from zoe.deco import Agent, AnyMessage
-from actions.mapper import action_map
+from actions import cache, metrics, watcher, wdi
+from actions.mapper import action_map, conf_loaders
 
 DB_CONF = os.path.join(os.getenv('ZOE_HOME'), 'etc', 'sarah', 'databases.conf')
 
+# Metrics in the Prometheus text format, written on SIGUSR1
+METRICS_FILE = os.path.join(
+    os.getenv('ZOE_HOME'), 'var', 'sarah', 'metrics.prom')
+
+# Seconds to wait for more WDI queries before answering them together
+BATCH_WINDOW = 0.2
+
+# Threads executing actions
+WORKERS = 4
+
+# Actions waiting or running before new ones are rejected
+QUEUE_LIMIT = 32
+
+# Seconds before giving up on an action (unless it sets its own 'timeout')
+ACTION_TIMEOUT = 30
+
+# Replies of the WDI actions kept, and for how many seconds
+CACHE_SIZE = 1024
+CACHE_TTL = 600
+
+
+class _Task(object):
+    """Actions submitted to the workers together, answered only once.
+
+    A single action has one parser. A batch of WDI queries has one per query
+    and its function returns a reply for each of them.
+    """
+
+    def __init__(self, action_names, parsers, cache_keys, generation=None,
+                 batch=False):
+        self.action_names = action_names
+        self.parsers = parsers
+        self.cache_keys = cache_keys
+        self.generation = generation
+        self.batch = batch
+        self.answered = False
+        self.lock = threading.Lock()
+        self.timer = None
+
+    def answer(self):
+        """Mark the task as answered.
+
+        Returns:
+            bool: Whether it was not answered before.
+        """
+        with self.lock:
+            answered, self.answered = self.answered, True
+
+        return not answered
+
 
 @Agent(name='sarah')
 class Sarah:
 
+    def __init__(self):
+        """Load the configuration and datasets once for the whole life of
+        the agent.
+
+        The configuration is reloaded when DB_CONF changes or on SIGHUP,
+        and the datafiles when a new release replaces them (see
+        actions/watcher.py). The metrics are written to METRICS_FILE on
+        SIGUSR1 (see actions/metrics.py).
+        """
+        self._pending = []
+        self._pending_lock = threading.Lock()
+        self._flush_timer = None
+
+        # Datafiles with a batch in the workers
+        self._running = set()
+
+        self._executor = ThreadPoolExecutor(
+            WORKERS, thread_name_prefix='sarah')
+        self._queued = 0
+        self._queued_lock = threading.Lock()
+
+        self._cache = cache.ResultCache(CACHE_SIZE, CACHE_TTL)
+        watcher.subscribe(self._on_data_reload)
+        metrics.collect(self._cache_metrics)
+
+        self._actions = {}
+        self._conf_mtime = None
+        self._conf_lock = threading.Lock()
+        self._reload = False
+        self._load_conf()
+
+        signal.signal(signal.SIGHUP, self._on_sighup)
+        signal.signal(signal.SIGUSR1, self._on_sigusr1)
+
     @AnyMessage()
     def receive(self, parser):
         """Receives all messages and executes actions accordingly.
@@ -28,23 +117,26 @@ class Sarah:
             print('Message without action. Skipping...')
             return
 
-        action = action_map.get(action_name)
+        # Obtain resolved action (function and database config)
+        self._check_conf()
+        action = self._actions.get(action_name)
+
         if not action:
             # No action?
             print('Action %s not found in mapper. Skipping...' % action_name)
             return
 
-        # Obtain database config
-        conf_parser = configparser.ConfigParser()
-        conf_parser.read(DB_CONF)
+        func, conf, timeout = action
 
-        name_conf = action.get('conf')
-        if name_conf and name_conf in conf_parser.sections():
-            conf = conf_parser[name_conf]
+        if conf is None:
+            # No database config
+            print('No config for action %s. Skipping...' % action_name)
+            return self.feedback(
+                'The database for the specified action is not configured',
+                parser
+            )
 
         # Execute the function
-        func = action.get('func')
-
         if not func:
             # No function defined
             print('No function defined %s. Skipping...' % action_name)
@@ -53,10 +145,310 @@ class Sarah:
                 parser
             )
 
+        cache_key = None
+
+        if action_name in wdi.ACTIONS:
+            cache_key = cache.key(action_name, parser)
+            reply = self._cache.get(cache_key)
+
+            if reply is not None:
+                print('Cached reply for %s' % action_name)
+                metrics.record(action_name, status='cached')
+                return self.feedback(reply, parser)
+
+            if not wdi.is_loaded(conf):
+                # Answer together with the queries of the next few moments
+                return self._enqueue(action_name, conf, parser, timeout)
+
+        task = _Task(
+            [action_name], [parser], [cache_key], self._cache.generation)
+
         print('Executing function')
-        result = func(conf, parser)
+        return self._submit(
+            task, timeout, metrics.call, action_name, func, conf, parser)
+
+    def _submit(self, task, timeout, func, *args):
+        """Execute a task in the workers, replying when it finishes.
+
+        Args:
+            task (_Task): Actions to answer.
+            timeout (float): Seconds before replying that it took too long.
+            func (function): Function computing the reply (a list of them
+                for batches), called with the rest of the arguments.
+
+        Returns:
+            MessageBuilder: Reply if a single action was rejected (batches
+            are answered through sendbus).
+        """
+        with self._queued_lock:
+            if self._queued >= QUEUE_LIMIT:
+                print('Queue full. Rejecting %s...' % (
+                    ', '.join(dict.fromkeys(task.action_names))))
+
+                for action_name in task.action_names:
+                    metrics.record(action_name, status='rejected')
+
+                msg = 'I am too busy right now, try again later'
+
+                if not task.batch:
+                    return self.feedback(msg, task.parsers[0])
+
+                return self._send_all(task, msg)
+
+            self._queued += len(task.parsers)
+
+        future = self._executor.submit(func, *args)
+
+        task.timer = threading.Timer(timeout, self._on_timeout, (task, future))
+        task.timer.start()
+
+        future.add_done_callback(lambda f: self._on_done(task, f))
+
+    def _on_done(self, task, future):
+        """Reply with the result of a finished (or cancelled) task."""
+        task.timer.cancel()
+
+        with self._queued_lock:
+            self._queued -= len(task.parsers)
+
+        if future.cancelled() or not task.answer():
+            # Already replied
+            return
+
+        error = future.exception()
+        names = ', '.join(dict.fromkeys(task.action_names))
+
+        if error:
+            print('Error executing %s' % names)
+            traceback.print_exception(type(error), error, error.__traceback__)
+            self._send_all(task, 'Something went wrong with %s' % names)
+            return
+
+        results = future.result() if task.batch else [future.result()]
+
+        for action_name, parser, cache_key, result in zip(
+                task.action_names, task.parsers, task.cache_keys, results):
+            if task.batch and result is None:
+                # Failed in the batch
+                result = 'Something went wrong with %s' % action_name
+
+            elif cache_key is not None:
+                self._cache.put(cache_key, result, task.generation)
+
+            self._send(self.feedback(result, parser))
+
+    def _on_timeout(self, task, future):
+        """Reply that a task took too long (its result is discarded)."""
+        if not task.answer():
+            return
+
+        names = ', '.join(dict.fromkeys(task.action_names))
+        print('Timeout executing %s' % names)
+
+        for action_name in task.action_names:
+            metrics.record(action_name, status='timeout')
+
+        future.cancel()
+
+        self._send_all(task, 'Sorry, %s is taking too long' % names)
+
+    def _send_all(self, task, msg):
+        """Send the same message to every parser of a task."""
+        for parser in task.parsers:
+            self._send(self.feedback(msg, parser))
+
+    def _send(self, msg):
+        """Send a message built with feedback() outside of receive()."""
+        if msg:
+            # sendbus() is provided by the zoe Agent decorator
+            self.sendbus(msg.msg())
+
+    def _load_conf(self):
+        """Parse DB_CONF and resolve the function, config and timeout of
+        every action.
+
+        Each section becomes a dict with its options plus the data handles
+        given by its loader in the mapper (e.g. the loaded WDI store).
+        """
+        print('Loading %s' % DB_CONF)
+        self._conf_mtime = _mtime(DB_CONF)
+
+        conf_parser = configparser.ConfigParser()
+        conf_parser.read(DB_CONF)
+
+        confs = {}
+
+        for name_conf in conf_parser.sections():
+            section = conf_parser[name_conf]
+            conf = dict(section)
+
+            loader = conf_loaders.get(name_conf)
+            if loader:
+                conf.update(loader(section))
+
+            confs[name_conf] = conf
+
+        # Swap at once, so actions never see a partial config
+        self._actions = {
+            action_name: (
+                action.get('func'),
+                confs.get(action['conf']) if 'conf' in action else {},
+                action.get('timeout', ACTION_TIMEOUT))
+            for action_name, action in action_map.items()
+        }
+
+        # Data of the datafiles that are not configured anymore
+        wdi.retain({conf.get('path') for conf in confs.values()})
+
+        # Replies may come from other data now
+        print('Clearing cache: %s' % self._cache.stats())
+        self._cache.clear()
+
+    def _check_conf(self):
+        """Reload the config if DB_CONF changed or SIGHUP was received.
+
+        The config is loaded in the background (new datafiles may take a
+        while to parse), and the actions keep the previous one until then.
+        """
+        if self._reload or _mtime(DB_CONF) != self._conf_mtime:
+            self._reload = False
+
+            # Not again on the next messages
+            self._conf_mtime = _mtime(DB_CONF)
+
+            threading.Thread(
+                target=self._reload_conf, name='conf', daemon=True).start()
+
+    def _reload_conf(self):
+        """Load the config, one reload at a time."""
+        with self._conf_lock:
+            try:
+                self._load_conf()
+
+            except Exception:
+                # Keep the previous config
+                print('Could not reload %s' % DB_CONF)
+                traceback.print_exc()
+
+    def _on_data_reload(self, path):
+        """Forget the replies computed from the previous data."""
+        print('Clearing cache after reloading %s: %s' % (
+            path, self._cache.stats()))
+        self._cache.clear()
+
+    def _on_sighup(self, signum, frame):
+        """Mark the config to be reloaded on the next message."""
+        self._reload = True
 
-        return self.feedback(result, parser)
+    def _on_sigusr1(self, signum, frame):
+        """Write the metrics to METRICS_FILE (in a thread, as the code
+        interrupted by the handler may hold their lock)."""
+        threading.Thread(target=self._write_metrics, daemon=True).start()
+
+    def _write_metrics(self):
+        """Write the metrics to METRICS_FILE."""
+        try:
+            metrics.write(METRICS_FILE)
+            print('Metrics written to %s' % METRICS_FILE)
+
+        except OSError as e:
+            print('Could not write %s: %s' % (METRICS_FILE, e))
+
+    def _cache_metrics(self):
+        """Obtain the metrics of the cache (see metrics.collect)."""
+        stats = self._cache.stats()
+
+        return [
+            ('cache_hits_total', {}, stats['hits']),
+            ('cache_misses_total', {}, stats['misses']),
+            ('cache_evictions_total', {}, stats['evictions']),
+            ('cache_entries', {}, stats['size']),
+            ('cache_hit_ratio', {}, stats['ratio'])
+        ]
+
+    def _enqueue(self, action_name, conf, parser, timeout):
+        """Queue a WDI query to be answered in the next batch.
+
+        Args:
+            action_name (str): Name of the action in the mapper.
+            conf (ConfigParser): Information about datafile to use.
+            parser (MessageParser): Parsed Zoe message.
+            timeout (float): Seconds before replying that it took too long.
+        """
+        with self._pending_lock:
+            self._pending.append((action_name, conf, parser, timeout))
+
+            if self._flush_timer is None:
+                # First query of the batch
+                self._flush_timer = threading.Timer(BATCH_WINDOW, self._flush)
+                self._flush_timer.start()
+
+    def _flush(self):
+        """Answer the queued WDI queries in the workers, in a single pass
+        per datafile.
+
+        Only one batch of a datafile is in the workers at a time: the
+        queries of a datafile with a running batch stay queued, and are
+        answered together when it finishes (see _batch).
+        """
+        by_datafile = {}
+
+        with self._pending_lock:
+            self._flush_timer = None
+            waiting = []
+
+            for item in self._pending:
+                datafile = item[1].get('path')
+
+                if datafile in self._running:
+                    waiting.append(item)
+
+                else:
+                    by_datafile.setdefault(datafile, []).append(item)
+
+            self._pending = waiting
+            self._running.update(by_datafile)
+
+        for datafile, items in by_datafile.items():
+            queries = [
+                (action_name, parser.get('country'), parser.get('year'),
+                 parser.get('code'), parser.get('num'))
+                for action_name, _, parser, _ in items
+            ]
+
+            task = _Task(
+                [action_name for action_name, _, _, _ in items],
+                [parser for _, _, parser, _ in items],
+                [cache.key(action_name, parser)
+                 for action_name, _, parser, _ in items],
+                self._cache.generation, batch=True)
+
+            print('Executing %d queries in batch' % len(queries))
+            self._submit(
+                task, max(timeout for _, _, _, timeout in items),
+                self._batch, datafile, items[0][1], queries)
+
+            if task.timer is None:
+                # Rejected, the next batch of the datafile can run
+                self._batch_done(datafile)
+
+    def _batch(self, datafile, conf, queries):
+        """Answer a batch of WDI queries (see wdi.batch), and then the ones
+        of the same datafile queued meanwhile."""
+        try:
+            return wdi.batch(conf, queries)
+
+        finally:
+            self._batch_done(datafile)
+
+    def _batch_done(self, datafile):
+        """Flush the queries that waited for the batch of a datafile."""
+        with self._pending_lock:
+            self._running.discard(datafile)
+            waiting = bool(self._pending)
+
+        if waiting:
+            self._flush()
 
     def feedback(self, msg, parser):
         """Send back a message to an user.
@@ -79,3 +471,12 @@ class Sarah:
         }
 
         return zoe.MessageBuilder(to_send)
+
+
+def _mtime(path):
+    """Obtain the modification time of a file (None if missing)."""
+    try:
+        return os.stat(path).st_mtime_ns
+
+    except OSError:
+        return None
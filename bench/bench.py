@@ -0,0 +1,553 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""Benchmark of the WDI actions and the command dispatch.
+
+Every entry of the action_map is called with random countries and years on
+each backend, and the commands are dispatched with cmdproc/sarah.py:run.
+Each backend runs in its own process, whose peak RSS (VmHWM, reset by exec)
+is its own:
+
+    scan      Offsets of the lines, values read from the CSV (engine=stream)
+    memory    WdiStore parsed from the CSV
+    snapshot  WdiStore memory-mapped from its snapshot
+    sqlite    SQLite database (engine=sql)
+
+The results (latency percentiles and throughput of every action, load time
+and peak RSS of every backend) are printed and saved as JSON, to compare
+them across releases:
+
+    python3 bench/bench.py run --indicators 500 --countries 250
+    python3 bench/bench.py run --datafile /path/to/WDI_Data.csv
+    python3 bench/bench.py compare bench/results/old.json \
+        bench/results/new.json
+"""
+
+import argparse
+import contextlib
+import datetime
+import importlib.util
+import json
+import os
+import platform
+import random
+import re
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, 'agents', 'sarah'))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+# cmdproc/sarah.py reads it on import
+os.environ.setdefault('ZOE_HOME', ROOT)
+
+from actions import groups, indicators, wdi, wdi_sql
+from actions.mapper import action_map
+from actions.store import SNAPSHOT_SUFFIX, WdiStore
+from actions.stream import OffsetStore
+
+import generate
+
+BACKENDS = ('scan', 'memory', 'snapshot', 'sqlite')
+
+# Calls of every action (after one warm-up call)
+REPEAT = 20
+
+# Percentiles of the latencies
+PERCENTILES = (50, 90, 99)
+
+RESULTS_DIR = os.path.join(ROOT, 'bench', 'results')
+
+# Commands dispatched (with random values), as users write them
+COMMANDS = [
+    '{name} {country}',
+    '{name} {country} {year}',
+    'average {name} {year}',
+    'max {name} {year}',
+    'min {name} {year}',
+    'count {name} {year}',
+    '{name} {country} {span}',
+    'growth {name} {country} {span}',
+    'trend {name} {country} {span}',
+    'top 5 {name} {year}',
+    'bottom {name} {year}',
+    'rank {name} {country} {year}',
+    'average {name} in {group} {year}',
+    'wdi {code} {country} {year}',
+    'correlation {name} pibpc {year}',
+    'countries with unemp > 20 and pibpc > 10000 in {year}',
+    'sarah what time is it'
+]
+
+
+def _rss():
+    """Obtain the peak resident memory of the process (MiB)."""
+    try:
+        # Unlike ru_maxrss, not inherited from the parent through exec
+        with open('/proc/self/status') as f:
+            found = re.search(r'^VmHWM:\s*(\d+) kB', f.read(), re.M)
+
+        if found:
+            return int(found.group(1)) / 1024
+
+    except OSError:
+        pass
+
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    # Bytes in macOS, KiB elsewhere
+    return peak / (1024 * 1024 if sys.platform == 'darwin' else 1024)
+
+
+def _stats(times):
+    """Summarize the latencies of some calls.
+
+    Args:
+        times (list[float]): Seconds of every call.
+
+    Returns:
+        dict: Count, mean, percentiles and max (ms) and calls per second.
+    """
+    times = np.array(times) * 1000
+    result = {'count': len(times), 'mean_ms': float(times.mean())}
+
+    for percentile in PERCENTILES:
+        result['p%d_ms' % percentile] = float(
+            np.percentile(times, percentile))
+
+    result['max_ms'] = float(times.max())
+    result['ops_per_s'] = float(len(times) / times.sum() * 1000)
+
+    return result
+
+
+def _kinds():
+    """Obtain the kind of query of every action (queries by their name)."""
+    kinds = {}
+
+    for name in list(indicators.INDICATORS) + [indicators.GENERIC]:
+        for kind in indicators.KINDS:
+            kinds[indicators.action_name(name, kind)] = kind
+
+    return kinds
+
+
+def _config(backend, datafile, database, snapshot):
+    """Load the data of a backend.
+
+    Returns:
+        dict: Config of the actions.
+    """
+    if backend == 'scan':
+        return {
+            'path': datafile, 'engine': 'stream',
+            'store': OffsetStore.from_csv(datafile)}
+
+    if backend == 'memory':
+        return {'path': datafile, 'store': WdiStore.from_csv(datafile)}
+
+    if backend == 'snapshot':
+        return {
+            'path': datafile,
+            'store': WdiStore.from_snapshot(snapshot)}
+
+    config = {'path': database, 'engine': 'sql'}
+    config.update(wdi_sql.prepare(config))
+
+    return config
+
+
+def _plan(config, repeat, rand):
+    """Obtain the messages to send to every action.
+
+    Args:
+        config (dict): Config of the actions.
+        repeat (int): Messages per action.
+        rand (random.Random): Source of the random values.
+
+    Returns:
+        list[tuple]: Action name and its messages (dicts as the parser).
+    """
+    codes = [entry['code'] for entry in indicators.INDICATORS.values()]
+    countries, country_codes, first_year, (population,) = wdi.matrices(
+        config, [groups.POPULATION])
+    countries = [
+        country for country, code in zip(countries, country_codes)
+        if code not in groups.GROUPS
+    ]
+    years = range(first_year, first_year + population.shape[1])
+    group_names = [group['name'] for group in groups.definitions().values()]
+    kinds = _kinds()
+    plan = []
+
+    for name in sorted(action_map):
+        kind = kinds.get(name)
+        messages = []
+
+        for _ in range(repeat):
+            start, end = sorted(rand.sample(years, 2))
+            messages.append({
+                'country': rand.choice(
+                    group_names if kind == 'group' else countries),
+                'year': (
+                    '%d-%d' % (start, end)
+                    if kind in indicators.SERIES_KINDS else str(end)),
+                'code': rand.choice(codes),
+                'num': str(rand.randint(1, indicators.TOP_NUM)),
+                'x': 'gini',
+                'y': 'pibpc',
+                'where': 'unemp > 20 and pibpc > %d' % rand.randint(1, 50000)
+            })
+
+        plan.append((name, messages))
+
+    return plan
+
+
+def run_backend(backend, datafile, database, snapshot, repeat=REPEAT,
+                seed=0):
+    """Benchmark the actions on a backend (in the current process).
+
+    Returns:
+        dict: Load time, peak RSS (before and after loading) and the stats of
+        every action and of all of them.
+    """
+    rand = random.Random(seed)
+    rss_start = _rss()
+
+    with open(os.devnull, 'w') as null, contextlib.redirect_stdout(null):
+        start = time.perf_counter()
+        config = _config(backend, datafile, database, snapshot)
+        load = time.perf_counter() - start
+        rss_loaded = _rss()
+
+        plan = _plan(config, repeat, rand)
+        actions = {}
+        every = []
+
+        for name, messages in plan:
+            func = action_map[name]['func']
+
+            # Warm-up (lazy lookups)
+            func(config, messages[0])
+
+            times = []
+
+            for message in messages:
+                start = time.perf_counter()
+                func(config, message)
+                times.append(time.perf_counter() - start)
+
+            actions[name] = _stats(times)
+            every.extend(times)
+
+    return {
+        'load_s': load,
+        'rss_start_mb': rss_start,
+        'rss_loaded_mb': rss_loaded,
+        'rss_peak_mb': _rss(),
+        'total': _stats(every),
+        'actions': actions
+    }
+
+
+def _cmdproc():
+    """Import cmdproc/sarah.py (it has the same name as the agent)."""
+    spec = importlib.util.spec_from_file_location(
+        'cmdproc_sarah', os.path.join(ROOT, 'cmdproc', 'sarah.py'))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+
+    return module
+
+
+def run_dispatch(repeat=REPEAT, seed=0):
+    """Benchmark the dispatch of the COMMANDS with cmdproc/sarah.py:run.
+
+    Returns:
+        dict: Stats of every command and of all of them.
+    """
+    rand = random.Random(seed)
+    cmdproc = _cmdproc()
+    group_names = [group['name'] for group in groups.definitions().values()]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        table = cmdproc.CommandTable(
+            os.path.join(ROOT, 'etc', 'sarah', 'commands.json'),
+            os.path.join(tmp, 'commands.cache'))
+        commands = {}
+        every = []
+
+        with open(os.devnull, 'w') as null, contextlib.redirect_stdout(null):
+            for command in COMMANDS:
+                times = []
+
+                for index in range(repeat + 1):
+                    year = rand.randint(1960, 2016)
+                    args = argparse.Namespace(
+                        original=command.format(
+                            name=rand.choice(list(indicators.INDICATORS)),
+                            country=rand.choice(
+                                ['spain', 'united states', 'korea rep']),
+                            year=year, span='%d-%d' % (year - 10, year),
+                            group=rand.choice(group_names).lower(),
+                            code=rand.choice(
+                                ['SP.POP.TOTL', 'NY.GDP.MKTP.CD'])),
+                        sender='bench', src='bench')
+
+                    start = time.perf_counter()
+                    cmdproc.run(args, table)
+                    elapsed = time.perf_counter() - start
+
+                    if index:
+                        # The first one compiles the table
+                        times.append(elapsed)
+
+                commands[command] = _stats(times)
+                every.extend(times)
+
+    return {
+        'rss_peak_mb': _rss(),
+        'total': _stats(every),
+        'commands': commands
+    }
+
+
+def _prepare(backends, datafile, database, snapshot):
+    """Build the snapshot and the database used by the backends."""
+    if 'snapshot' in backends:
+        print('Building snapshot of %s' % datafile)
+        WdiStore.cached(datafile, snapshot, workers=os.cpu_count())
+
+    if 'sqlite' in backends:
+        print('Ingesting %s into %s' % (datafile, database))
+
+        with open(os.devnull, 'w') as null, contextlib.redirect_stdout(null):
+            wdi_sql.ingest(datafile, database)
+
+
+def _worker(target, args, output):
+    """Run a benchmark in a new process.
+
+    Returns:
+        dict: Its results, or None if it failed.
+    """
+    cmd = [
+        sys.executable, os.path.abspath(__file__), 'worker', target,
+        '--datafile', args.datafile, '--database', args.database,
+        '--snapshot', args.snapshot,
+        '--repeat', str(args.repeat), '--seed', str(args.seed),
+        '--output', output
+    ]
+
+    print('Running %s' % target)
+
+    if subprocess.call(cmd) != 0:
+        print('Benchmark of %s failed' % target)
+        return None
+
+    with open(output) as f:
+        return json.load(f)
+
+
+def _git_commit():
+    """Obtain the commit of the tree (None if unknown)."""
+    try:
+        return subprocess.check_output(
+            ['git', '-C', ROOT, 'rev-parse', 'HEAD'],
+            stderr=subprocess.DEVNULL).decode().strip()
+
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _print(results):
+    """Print the summary of some results."""
+    for backend, result in results['backends'].items():
+        total = result['total']
+
+        print('%-9s load %8.3f s  peak %8.1f MiB  p50 %8.3f ms  p99 %8.3f '
+              'ms  %10.1f ops/s' % (
+                  backend, result['load_s'], result['rss_peak_mb'],
+                  total['p50_ms'], total['p99_ms'], total['ops_per_s']))
+
+    dispatch = results.get('dispatch')
+
+    if dispatch:
+        total = dispatch['total']
+
+        print('%-9s %37s  p50 %8.3f ms  p99 %8.3f ms  %10.1f ops/s' % (
+            'dispatch', '', total['p50_ms'], total['p99_ms'],
+            total['ops_per_s']))
+
+
+def run(args):
+    """Generate the data if needed, run every benchmark and save the
+    results."""
+    workdir = args.workdir or tempfile.mkdtemp(prefix='wdi-bench-')
+    os.makedirs(workdir, exist_ok=True)
+
+    if not args.datafile:
+        args.datafile = generate.generate(
+            workdir, args.indicators, args.countries, args.years,
+            seed=args.seed)
+
+    args.database = args.database or os.path.join(workdir, 'world.sqlite')
+
+    # In the workdir, not next to a datafile of the user
+    args.snapshot = os.path.join(
+        workdir, os.path.basename(args.datafile) + SNAPSHOT_SUFFIX)
+    backends = [b for b in BACKENDS if b in args.backends.split(',')]
+
+    _prepare(backends, args.datafile, args.database, args.snapshot)
+
+    results = {
+        'meta': {
+            'date': datetime.datetime.now().isoformat(timespec='seconds'),
+            'commit': _git_commit(),
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'platform': platform.platform(),
+            'datafile': args.datafile,
+            'size': os.path.getsize(args.datafile),
+            'indicators': args.indicators,
+            'countries': args.countries,
+            'years': args.years,
+            'repeat': args.repeat,
+            'seed': args.seed
+        },
+        'backends': {}
+    }
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for backend in backends:
+            found = _worker(backend, args, os.path.join(tmp, backend))
+
+            if found:
+                results['backends'][backend] = found
+
+        if not args.no_dispatch:
+            results['dispatch'] = _worker(
+                'dispatch', args, os.path.join(tmp, 'dispatch'))
+
+    output = args.output or os.path.join(
+        RESULTS_DIR, 'bench-%s.json' % time.strftime('%Y%m%d-%H%M%S'))
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+
+    with open(output, 'w') as f:
+        json.dump(results, f, indent=2)
+
+    _print(results)
+    print('Saved %s' % output)
+
+
+def worker(args):
+    """Run one benchmark and write its results."""
+    if args.target == 'dispatch':
+        result = run_dispatch(args.repeat, args.seed)
+
+    else:
+        result = run_backend(
+            args.target, args.datafile, args.database, args.snapshot,
+            args.repeat, args.seed)
+
+    with open(args.output, 'w') as f:
+        json.dump(result, f)
+
+
+def compare(args):
+    """Print the change of the p50 latencies between two results."""
+    with open(args.old) as f:
+        old = json.load(f)
+
+    with open(args.new) as f:
+        new = json.load(f)
+
+    print('%-9s %-24s %10s %10s %8s' % (
+        'backend', 'action', 'old p50', 'new p50', 'ratio'))
+
+    for backend, result in new['backends'].items():
+        before = old['backends'].get(backend)
+
+        if not before:
+            continue
+
+        rows = [('load', before['load_s'] * 1000, result['load_s'] * 1000)]
+        rows += [
+            (name, before['actions'][name]['p50_ms'], stats['p50_ms'])
+            for name, stats in sorted(result['actions'].items())
+            if name in before['actions']
+        ]
+
+        for name, a, b in rows:
+            ratio = b / a if a else float('inf')
+
+            if abs(ratio - 1) < args.threshold:
+                continue
+
+            print('%-9s %-24s %10.3f %10.3f %8.2f' % (
+                backend, name, a, b, ratio))
+
+
+def main():
+    """Parse the arguments and run the command."""
+    parser = argparse.ArgumentParser()
+    commands = parser.add_subparsers(dest='command')
+
+    run_parser = commands.add_parser('run', help='run the benchmarks')
+    run_parser.add_argument('--datafile', help='WDI_Data.csv to use instead '
+                            'of generating one')
+    run_parser.add_argument('--database', help='SQLite database to create')
+    run_parser.add_argument('--workdir', help='where to generate the data')
+    run_parser.add_argument(
+        '--indicators', type=int, default=generate.INDICATORS)
+    run_parser.add_argument(
+        '--countries', type=int, default=generate.COUNTRIES)
+    run_parser.add_argument('--years', type=int, default=generate.YEARS)
+    run_parser.add_argument(
+        '--backends', default=','.join(BACKENDS),
+        help='comma-separated list of %s' % ', '.join(BACKENDS))
+    run_parser.add_argument('--no-dispatch', action='store_true')
+    run_parser.add_argument('--repeat', type=int, default=REPEAT)
+    run_parser.add_argument('--seed', type=int, default=0)
+    run_parser.add_argument('--output', help='JSON file of the results')
+
+    worker_parser = commands.add_parser('worker')
+    worker_parser.add_argument('target', choices=BACKENDS + ('dispatch',))
+    worker_parser.add_argument('--datafile')
+    worker_parser.add_argument('--database')
+    worker_parser.add_argument('--snapshot')
+    worker_parser.add_argument('--repeat', type=int, default=REPEAT)
+    worker_parser.add_argument('--seed', type=int, default=0)
+    worker_parser.add_argument('--output', required=True)
+
+    compare_parser = commands.add_parser(
+        'compare', help='compare two JSON results')
+    compare_parser.add_argument('old')
+    compare_parser.add_argument('new')
+    compare_parser.add_argument(
+        '--threshold', type=float, default=0,
+        help='only show changes above this ratio (e.g. 0.1)')
+
+    args = parser.parse_args()
+
+    if args.command == 'worker':
+        worker(args)
+
+    elif args.command == 'compare':
+        compare(args)
+
+    elif args.command == 'run':
+        run(args)
+
+    else:
+        parser.print_help()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,191 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""Generate a synthetic WDI download to benchmark the actions.
+
+The data has the shape of the World Bank files: WDI_Data.csv (one line per
+indicator and country, one column per year) and WDI_Country.csv (region and
+income group of every country). It includes the indicators of the registry,
+the population (used by the group aggregates) and as many filler indicators
+as needed, and some aggregate rows (World, regions...) among the countries.
+
+    python3 bench/generate.py /tmp/bench --indicators 500 --countries 250 \
+        --years 60
+"""
+
+import argparse
+import csv
+import itertools
+import os
+import random
+import string
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, 'agents', 'sarah'))
+
+from actions import groups, indicators
+
+# Defaults of the generated data
+INDICATORS = 200
+COUNTRIES = 200
+YEARS = 57
+FIRST_YEAR = 1960
+
+# Share of empty cells
+MISSING = 0.4
+
+# Aggregate rows included (the regions and income groups of the metadata)
+AGGREGATES = ['WLD', 'LCN', 'ECS', 'EAS', 'SSF', 'HIC', 'LIC', 'EUU']
+
+REGIONS = ['EAS', 'ECS', 'LCN', 'MEA', 'NAC', 'SAS', 'SSF']
+INCOMES = ['HIC', 'UMC', 'LMC', 'LIC']
+
+SYLLABLES = [
+    'ka', 'lo', 'ra', 'mi', 'su', 'te', 'no', 'va', 'ri', 'da', 'pe', 'zu',
+    'bo', 'an', 'el', 'is', 'or', 'us'
+]
+
+
+def _countries(num, rand):
+    """Obtain the (name, code) of some fictional countries.
+
+    Names have no digits, as the commands expect.
+    """
+    skip = set(groups.GROUPS)
+    codes = (
+        ''.join(letters)
+        for letters in itertools.product(string.ascii_uppercase, repeat=3))
+    names = set()
+    result = []
+
+    for code in codes:
+        if len(result) == num:
+            break
+
+        if code in skip:
+            continue
+
+        name = ''.join(rand.choice(SYLLABLES) for _ in range(3)).title()
+
+        while name in names:
+            name += rand.choice(SYLLABLES)
+
+        names.add(name)
+        result.append((name, code))
+
+    return result
+
+
+def _indicators(num):
+    """Obtain the (name, code) of the indicators: the registry ones, the
+    population and filler ones up to num."""
+    result = [
+        (entry['name'], entry['code'])
+        for entry in indicators.INDICATORS.values()
+    ]
+    result.append(('Population, total', groups.POPULATION))
+
+    for index in range(max(0, num - len(result))):
+        result.append(
+            ('Synthetic indicator %d' % index, 'BN.SYN.%04d' % index))
+
+    return result
+
+
+def _value(code, rand):
+    """Obtain a plausible value of an indicator."""
+    if code == groups.POPULATION:
+        return rand.uniform(1e5, 1e9)
+
+    if code == 'NY.GDP.MKTP.CD':
+        return rand.uniform(1e8, 1e13)
+
+    if code == 'NY.GDP.PCAP.CD':
+        return rand.uniform(200, 90000)
+
+    return rand.uniform(0, 100)
+
+
+def generate(directory, num_indicators=INDICATORS, num_countries=COUNTRIES,
+             num_years=YEARS, missing=MISSING, seed=0):
+    """Write WDI_Data.csv and WDI_Country.csv in a directory.
+
+    Args:
+        directory (str): Where to write the files.
+        num_indicators (int): Number of indicators (at least the registry
+            ones and the population).
+        num_countries (int): Number of countries, aggregates not included.
+        num_years (int): Number of year columns.
+        missing (float): Share of empty cells.
+        seed (int): Seed of the values.
+
+    Returns:
+        str: Path to WDI_Data.csv.
+    """
+    rand = random.Random(seed)
+    definitions = groups.definitions()
+
+    countries = _countries(num_countries, rand)
+    aggregates = [
+        (definitions[code]['name'], code)
+        for code in AGGREGATES if code in definitions
+    ]
+    years = [str(FIRST_YEAR + i) for i in range(num_years)]
+
+    os.makedirs(directory, exist_ok=True)
+    datafile = os.path.join(directory, 'WDI_Data.csv')
+
+    with open(datafile, 'w', encoding='mac_roman', newline='') as f:
+        writer = csv.writer(f, quoting=csv.QUOTE_ALL)
+        writer.writerow([
+            'Country Name', 'Country Code', 'Indicator Name', 'Indicator Code'
+        ] + years + [''])
+
+        # Aggregates first, as in the World Bank file
+        for country, country_code in aggregates + countries:
+            for name, code in _indicators(num_indicators):
+                writer.writerow([country, country_code, name, code] + [
+                    '' if rand.random() < missing else
+                    '%.6g' % _value(code, rand)
+                    for _ in years
+                ] + [''])
+
+    with open(groups.metadata_path(datafile), 'w', encoding='mac_roman',
+              newline='') as f:
+        writer = csv.writer(f, quoting=csv.QUOTE_ALL)
+        writer.writerow(
+            ['Country Code', 'Short Name', 'Region', 'Income Group'])
+
+        for name, code in aggregates:
+            writer.writerow([code, name, '', ''])
+
+        for name, code in countries:
+            writer.writerow([
+                code, name, definitions[rand.choice(REGIONS)]['name'],
+                definitions[rand.choice(INCOMES)]['name']])
+
+    print('Generated %s (%d bytes)' % (datafile, os.path.getsize(datafile)))
+
+    return datafile
+
+
+def main():
+    """Generate the synthetic files."""
+    parser = argparse.ArgumentParser()
+
+    parser.add_argument('directory', help='where to write the files')
+    parser.add_argument('--indicators', type=int, default=INDICATORS)
+    parser.add_argument('--countries', type=int, default=COUNTRIES)
+    parser.add_argument('--years', type=int, default=YEARS)
+    parser.add_argument('--missing', type=float, default=MISSING)
+    parser.add_argument('--seed', type=int, default=0)
+
+    args = parser.parse_args()
+
+    generate(
+        args.directory, args.indicators, args.countries, args.years,
+        args.missing, args.seed)
+
+if __name__ == '__main__':
+    main()
@@ -18,49 +18,75 @@
 # Note that replacing $0, $1, etc., occur in the same order they appear in.
 #
 # The "\" symbol needs to be escaped (add another \ symbol before it)
+#
+# Patterns should start with ^ (and not have a | outside of a group): then
+# they are all matched with a single regular expression. If one does not,
+# they are tried one by one, and the first one in the file that matches
+# anywhere in the text wins.
 
 import argparse
+import hashlib
 import json
 import os
 import re
+import socket
+import socketserver
+import sys
 
 BASE_CMD = '^sarah (.+)$'
 CMD_FILE = os.path.join(os.getenv('ZOE_HOME'), 'etc', 'sarah', 'commands.json')
 # CMD_FILE = './commands.json'
 
+# Socket of the resident command processor (see --daemon)
+SOCKET_FILE = os.path.join(
+    os.getenv('ZOE_HOME'), 'var', 'sarah', 'cmdproc.sock')
 
-def get():
-    """Return list of commands available."""
-    print('sarah help')
-    print('/%s/' % BASE_CMD, end='')
+# Combined regular expression of the commands, keyed on the file hash
+CACHE_FILE = os.path.join(
+    os.getenv('ZOE_HOME'), 'var', 'sarah', 'commands.cache')
 
-def run(args):
-    """Execute an action based on the arguments parsed."""
-    if not os.path.isfile(CMD_FILE):
-        # File does not exist
-        return
 
-    original = args.original.replace('sarah ', '')
+def anchored(commands):
+    """Check if all the patterns are anchored at the start of the text."""
+    return all(key.startswith('^') for key in commands)
+
+
+def combine(commands):
+    """Build a single regular expression that matches any of the commands.
+
+    Every pattern becomes an alternative wrapped in a named group (c0, c1,
+    ...), so the name of the group that matched tells the command, and its
+    own groups follow the wrapper group. Alternatives are tried in the order
+    of the file, so the first matching command wins as before, but only if
+    all of them are anchored at the start: otherwise the one matching
+    earliest in the text would win.
 
-    # Parse the commands
-    with open(CMD_FILE) as f:
-        commands = json.load(f)
+    Args:
+        commands (dict): Patterns and their commands.
 
-    for key in commands:
-        # match = re.findall(key, args.original)
-        match = re.findall(key, original)
+    Returns:
+        dict: pattern (str) and entries (list of [command, first group,
+        number of groups]), or None if a pattern does not start with ^.
+    """
+    if not anchored(commands):
+        return None
+
+    alternatives = []
+    entries = []
+    group = 1
 
-        # Found matching command
-        if match:
-            cmd = commands.get(key)
-            break
+    for index, (key, cmd) in enumerate(commands.items()):
+        alternatives.append('(?P<c%d>%s)' % (index, key))
+        groups = re.compile(key).groups
 
-    if not match or not cmd:
-        return
+        entries.append([cmd, group + 1, groups])
+        group += groups + 1
 
-    # Get command args (single group)
-    cmd_args = match[0]
+    return {'pattern': '|'.join(alternatives), 'entries': entries}
 
+
+def _expand(cmd, cmd_args):
+    """Replace the $0, $1, ... tags of a command."""
     # Replace args in the command
     if type(cmd_args) is tuple:
         # Tuple
@@ -71,17 +97,299 @@ def run(args):
         # Single string
         cmd = cmd.replace('$0', cmd_args)
 
-    # Append additional info to the message
-    special = 'dst=sarah&sender=%s&src=%s' % (args.sender, args.src)
-    cmd = 'message %s&%s' % (special, cmd)
+    return cmd
+
+
+class CommandTable(object):
+    """Compiled commands.json, reloaded when the file changes.
+
+    All the patterns are compiled into one regular expression (see combine()),
+    which is cached in CACHE_FILE. If the patterns can't be combined (e.g. they
+    reuse group names, or are not anchored), they are tried one by one.
+
+    The compiled table is a single (regex, entries, commands) tuple replaced
+    at once, so threads finding commands never see half of a new table.
+    """
+
+    def __init__(self, path=CMD_FILE, cache=CACHE_FILE):
+        self.path = path
+        self.cache = cache
+        self.mtime = None
+        self.compiled = (None, [], [])
+
+    def refresh(self):
+        """Compile the commands again if the file changed.
+
+        Returns:
+            bool: Whether the file exists.
+        """
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+
+        except OSError:
+            # File does not exist
+            self.mtime = None
+            self.compiled = (None, [], [])
+            return False
+
+        if mtime != self.mtime:
+            self._compile()
+            self.mtime = mtime
+
+        return True
+
+    def _compile(self):
+        """Compile the commands, using the cached combination if valid."""
+        with open(self.path, 'rb') as f:
+            data = f.read()
+
+        digest = hashlib.sha1(data).hexdigest()
+        commands = json.loads(data.decode('utf-8'))
+
+        try:
+            with open(self.cache) as f:
+                combined = json.load(f)
+
+            if combined.get('sha1') != digest or not anchored(commands):
+                combined = None
+
+        except (OSError, ValueError):
+            combined = None
+
+        try:
+            if not combined:
+                combined = combine(commands)
+
+                if combined:
+                    combined['sha1'] = digest
+                    self._save(combined)
+
+            if combined:
+                compiled = (
+                    re.compile(combined['pattern']), combined['entries'], [])
+
+        except re.error:
+            combined = None
+
+        if not combined:
+            # Try them one by one
+            compiled = None, [], [
+                (re.compile(key), cmd) for key, cmd in commands.items()
+            ]
+
+        self.compiled = compiled
+
+    def _save(self, combined):
+        """Write the combined expression to the cache (errors are ignored)."""
+        tmp = '%s.%d.tmp' % (self.cache, os.getpid())
+
+        try:
+            os.makedirs(os.path.dirname(self.cache), exist_ok=True)
+
+            with open(tmp, 'w') as f:
+                json.dump(combined, f)
+
+            os.replace(tmp, self.cache)
+
+        except OSError:
+            pass
+
+    def find(self, original):
+        """Find the command for a text.
+
+        Returns:
+            Tuple: command and its args (as returned by re.findall), or
+            (None, None) if no command matches.
+        """
+        combined, entries, commands = self.compiled
+
+        if combined is None:
+            for regex, cmd in commands:
+                match = regex.findall(original)
+
+                # Found matching command
+                if match:
+                    return cmd, match[0]
+
+            return None, None
+
+        match = combined.search(original)
+
+        if not match:
+            return None, None
+
+        cmd, first, num = entries[int(match.lastgroup[1:])]
+
+        if not num:
+            return cmd, match.group(first - 1)
+
+        # Same as re.findall: str for one group, tuple for more
+        cmd_args = tuple(
+            value or '' for value in match.groups()[first - 1:first - 1 + num])
+
+        return cmd, cmd_args[0] if num == 1 else cmd_args
+
+    def dispatch(self, original, sender, src):
+        """Obtain the message for a command.
+
+        Args:
+            original (str): Original command.
+            sender (str): Unique ID of the sender.
+            src (str): Where the message came from.
+
+        Returns:
+            str: Message to send, or None if no command matches.
+        """
+        if not self.refresh():
+            return None
+
+        original = original.replace('sarah ', '')
+
+        cmd, cmd_args = self.find(original)
 
-    # Send message
-    print(cmd)
+        if not cmd:
+            return None
+
+        cmd = _expand(cmd, cmd_args)
+
+        # Append additional info to the message
+        special = 'dst=sarah&sender=%s&src=%s' % (sender, src)
+        return 'message %s&%s' % (special, cmd)
+
+
+def get_output():
+    """Return list of commands available."""
+    return 'sarah help\n/%s/' % BASE_CMD
+
+
+def get():
+    """Print list of commands available."""
+    print(get_output(), end='')
+
+def run(args, table=None):
+    """Execute an action based on the arguments parsed."""
+    table = table or CommandTable()
+    cmd = table.dispatch(args.original, args.sender, args.src)
+
+    if cmd:
+        # Send message
+        print(cmd)
 
 
     # Help command
     # if args.original == 'sarah help':
 
+def handle(table, request):
+    """Answer a request of the line protocol.
+
+    Requests and answers are JSON objects in a single line:
+
+        {"get": true}
+        {"run": true, "original": "...", "sender": "...", "src": "..."}
+
+        {"output": "..."}
+
+    Args:
+        table (CommandTable): Compiled commands.
+        request (str): Request line.
+
+    Returns:
+        str: Answer line.
+    """
+    try:
+        request = json.loads(request)
+
+    except ValueError:
+        request = {}
+
+    output = ''
+
+    if request.get('get'):
+        output = get_output()
+
+    elif request.get('run') and request.get('original'):
+        cmd = table.dispatch(
+            request['original'], request.get('sender'), request.get('src'))
+
+        if cmd:
+            output = cmd + '\n'
+
+    return json.dumps({'output': output}) + '\n'
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    """Answers the requests of one client connection."""
+
+    def handle(self):
+        for line in self.rfile:
+            reply = handle(self.server.table, line.decode('utf-8'))
+            self.wfile.write(reply.encode('utf-8'))
+
+
+class _Server(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+def serve(path=SOCKET_FILE):
+    """Keep the command table in memory and serve requests in a socket."""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    if os.path.exists(path):
+        os.remove(path)
+
+    server = _Server(path, _Handler)
+    server.table = CommandTable()
+    server.table.refresh()
+
+    print('Listening on %s' % path)
+
+    try:
+        server.serve_forever()
+
+    finally:
+        server.server_close()
+        os.remove(path)
+
+def serve_stdin():
+    """Keep the command table in memory and serve requests in stdin."""
+    table = CommandTable()
+
+    for line in sys.stdin:
+        sys.stdout.write(handle(table, line))
+        sys.stdout.flush()
+
+def request(args, path=SOCKET_FILE):
+    """Send the request to the resident command processor, if running.
+
+    Returns:
+        bool: Whether the request was answered.
+    """
+    if args.get:
+        req = {'get': True}
+
+    else:
+        req = {
+            'run': True,
+            'original': args.original,
+            'sender': args.sender,
+            'src': args.src
+        }
+
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.connect(path)
+            sock.sendall((json.dumps(req) + '\n').encode('utf-8'))
+
+            with sock.makefile('rb') as f:
+                answer = json.loads(f.readline().decode('utf-8'))
+
+    except (OSError, ValueError):
+        # Not running
+        return False
+
+    print(answer.get('output', ''), end='')
+    return True
+
 def main():
     """Main function that manages the parsing of arguments.
 
@@ -90,6 +398,10 @@ def main():
         original: original parsed command
         msg-sender-uniqueid: unique ID of the sender
         msg-src: where the message came from
+        daemon: keep running and answer requests in SOCKET_FILE
+        stdin: keep running and answer requests in stdin
+
+    When the daemon is running, get and run are answered by it.
     """
     parser = argparse.ArgumentParser()
 
@@ -98,15 +410,28 @@ def main():
     parser.add_argument('--original', action='store')
     parser.add_argument("--msg-sender-uniqueid", action='store', dest='sender')
     parser.add_argument("--msg-src", action='store', dest='src')
+    parser.add_argument('--daemon', action='store_true')
+    parser.add_argument('--stdin', action='store_true')
 
     args, unknown = parser.parse_known_args()
 
+    if args.daemon:
+        serve()
+
+    elif args.stdin:
+        serve_stdin()
+
     # Get list of commands
-    if args.get:
-        get()
+    elif args.get:
+        if not request(args):
+            get()
 
     elif args.run:
-        run(args)
+        if not args.original:
+            return
+
+        if not request(args):
+            run(args)
 
 if __name__ == '__main__':
     main()
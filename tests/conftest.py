@@ -0,0 +1,17 @@
+# -*- coding: utf-8 -*-
+
+"""Setup of the tests, run from the root of the repository:
+
+    python3 -m pytest tests
+"""
+
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+sys.path.insert(0, os.path.join(ROOT, 'agents', 'sarah'))
+sys.path.insert(0, os.path.join(ROOT, 'bench'))
+
+# The agent and cmdproc/sarah.py read their configs from here
+os.environ.setdefault('ZOE_HOME', ROOT)
@@ -0,0 +1,104 @@
+# -*- coding: utf-8 -*-
+
+"""The combined expression of cmdproc/sarah.py finds the same command and
+arguments as trying the patterns one by one with re.findall."""
+
+import importlib.util
+import itertools
+import json
+import os
+import re
+
+from conftest import ROOT
+
+CMD_FILE = os.path.join(ROOT, 'etc', 'sarah', 'commands.json')
+
+NAMES = ['gini', 'pib', 'pibpc', 'unemp', 'wdi SP.POP.TOTL', 'wdi per_sa']
+
+TEMPLATES = [
+    '{name} {country}', '{name} {country} {year}', '{name} {country} {span}',
+    'average {name} {year}', 'max {name} {year}', 'min {name} {year}',
+    'count {name} {year}', 'growth {name} {country} {span}',
+    'trend {name} {country} {span}', 'top {name} {year}',
+    'top 5 {name} {year}', 'bottom12 {name} {year}',
+    'rank {name} {country} {year}', 'average {name} in {country} {year}',
+    'average {name} {country} {year}'
+]
+
+OTHERS = [
+    '', 'stats', 'stats now', 'gini', 'gini 2010', 'correlation gini pib',
+    'correlation between gini and pibpc in 2010', 'scatter pib vs unemp 2015',
+    'countries with unemp > 20 and pibpc > 10000 in 2010',
+    'countries with gini < 0.3', 'hello sarah', 'gini spain&year=1'
+]
+
+
+def _cmdproc():
+    """Import cmdproc/sarah.py (it has the same name as the agent)."""
+    spec = importlib.util.spec_from_file_location(
+        'cmdproc_sarah', os.path.join(ROOT, 'cmdproc', 'sarah.py'))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+
+    return module
+
+
+def _texts():
+    """Obtain commands as users write them."""
+    for template, name, country in itertools.product(
+            TEMPLATES, NAMES, ['spain', 'united states', 'korea, rep.']):
+        yield template.format(
+            name=name, country=country, year=2010, span='2000-2010')
+
+    yield from OTHERS
+
+
+def _findall(commands, text):
+    """Find the command of a text as before combining the patterns."""
+    for key, cmd in commands.items():
+        match = re.findall(key, text)
+
+        if match:
+            return cmd, match[0]
+
+    return None, None
+
+
+def _check(path, tmp_path):
+    """Compare the table of a commands file with the one by one search."""
+    with open(path) as f:
+        commands = json.load(f)
+
+    cmdproc = _cmdproc()
+    cache = str(tmp_path / 'commands.cache')
+
+    # Combined, and then read from the cache
+    for _ in range(2):
+        table = cmdproc.CommandTable(path, cache)
+        table.refresh()
+
+        for text in _texts():
+            assert table.find(text) == _findall(commands, text), text
+
+    return table
+
+
+def test_combined(tmp_path):
+    table = _check(CMD_FILE, tmp_path)
+
+    assert table.compiled[0] is not None
+
+
+def test_not_anchored(tmp_path):
+    # The combined search would match the second one at the start
+    path = tmp_path / 'commands.json'
+    path.write_text(json.dumps({
+        'pib (\\w+)$': 'action=pib-any&country=$0',
+        '^average (\\w+) (\\d+)$': 'action=avg&name=$0&year=$1',
+        '^gini ([^\\d&=]+)$': 'action=gini&country=$0'
+    }))
+
+    table = _check(str(path), tmp_path)
+
+    assert table.compiled[0] is None
+    assert table.find('average pib 2010')[0] == 'action=pib-any&country=$0'
@@ -0,0 +1,56 @@
+# -*- coding: utf-8 -*-
+
+"""Parsing the WDI file in several processes gives the same store as a
+serial parse."""
+
+import contextlib
+import io
+
+import numpy as np
+import pytest
+
+import generate
+from actions.store import WdiStore
+
+KEYS = {'SI.POV.GINI', 'sp.pop.totl', 'BN.SYN.0003'}
+
+
+@pytest.fixture(scope='module')
+def datafile(tmp_path_factory):
+    directory = tmp_path_factory.mktemp('wdi')
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        return generate.generate(str(directory), 30, 40, 25, seed=1)
+
+
+def _same(store, other):
+    """Check that two stores have the same data."""
+    assert other.indicators == store.indicators
+    assert other.indicator_names == store.indicator_names
+    assert other.countries == store.countries
+    assert other.codes == store.codes
+    assert other.first_year == store.first_year
+    np.testing.assert_array_equal(other.values, store.values)
+    np.testing.assert_array_equal(other.membership, store.membership)
+    np.testing.assert_array_equal(other.summary, store.summary)
+    np.testing.assert_array_equal(other.ranking, store.ranking)
+
+
+@pytest.mark.parametrize('workers', [2, 3, 7])
+def test_workers(datafile, workers):
+    with contextlib.redirect_stdout(io.StringIO()):
+        serial = WdiStore.from_csv(datafile)
+        parallel = WdiStore.from_csv(datafile, workers=workers)
+
+    assert len(serial.indicators) == 30
+    _same(serial, parallel)
+
+
+def test_workers_keys(datafile):
+    with contextlib.redirect_stdout(io.StringIO()):
+        serial = WdiStore.from_csv(datafile, KEYS)
+        parallel = WdiStore.from_csv(datafile, KEYS, workers=3)
+
+    assert sorted(serial.indicators) == sorted(
+        ['SI.POV.GINI', 'SP.POP.TOTL', 'BN.SYN.0003'])
+    _same(serial, parallel)